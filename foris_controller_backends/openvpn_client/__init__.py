@@ -1,6 +1,6 @@
 #
 # foris-controller-openvpn_client-module
-# Copyright (C) 2019-2020, 2022 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+# Copyright (C) 2019-2020, 2022, 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
 #
 # This program is free software; you can redistribute it and/or modify
 # it under the terms of the GNU General Public License as published by
@@ -19,12 +19,16 @@
 
 import json
 import logging
+import os
 import pathlib
+import threading
+import time
 import typing
+from concurrent.futures import Future
 
+from foris_controller.exceptions import BackendCommandFailed
 from foris_controller_backends.cmdline import BaseCmdLine
-from foris_controller_backends.files import BaseFile, makedirs
-from foris_controller_backends.maintain import MaintainCommands
+from foris_controller_backends.files import BaseFile, inject_file_root, makedirs
 from foris_controller_backends.services import OpenwrtServices
 from foris_controller_backends.uci import (
     UciBackend,
@@ -34,128 +38,1117 @@ from foris_controller_backends.uci import (
 )
 
 from foris_controller_modules.openvpn_client.datatypes import (
+    OpenVPNClient,
     OpenVPNClientCredentials,
 )
+from foris_controller_openvpn_client_module.utils import (
+    DEFAULT_LIST_FIELDS,
+    GROUP_MODES,
+    UNCHANGED,
+    instance_action,
+    paginate,
+    parse_probe,
+    valid_group,
+    valid_routing,
+)
+
+from .cache import ClientListCache
+from .executor import READY_TIMEOUT
+from .groups import (
+    MAX_GROUPS,
+    GroupManager,
+    GroupMember,
+    GroupPolicy,
+    GroupRoutes,
+    group_priority,
+    group_table,
+    probe_key,
+    probe_targets,
+)
+from .jobs import JobRegistry
+from .management import MANAGEMENT_PATH, ManagementPool
+from .metrics import registry as metrics
+from .parser import ParserCache
+from .prefixes import compile_prefixes
+from .probes import DEFAULT_INTERVAL, MIN_INTERVAL, ProbeEngine, ProbeTarget, parse_probe_spec
+from .monitor import InstanceMonitor
+from .reconcile import ClientState, ClientStates, OpenVpnInstances, restart_all
+from .routing import MARK_MASK, MAX_SLOTS, NFT_TABLE, RULE_PRIORITY, PolicyRouting, RouteTarget, mark, table
+from .scheduler import DEFAULT_MAX_DELAY, DEFAULT_WINDOW, RestartScheduler
+from .status import StatusReader
+from .store import ConfigStore, config_digest
+from .uploads import UploadStore
+from .watchdog import Watchdog, WatchdogPolicy, stale_reason
+
+try:
+    import ubus
+except ImportError:
+    ubus = None
 
 logger = logging.getLogger(__name__)
 
 IF_NAME_LEN = 10  # Interface name has to be less then 14 characters and is always prefixed with 'vpn'
+SETTINGS_SECTION = "foris_client"  # module settings stored in openvpn config
+CONFIG_DIR = pathlib.Path("/etc/openvpn/foris")
 
 
 class OpenVpnUbus(BaseCmdLine):
-    def openvpn_running_instances(self) -> typing.Set[str]:
-        """ returns dict with instance name and bool which indicates whether
-            the instance is running
-        """
+    SOCKET_PATHS = ["/var/run/ubus/ubus.sock", "/var/run/ubus.sock"]
+    native_lock = threading.Lock()  # python ubus bindings are not thread safe
+    owns_connection = False  # the process wide connection was opened here (not by the ubus bus)
+
+    def _service_list_native(self) -> dict:
+        with OpenVpnUbus.native_lock:
+            if not ubus.get_connected():
+                socket_path = next((e for e in OpenVpnUbus.SOCKET_PATHS if os.path.exists(e)), None)
+                if socket_path is None:
+                    raise RuntimeError("ubus socket not found")
+                # connection is kept open for subsequent calls and never closed
+                ubus.connect(socket_path)
+                OpenVpnUbus.owns_connection = True
+            elif not OpenVpnUbus.owns_connection and threading.current_thread() is not threading.main_thread():
+                # connection of the ubus bus is driven by its loop in the main thread
+                raise RuntimeError("shared ubus connection can't be used from background threads")
+            res = ubus.call("service", "list", {"name": "openvpn"})
+        return res[0] if res else {}
 
+    def _service_list_cmdline(self) -> dict:
         output, _ = self._run_command_and_check_retval(
             ["/bin/ubus", "call", "service", "list", '{"name": "openvpn"}'], 0
         )
+        return json.loads(output)
+
+    def service_list(self) -> dict:
+        """ returns output of `ubus call service list` for openvpn service
+
+            Python ubus bindings are preferred, /bin/ubus is used when they are
+            not installed, when ubus can't be reached through them or when the connection
+            belongs to foris-controller and the call is made from a background thread.
+        """
+        if ubus is not None:
+            try:
+                with metrics.span("ubus_query_native"):
+                    return self._service_list_native()
+            except (RuntimeError, OSError):
+                logger.debug("Failed to query ubus via bindings, using /bin/ubus", exc_info=True)
+
+        with metrics.span("ubus_query_cmdline"):
+            return self._service_list_cmdline()
 
-        services = json.loads(output)
+    def openvpn_running_instances(self) -> typing.Set[str]:
+        """ returns dict with instance name and bool which indicates whether
+            the instance is running
+        """
+
+        services = self.service_list()
         if "openvpn" not in services or "instances" not in services["openvpn"]:
-            return {}
+            return set()
 
         return {k for k, v in services["openvpn"]["instances"].items() if v.get("running")}
 
 
-class OpenVpnClientUci:
-    def list(self) -> typing.List[dict]:
+def _client_state(section: dict) -> ClientState:
+    return ClientState(
+        enabled=parse_bool(section["data"].get("enabled", "0")),
+        dev=section["data"].get("dev", f"vpn{section['name'][:IF_NAME_LEN]}"),
+        config=section["data"].get("config", ""),
+        username=section["data"].get("username", ""),
+        password=section["data"].get("password", ""),
+        digest=section["data"].get("_config_hash", ""),
+    )
 
-        with UciBackend() as backend:
-            data = backend.read("openvpn")
 
-        running_instances = OpenVpnUbus().openvpn_running_instances()
-        logger.debug("Running openvpn instances %s", running_instances)
+def _index_sections(data: dict, config: str) -> typing.Dict[str, dict]:
+    """ Returns sections of the config indexed by their names """
+    return {e["name"]: e for e in data.get(config, [])}
 
-        return [
-            {
-                "id": e["name"],
-                "enabled": parse_bool(e["data"].get("enabled", "0")),
-                "running": e["name"] in running_instances,
-                "credentials": {
-                    "username": e["data"].get("username", ""),
-                    "password": e["data"].get("password", "")
-                }
-            }
-            for e in get_sections_by_type(data, "openvpn", "openvpn")
-            if parse_bool(e["data"].get("_client_foris", "0"))
-        ]
 
-    def add(self, id: str, config: str, credentials: typing.Optional[OpenVPNClientCredentials] = None) -> bool:
+def _is_foris_client(section: dict) -> bool:
+    return section["type"] == "openvpn" and parse_bool(section["data"].get("_client_foris", "0"))
 
-        with UciBackend() as backend:
-            data = backend.read("openvpn")
 
-            # try if it exists
-            existing_ids = [e["name"] for e in get_sections_by_type(data, "openvpn", "openvpn")]
-            if id in existing_ids:
-                return False
+def _client_states(sections: typing.Dict[str, dict]) -> ClientStates:
+    """ Returns states of clients managed by this module """
+    return {name: _client_state(e) for name, e in sections.items() if _is_foris_client(e)}
+
+
+def _float_option(sections: typing.Dict[str, dict], section: str, option: str, default: float) -> float:
+    value = sections[section]["data"].get(option, default) if section in sections else default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning("Invalid value of openvpn.%s.%s, using %s", section, option, default)
+        return default
+
+
+def _watchdog_policy(section: dict) -> WatchdogPolicy:
+    """ Watchdog settings stored in client section, defaults are used for missing or invalid values """
+    name, default = section["name"], WatchdogPolicy()
+    sections = {name: section}
+    return WatchdogPolicy(
+        enabled=parse_bool(section["data"].get("_watchdog", store_bool(default.enabled))),
+        backoff_initial=_float_option(sections, name, "_backoff_initial", default.backoff_initial),
+        backoff_max=_float_option(sections, name, "_backoff_max", default.backoff_max),
+        retries=int(_float_option(sections, name, "_backoff_retries", default.retries)),
+        handshake_timeout=_float_option(sections, name, "_handshake_timeout", default.handshake_timeout),
+    )
+
+
+def _probe_target(section: dict, settings: typing.Optional[dict]) -> typing.Optional[ProbeTarget]:
+    """ Probe of the client (_probe* options), module settings provide defaults for all the clients """
+    name, data = section["name"], section["data"]
+    defaults = settings["data"] if settings else {}
+    spec = data.get("_probe", defaults.get("probe", ""))
+    parsed = parse_probe_spec(spec) if spec else None
+    if parsed is None:
+        if spec:
+            logger.warning("Invalid probe of client '%s': %s", name, spec)
+        return None
+
+    try:
+        interval = float(data.get("_probe_interval", defaults.get("probe_interval", DEFAULT_INTERVAL)))
+    except ValueError:
+        logger.warning("Invalid probe interval of client '%s', using %s", name, DEFAULT_INTERVAL)
+        interval = DEFAULT_INTERVAL
+    return ProbeTarget(*parsed, interval=max(interval, MIN_INTERVAL), dev=f"vpn{name[:IF_NAME_LEN]}")
+
+
+def _routing_sections(id: str) -> typing.Tuple[str, str]:
+    """ network rule sections (IPv4, IPv6) and dhcp ipset section of a client with policy routing """
+    return f"openvpn_client_{id}", f"openvpn_client_{id}_6"
+
+
+def _routing(section: dict) -> dict:
+    data = section["data"]
+    return {
+        "prefixes": list(data.get("_route_prefix", [])),
+        "sources": list(data.get("_route_source", [])),
+        "domains": list(data.get("_route_domain", [])),
+    }
+
+
+def _group_sections(id: str) -> typing.List[typing.Tuple[str, str, str]]:
+    """ network rule sections of a group (name, type, table), main table without default routes goes first """
+    return [
+        (f"openvpn_group_{id}_main", "rule", "main"),
+        (f"openvpn_group_{id}", "rule", ""),
+        (f"openvpn_group_{id}_main6", "rule6", "main"),
+        (f"openvpn_group_{id}_6", "rule6", ""),
+    ]
+
+
+def _group_members(section: dict) -> typing.List[GroupMember]:
+    # members are stored as "<id>" or "<id>:<weight>"
+    res = []
+    for value in section["data"].get("member", []):
+        id, _, weight = value.partition(":")
+        res.append(GroupMember(id, int(weight) if weight.isdigit() and int(weight) > 0 else 1))
+    return res
+
+
+def _group_policy(section: dict) -> GroupPolicy:
+    data = section["data"]
+    mode = data.get("mode", "failover")
+    return GroupPolicy(
+        id=section["name"],
+        mode=mode if mode in GROUP_MODES else "failover",
+        members=tuple(_group_members(section)),
+        slot=int(data.get("slot", "0")),
+        probe=parse_probe(data["probe"]) if data.get("probe") else None,
+        max_latency=_float_option({section["name"]: section}, section["name"], "max_latency", 0.0) / 1000,
+    )
+
+
+def _group(section: dict) -> dict:
+    data = section["data"]
+    res = {
+        "id": section["name"],
+        "mode": _group_policy(section).mode,
+        "members": [e._asdict() for e in _group_members(section)],
+        "max_latency": int(_float_option({section["name"]: section}, section["name"], "max_latency", 0.0)),
+        "interface": data.get("interface", "lan"),
+    }
+    if data.get("probe"):
+        res["probe"] = data["probe"]
+    return res
+
+
+def _with_credentials(
+    state: ClientState, credentials: typing.Optional[OpenVPNClientCredentials] = None
+) -> ClientState:
+    """ Mirrors OpenVpnClientUci._set_client_credentials() on client state """
+    if credentials is not None:
+        username = credentials.get("username")
+        password = credentials.get("password")
+        if username is not None and password is not None:
+            return state._replace(username=username, password=password)
+    return state
+
+
+class _ClientChanges:
+    """ Tracks client changes made within a single uci session """
 
-            # write config file
-            dir_path = pathlib.Path("/etc/openvpn/foris")
-            file_path = dir_path / f"{id}.conf"
-            makedirs(str(dir_path), mask=0o0700)
-            BaseFile()._store_to_file(str(file_path), config)
+    def __init__(self, backend: UciBackend, sections: typing.Dict[str, dict]):
+        self.backend = backend
+        # sections are looked up by name, the index is kept in sync with the changes
+        self.sections = sections
+        self.before = _client_states(sections)
+        self.after = dict(self.before)
+        self.modified = False  # something was written, services have to be reconciled
+        self.routing = False  # policy routing has to be applied again
+        self.released_slots: typing.List[int] = []
+        self.released_groups: typing.List[int] = []  # slots of deleted groups
 
-            # update uci
-            backend.add_section("openvpn", "openvpn", id)
+    def _exists(self, id: str) -> bool:
+        section = self.sections.get(id)
+        return section is not None and section["type"] == "openvpn"
+
+    def _track(self, id: str):
+        # set can be used on openvpn sections which were not created by this module
+        if id not in self.before and id not in self.after:
+            self.before[id] = self.after[id] = _client_state(self.sections[id])
+
+    def add(
+        self,
+        id: str,
+        config: typing.Optional[str],
+        credentials: typing.Optional[OpenVPNClientCredentials] = None,
+        upload: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> bool:
+        """ Adds client with `config` content or with already stored file (`upload` path and its digest) """
+        # try if it exists (section names are unique within the config regardless of the type)
+        if id in self.sections or id == SETTINGS_SECTION:
+            return False
+
+        if upload is None:
+            digest = config_digest(config)
+            valid = OpenVpnClientUci._validate(id, digest, config=config)
+        else:
+            upload, digest = upload
+            valid = OpenVpnClientUci._validate(id, digest, path=inject_file_root(upload))
+        if not valid:
+            return False
+
+        # write config file
+        file_path = CONFIG_DIR / f"{id}.conf"
+        with metrics.span("file_store"):
+            makedirs(str(CONFIG_DIR), mask=0o0700)
+            if upload is None:
+                OpenVpnClientUci.store.store(str(file_path), config)
+            else:
+                # uploaded file is on the same filesystem -> atomic
+                os.replace(inject_file_root(upload), inject_file_root(str(file_path)))
+
+        # update uci
+        with metrics.span("uci_write"):
+            self.backend.add_section("openvpn", "openvpn", id)
             # Do not activate vpn config right after adding it
             # It could mess up already running vpn connections
             # or make router inaccessible in certain circumstances
             # It would be safer to activate vpn connection in separate action later
-            backend.set_option("openvpn", id, "enabled", store_bool(False))
-            backend.set_option("openvpn", id, "_client_foris", store_bool(True))
-            backend.set_option("openvpn", id, "config", str(file_path))
-            OpenVpnClientUci._set_client_credentials(backend, id, credentials)
+            self.backend.set_option("openvpn", id, "enabled", store_bool(False))
+            self.backend.set_option("openvpn", id, "_client_foris", store_bool(True))
+            self.backend.set_option("openvpn", id, "config", str(file_path))
+            self.backend.set_option("openvpn", id, "_config_hash", digest)
+            OpenVpnClientUci._set_client_credentials(self.backend, id, credentials)
 
-            backend.set_option("openvpn", id, "dev", f"vpn{id[:IF_NAME_LEN]}")
-            backend.add_to_list("firewall", "turris_vpn_client", "device", [f"vpn{id[:IF_NAME_LEN]}"])
+            self.backend.set_option("openvpn", id, "dev", f"vpn{id[:IF_NAME_LEN]}")
+            self.backend.set_option("openvpn", id, "management", f"{MANAGEMENT_PATH.format(id)} unix")
+            self.backend.add_to_list("firewall", "turris_vpn_client", "device", [f"vpn{id[:IF_NAME_LEN]}"])
 
-        self.restart_openvpn()
+        self.sections[id] = {"name": id, "type": "openvpn", "anonymous": False, "data": {"_client_foris": "1"}}
+        self.after[id] = _with_credentials(
+            ClientState(False, f"vpn{id[:IF_NAME_LEN]}", str(file_path), "", "", digest), credentials
+        )
+        self.modified = True
 
         return True
 
-    def set(self, id: str, enabled: bool, credentials: typing.Optional[OpenVPNClientCredentials] = None) -> bool:
+    def set(
+        self, id: str, enabled: bool, credentials: typing.Optional[OpenVPNClientCredentials] = None
+    ) -> typing.Optional[str]:
+        """ Returns action which applies the change to the openvpn instance or None when the client doesn't exist """
+        # try if it exists
+        if not self._exists(id):
+            return None
 
-        with UciBackend() as backend:
-            data = backend.read("openvpn")
+        self._track(id)
+        old = self.after[id]
+        new = _with_credentials(old._replace(enabled=enabled), credentials)
+        if new == old:
+            # nothing to write and nothing to restart
+            return UNCHANGED
+
+        # update uci
+        with metrics.span("uci_write"):
+            self.backend.add_section("openvpn", "openvpn", id)
+            self.backend.set_option("openvpn", id, "enabled", store_bool(enabled))
+
+            OpenVpnClientUci._set_client_credentials(self.backend, id, credentials)
+
+        self.after[id] = new
+        self.modified = True
+        # tunnel of the client disappears or appears only when it is stopped or started
+        self.routing |= "_route_slot" in self.sections[id]["data"] and old.enabled != new.enabled
+
+        return instance_action(old.enabled, new.enabled, True)
+
+    def delete(self, id: str) -> bool:
+        # try if it exists
+        if not self._exists(id):
+            return False
 
-            # try if it exists
-            existing_ids = [e["name"] for e in get_sections_by_type(data, "openvpn", "openvpn")]
-            if id not in existing_ids:
+        self._track(id)
+
+        with metrics.span("uci_write"):
+            self.backend.del_section("openvpn", id)
+            self.backend.del_from_list("firewall", "turris_vpn_client", "device", [f"vpn{id[:IF_NAME_LEN]}"])
+            if "_route_slot" in self.sections[id]["data"]:
+                self.release_routing(id)
+            for group in self._groups():
+                for value in group["data"].get("member", []):
+                    if value.partition(":")[0] == id:
+                        self.backend.del_from_list("openvpn", group["name"], "member", [value])
+                        group["data"]["member"] = [e for e in group["data"]["member"] if e != value]
+
+        file_path = CONFIG_DIR / f"{id}.conf"
+        with metrics.span("file_delete"):
+            blocks = OpenVpnClientUci.store.references(str(file_path))
+            BaseFile().delete_file(str(file_path))
+            OpenVpnClientUci.store.collect_garbage(blocks)
+
+        del self.sections[id]
+        del self.after[id]
+        self.modified = True
+
+        return True
+
+    def release_routing(self, id: str):
+        """ Removes persistent parts of policy routing of the client """
+        for name in _routing_sections(id):
+            self.backend.del_section("network", name)
+        if self.sections[id]["data"].get("_route_domain"):
+            self.backend.del_section("dhcp", _routing_sections(id)[0])
+        self.released_slots.append(int(self.sections[id]["data"]["_route_slot"]))
+        self.routing = True
+
+    def set_routing(
+        self, id: str, prefixes: typing.List[str], sources: typing.List[str], domains: typing.List[str]
+    ) -> bool:
+        """ Stores traffic which should be routed through the client, empty lists disable policy routing """
+        section = self.sections.get(id)
+        if section is None or not _is_foris_client(section) or not valid_routing(prefixes, sources, domains):
+            return False
+
+        data = section["data"]
+        if not (prefixes or sources or domains):
+            if "_route_slot" in data:
+                with metrics.span("uci_write"):
+                    self.release_routing(id)
+                    for option in ("_route_slot", "_route_prefix", "_route_source", "_route_domain"):
+                        self.backend.del_option("openvpn", id, option, fail_on_error=False)
+                        data.pop(option, None)
+            return True
+
+        if "_route_slot" in data:
+            slot = int(data["_route_slot"])
+        else:
+            used = {int(e["data"]["_route_slot"]) for e in self.sections.values() if "_route_slot" in e["data"]}
+            slot = next((e for e in range(MAX_SLOTS) if e not in used), None)
+            if slot is None:
+                logger.warning("No routing table left for client '%s'", id)
                 return False
 
-            # update uci
-            backend.add_section("openvpn", "openvpn", id)
-            backend.set_option("openvpn", id, "enabled", store_bool(enabled))
+        rule4, rule6 = _routing_sections(id)
+        with metrics.span("uci_write"):
+            self.backend.set_option("openvpn", id, "_route_slot", str(slot))
+            for option, values in [("_route_prefix", prefixes), ("_route_source", sources), ("_route_domain", domains)]:
+                self.backend.replace_list("openvpn", id, option, values)
 
-            OpenVpnClientUci._set_client_credentials(backend, id, credentials)
+            for name, section_type in [(rule4, "rule"), (rule6, "rule6")]:
+                self.backend.add_section("network", section_type, name)
+                self.backend.set_option("network", name, "mark", f"0x{mark(slot):x}/0x{MARK_MASK:x}")
+                self.backend.set_option("network", name, "lookup", str(table(slot)))
+                self.backend.set_option("network", name, "priority", str(RULE_PRIORITY + slot))
 
-        self.restart_openvpn()
+            if domains:
+                # dnsmasq adds resolved addresses to the set which is matched in nftables
+                self.backend.add_section("dhcp", "ipset", rule4)
+                self.backend.replace_list("dhcp", rule4, "name", [f"dns4_{slot}"])
+                self.backend.replace_list("dhcp", rule4, "domain", domains)
+                self.backend.set_option("dhcp", rule4, "table", NFT_TABLE)
+                self.backend.set_option("dhcp", rule4, "table_family", "inet")
+            elif data.get("_route_domain"):
+                self.backend.del_section("dhcp", rule4)
 
+        data.update(_route_slot=str(slot), _route_prefix=prefixes, _route_source=sources, _route_domain=domains)
+        self.routing = True
         return True
 
-    def delete(self, id: str) -> bool:
+    def _groups(self) -> typing.List[dict]:
+        return [e for e in self.sections.values() if e["type"] == "client_group"]
+
+    def set_group(
+        self,
+        id: str,
+        mode: str,
+        members: typing.List[dict],
+        probe: typing.Optional[str],
+        max_latency: int,
+        interface: str,
+        new: bool,
+    ) -> bool:
+        """ Adds (`new`) or replaces client group, each client can be a member of a single group """
+        section = self.sections.get(id)
+        if new and (section is not None or id == SETTINGS_SECTION):
+            return False
+        if not new and (section is None or section["type"] != "client_group"):
+            return False
+        if not valid_group(members, probe):
+            return False
+
+        ids = {e["id"] for e in members}
+        for member in ids:
+            client = self.sections.get(member)
+            if client is None or not _is_foris_client(client):
+                return False
+        if any(e["name"] != id and ids & {m.id for m in _group_members(e)} for e in self._groups()):
+            return False
+
+        if section is not None:
+            slot = int(section["data"]["slot"])
+        else:
+            used = {int(e["data"]["slot"]) for e in self._groups()}
+            slot = next((e for e in range(MAX_GROUPS) if e not in used), None)
+            if slot is None:
+                logger.warning("No routing table left for group '%s'", id)
+                return False
+
+        values = [e["id"] if e.get("weight", 1) == 1 else f"{e['id']}:{e['weight']}" for e in members]
+        with metrics.span("uci_write"):
+            self.backend.add_section("openvpn", "client_group", id)
+            self.backend.set_option("openvpn", id, "mode", mode)
+            self.backend.replace_list("openvpn", id, "member", values)
+            self.backend.set_option("openvpn", id, "max_latency", str(max_latency))
+            self.backend.set_option("openvpn", id, "interface", interface)
+            self.backend.set_option("openvpn", id, "slot", str(slot))
+            if probe:
+                self.backend.set_option("openvpn", id, "probe", probe)
+            else:
+                self.backend.del_option("openvpn", id, "probe", fail_on_error=False)
+
+            # traffic which enters from the interface and is not routed by more specific routes
+            # of the main table (default and /1 routes pushed by openvpn are skipped) uses the group table
+            for offset, (name, section_type, lookup) in enumerate(_group_sections(id)):
+                self.backend.add_section("network", section_type, name)
+                self.backend.set_option("network", name, "in", interface)
+                self.backend.set_option("network", name, "priority", str(group_priority(slot) + offset % 2))
+                if lookup:
+                    self.backend.set_option("network", name, "lookup", lookup)
+                    self.backend.set_option("network", name, "suppress_prefixlength", "1")
+                else:
+                    self.backend.set_option("network", name, "lookup", str(group_table(slot)))
+
+        self.sections[id] = {
+            "name": id, "type": "client_group", "anonymous": False,
+            "data": {
+                "mode": mode, "member": values, "max_latency": str(max_latency), "interface": interface,
+                "slot": str(slot), **({"probe": probe} if probe else {}),
+            },
+        }
+        return True
+
+    def delete_group(self, id: str) -> bool:
+        section = self.sections.get(id)
+        if section is None or section["type"] != "client_group":
+            return False
+
+        with metrics.span("uci_write"):
+            self.backend.del_section("openvpn", id)
+            for name, _, _ in _group_sections(id):
+                self.backend.del_section("network", name)
+
+        self.released_groups.append(int(section["data"]["slot"]))
+        del self.sections[id]
+        return True
+
+    def update_config(self, id: str, config: str) -> typing.Optional[bool]:
+        """ Replaces config of the client
+
+            Returns None when the client doesn't exist or the config is invalid
+            and False when the content is the same.
+        """
+        section = self.sections.get(id)
+        if section is None or not _is_foris_client(section):
+            return None
+
+        self._track(id)
+
+        digest = config_digest(config)
+        file_path = self.after[id].config or str(CONFIG_DIR / f"{id}.conf")
+        if digest == self.after[id].digest and os.path.exists(inject_file_root(file_path)):
+            return False
+        if not OpenVpnClientUci._validate(id, digest, config=config):
+            return None
+
+        with metrics.span("file_store"):
+            blocks = OpenVpnClientUci.store.references(file_path)
+            OpenVpnClientUci.store.store(file_path, config)
+            OpenVpnClientUci.store.collect_garbage(blocks)
+
+        with metrics.span("uci_write"):
+            self.backend.set_option("openvpn", id, "_config_hash", digest)
+
+        # enabled client is restarted as its state differs
+        self.after[id] = self.after[id]._replace(digest=digest)
+
+        return True
+
+
+class OpenVpnClientUci:
+    scheduler = RestartScheduler()
+    cache = ClientListCache()
+    monitor = InstanceMonitor(lambda: OpenVpnUbus().openvpn_running_instances())
+    status = StatusReader()
+    management = ManagementPool()
+    jobs = JobRegistry()
+    uploads = UploadStore(CONFIG_DIR)
+    store = ConfigStore(CONFIG_DIR)
+    parser = ParserCache()
+    policies = ClientListCache()  # watchdog settings of enabled clients
+    group_policies = ClientListCache()
+    probe_targets = ClientListCache()
+    watchdog = Watchdog(
+        lambda: OpenVpnClientUci._watchdog_policies(),
+        lambda id, policy: OpenVpnClientUci()._probe(id, policy),
+        lambda id: OpenVpnClientUci._restart_instance(id),
+    )
+    groups = GroupManager(
+        lambda: OpenVpnClientUci._group_policies(),
+        lambda ids: OpenVpnClientUci()._running_instances() & ids,
+        lambda policy, active: OpenVpnClientUci._switch_group(policy, active),
+        lambda ids: OpenVpnClientUci.probes.stats(ids),
+    )
+    probes = ProbeEngine(lambda: OpenVpnClientUci._probe_targets())
+
+    def start_monitoring(self, state_changed: typing.Callable[[str, bool], None]):
+        """ Report when tunnel of a client goes up or down """
+
+        def listener(instance: str, running: bool):
+            if instance in {e.id for e in self._clients()}:
+                state_changed(instance, running)
+                # standby member takes over right away
+                if running:
+                    # group member has to prove that its new tunnel works
+                    OpenVpnClientUci.probes.reset(
+                        probe_key(e.id, instance) for e in self._group_policies().values()
+                    )
+                    OpenVpnClientUci.groups.member_started(instance)
+                else:
+                    OpenVpnClientUci.groups.wake()
+                    OpenVpnClientUci.watchdog.wake()
 
-        with UciBackend() as backend:
+        OpenVpnClientUci.monitor.listener = listener
+        OpenVpnClientUci.monitor.start()
+
+    def start_watchdog(self, listener: typing.Callable[[str, dict], None]):
+        """ Restart unhealthy clients and report `reconnected` and `failed` clients """
+        OpenVpnClientUci.watchdog.listener = listener
+        OpenVpnClientUci.watchdog.start()
+
+    def start_groups(self, listener: typing.Callable[[str, dict], None]):
+        """ Route traffic of client groups and report `group_switched` """
+        OpenVpnClientUci.groups.listener = listener
+        OpenVpnClientUci.groups.start()
+
+    def start_probes(self):
+        """ Measure latency and loss of tunnels of enabled clients """
+        OpenVpnClientUci.probes.start()
+
+    @staticmethod
+    def _probe_targets() -> typing.Dict[str, ProbeTarget]:
+        def load() -> typing.List[typing.Tuple[str, ProbeTarget]]:
+            with UciBackend() as backend, metrics.span("uci_read"):
+                sections = _index_sections(backend.read("openvpn"), "openvpn")
+            settings = sections.get(SETTINGS_SECTION)
+            targets = [
+                (name, _probe_target(e, settings)) for name, e in sections.items()
+                if _is_foris_client(e) and parse_bool(e["data"].get("enabled", "0"))
+            ]
+            # latency of group members is measured by the same engine
+            for section in sections.values():
+                if section["type"] == "client_group":
+                    targets.extend(probe_targets(_group_policy(section), lambda id: f"vpn{id[:IF_NAME_LEN]}").items())
+            return [e for e in targets if e[1] is not None]
+
+        return dict(OpenVpnClientUci.probe_targets.clients(os.path.join(UciBackend().config_dir, "openvpn"), load))
+
+    def get_probe_stats(self, id: typing.Optional[str] = None) -> typing.List[dict]:
+        """ RTT percentiles and loss of recent probes of each client """
+        stats = OpenVpnClientUci.probes.stats()
+        return [
+            {"id": e.id, "available": True, **stats[e.id]} if e.id in stats else {"id": e.id, "available": False}
+            for e in self._clients()
+            if id is None or e.id == id
+        ]
+
+    @staticmethod
+    def _group_policies() -> typing.Dict[str, GroupPolicy]:
+        def load() -> typing.List[typing.Tuple[str, GroupPolicy]]:
+            with UciBackend() as backend, metrics.span("uci_read"):
+                data = backend.read("openvpn")
+            return [(e["name"], _group_policy(e)) for e in get_sections_by_type(data, "openvpn", "client_group")]
+
+        return dict(OpenVpnClientUci.group_policies.clients(os.path.join(UciBackend().config_dir, "openvpn"), load))
+
+    @staticmethod
+    def _switch_group(policy: GroupPolicy, active: typing.Tuple[GroupMember, ...]):
+        GroupRoutes().switch(group_table(policy.slot), [(f"vpn{e.id[:IF_NAME_LEN]}", e.weight) for e in active])
+
+    @staticmethod
+    def _watchdog_policies() -> typing.Dict[str, WatchdogPolicy]:
+        def load() -> typing.List[typing.Tuple[str, WatchdogPolicy]]:
+            with UciBackend() as backend, metrics.span("uci_read"):
+                data = backend.read("openvpn")
+            return [
+                (e["name"], _watchdog_policy(e))
+                for e in get_sections_by_type(data, "openvpn", "openvpn")
+                if _is_foris_client(e) and parse_bool(e["data"].get("enabled", "0"))
+            ]
+
+        return dict(OpenVpnClientUci.policies.clients(os.path.join(UciBackend().config_dir, "openvpn"), load))
+
+    def _probe(self, id: str, policy: WatchdogPolicy) -> typing.Optional[str]:
+        """ Returns why the client is not healthy or None """
+        if id not in self._running_instances():
+            return "not running"
+        if not policy.handshake_timeout:
+            return None
+        management = OpenVpnClientUci.management.stats(id)
+        status = None
+        if management is None:
+            status = OpenVpnClientUci.status.get(id, f"vpn{id[:IF_NAME_LEN]}", str(CONFIG_DIR / f"{id}.conf"))
+        return stale_reason(management, status, policy.handshake_timeout, time.time())
+
+    @staticmethod
+    def _restart_instance(id: str):
+        # merged restart might stop or restart the same instance
+        with OpenVpnClientUci.scheduler.exclusive():
+            OpenVpnInstances().restart(id)
+
+    @staticmethod
+    def _validate(
+        id: str, digest: str, config: typing.Optional[str] = None, path: typing.Optional[str] = None
+    ) -> bool:
+        """ Config (its content or file at `path`) is refused when it contains errors
+            which would prevent openvpn from starting
+        """
+        with metrics.span("config_parse"):
+            if config is None:
+                parsed = OpenVpnClientUci.parser.parse_file(path, digest)
+            else:
+                parsed = OpenVpnClientUci.parser.parse(config, digest)
+        if parsed.errors:
+            logger.warning("Config of '%s' is not valid: %s", id, "; ".join(parsed.errors))
+            return False
+        for warning in parsed.warnings + parsed.conflicts(f"vpn{id[:IF_NAME_LEN]}"):
+            logger.info("Config of '%s': %s", id, warning)
+        return True
+
+    def _metadata(self, id: str, digest: str) -> typing.Optional[dict]:
+        """ Metadata extracted from client config, config is parsed only when it is not cached """
+        parsed = OpenVpnClientUci.parser.get(digest) if digest else None
+        if parsed is None:
+            try:
+                with open(inject_file_root(str(CONFIG_DIR / f"{id}.conf")), errors="replace") as f:
+                    config = f.read()
+            except OSError:
+                return None
+            with metrics.span("config_parse"):
+                parsed = OpenVpnClientUci.parser.parse(config, digest or None)
+        return parsed.metadata(f"vpn{id[:IF_NAME_LEN]}")
+
+    def _clients(self) -> typing.List[OpenVPNClient]:
+        return OpenVpnClientUci.cache.clients(
+            os.path.join(UciBackend().config_dir, "openvpn"), OpenVpnClientUci._load_clients
+        )
+
+    def _running_instances(self) -> typing.Set[str]:
+        # prefer state tracked from procd events
+        running_instances = OpenVpnClientUci.monitor.running_instances()
+        if running_instances is None:
+            running_instances = OpenVpnClientUci.cache.running(OpenVpnUbus().openvpn_running_instances)
+        logger.debug("Running openvpn instances %s", running_instances)
+        return running_instances
+
+    def list(
+        self,
+        ids: typing.Optional[typing.List[str]] = None,
+        fields: typing.Optional[typing.List[str]] = None,
+        enabled: typing.Optional[bool] = None,
+        running: typing.Optional[bool] = None,
+        limit: typing.Optional[int] = None,
+        cursor: typing.Optional[str] = None,
+    ) -> typing.Tuple[typing.List[dict], typing.Optional[str]]:
+        """ Returns selected fields of clients which match the filters and cursor of the next page
+
+            Running instances are queried only when running state is requested
+            and configs are parsed only for clients on the returned page.
+        """
+        fields = set(fields or DEFAULT_LIST_FIELDS)
+
+        clients = self._clients()
+        if ids is not None:
+            wanted = set(ids)
+            clients = [e for e in clients if e.id in wanted]
+        if enabled is not None:
+            clients = [e for e in clients if e.enabled == enabled]
+
+        running_instances: typing.Set[str] = set()
+        if running is not None or "running" in fields:
+            running_instances = self._running_instances()
+            if running is not None:
+                clients = [e for e in clients if (e.id in running_instances) == running]
+
+        clients, next_cursor = paginate(clients, limit, cursor, key=lambda e: e.id)
+
+        return [
+            e.to_dict(
+                fields,
+                running=e.id in running_instances,
+                config=self._metadata(e.id, e.digest) if "config" in fields else None,
+            )
+            for e in clients
+        ], next_cursor
+
+    def get_status(self, id: typing.Optional[str] = None) -> typing.List[dict]:
+        """ Tunnel statistics of a single client or of all clients """
+        ids = [e.id for e in self._clients()]
+        OpenVpnClientUci.status.forget(ids)
+
+        return [
+            OpenVpnClientUci.status.get(
+                client_id, f"vpn{client_id[:IF_NAME_LEN]}", str(CONFIG_DIR / f"{client_id}.conf")
+            )
+            for client_id in ids
+            if id is None or client_id == id
+        ]
+
+    def get_live_stats(self, id: typing.Optional[str] = None) -> typing.List[dict]:
+        """ Live tunnel metrics read from openvpn management interface """
+        ids = [e.id for e in self._clients()]
+        OpenVpnClientUci.management.forget(ids)
+
+        res = []
+        for client_id in ids:
+            if id is not None and client_id != id:
+                continue
+            stats = OpenVpnClientUci.management.stats(client_id)
+            if stats is None:
+                res.append({"id": client_id, "available": False})
+            else:
+                res.append({"id": client_id, "available": True, **stats})
+        return res
+
+    def get_metrics(self, format: str = "json") -> dict:
+        """ Durations of measured stages together with cache statistics """
+        cache_stats = OpenVpnClientUci.cache.stats()
+        if format == "prometheus":
+            return {"format": format, "text": metrics.prometheus(cache_stats)}
+        return {"format": format, "spans": metrics.snapshot(), "cache": cache_stats}
+
+    @staticmethod
+    def _load_clients() -> typing.List[OpenVPNClient]:
+        with UciBackend() as backend, metrics.span("uci_read"):
             data = backend.read("openvpn")
 
-            # try if it exists
-            existing_ids = [e["name"] for e in get_sections_by_type(data, "openvpn", "openvpn")]
-            if id not in existing_ids:
+        return [
+            OpenVPNClient(
+                e["name"],
+                parse_bool(e["data"].get("enabled", "0")),
+                e["data"].get("username", ""),
+                e["data"].get("password", ""),
+                e["data"].get("_config_hash", ""),
+            )
+            for e in get_sections_by_type(data, "openvpn", "openvpn")
+            if parse_bool(e["data"].get("_client_foris", "0"))
+        ]
+
+    def add(self, id: str, config: str, credentials: typing.Optional[OpenVPNClientCredentials] = None) -> bool:
+        return self.batch([{"action": "add", "id": id, "config": config, "credentials": credentials}])[0][0]
+
+    def set(
+        self, id: str, enabled: bool, credentials: typing.Optional[OpenVPNClientCredentials] = None
+    ) -> typing.Optional[str]:
+        """ Returns action performed on the openvpn instance ("none", "start", "stop" or "restart"),
+            UNCHANGED when nothing was written or None when the client doesn't exist
+        """
+        _, _, actions = self._apply(
+            [{"action": "set", "id": id, "enabled": enabled, "credentials": credentials}], inline=True
+        )
+        return actions[0]
+
+    def delete(self, id: str) -> bool:
+        return self.batch([{"action": "del", "id": id}])[0][0]
+
+    def batch(
+        self, operations: typing.List[dict]
+    ) -> typing.Tuple[typing.List[bool], typing.List[typing.Optional[str]]]:
+        """ Apply add/set/del operations within a single uci session
+
+            Services are reconciled only once after all the operations are stored.
+            Returns result of each operation in the same order and actions of set operations.
+        """
+        results, _, actions = self._apply(operations, inline=True)
+        return results, actions
+
+    def upload_begin(
+        self, id: str, credentials: typing.Optional[OpenVPNClientCredentials] = None
+    ) -> typing.Optional[str]:
+        return OpenVpnClientUci.uploads.begin(id, credentials)
+
+    def upload_chunk(self, upload_id: str, offset: int, data: bytes) -> typing.Optional[int]:
+        with metrics.span("file_store_chunk"):
+            return OpenVpnClientUci.uploads.chunk(upload_id, offset, data)
+
+    def upload_commit(self, upload_id: str, sha256: typing.Optional[str] = None) -> typing.Optional[str]:
+        """ Adds client from uploaded config, returns its id or None when it wasn't added """
+        finished = OpenVpnClientUci.uploads.finish(upload_id, sha256)
+        if finished is None:
+            return None
+
+        id, credentials, path, digest = finished
+        added = False
+        try:
+            added = self.batch(
+                [{"action": "add", "id": id, "credentials": credentials, "upload": (path, digest)}]
+            )[0][0]
+        finally:
+            if not added:
+                OpenVpnClientUci.uploads.discard(path)
+        return id if added else None
+
+    def update_config(self, id: str, config: str) -> typing.Optional[bool]:
+        """ Replaces config of the client, nothing is written or restarted when the content is the same
+
+            Returns None when the client doesn't exist, otherwise whether the config was changed.
+        """
+        with metrics.span("uci_session"), UciBackend() as backend:
+            with metrics.span("uci_read"):
+                sections = _index_sections(backend.read("openvpn"), "openvpn")
+            changes = _ClientChanges(backend, sections)
+            res = changes.update_config(id, config)
+
+        if res:
+            self._reconcile(sections, changes, inline=True)
+        return res
+
+    def get_routing(self, id: str) -> typing.Optional[dict]:
+        """ Traffic routed through the client and the number of prefixes left after compaction """
+        with UciBackend() as backend, metrics.span("uci_read"):
+            sections = _index_sections(backend.read("openvpn"), "openvpn")
+        section = sections.get(id)
+        if section is None or not _is_foris_client(section):
+            return None
+
+        res = {"id": id, **_routing(section)}
+        res["compiled"] = {
+            key: sum(len(e) for e in compile_prefixes(res[key])) for key in ("prefixes", "sources")
+        }
+        return res
+
+    def set_routing(
+        self, id: str, prefixes: typing.List[str], sources: typing.List[str], domains: typing.List[str]
+    ) -> bool:
+        with metrics.span("uci_session"), UciBackend() as backend:
+            with metrics.span("uci_read"):
+                sections = _index_sections(backend.read("openvpn"), "openvpn")
+            changes = _ClientChanges(backend, sections)
+            previous = _routing(sections[id]) if id in sections else None
+            if not changes.set_routing(id, prefixes, sources, domains):
                 return False
 
-            backend.del_section("openvpn", id)
-            backend.del_from_list("firewall", "turris_vpn_client", "device", [f"vpn{id[:IF_NAME_LEN]}"])
+        OpenVpnClientUci._apply_routing(sections, changes.after, changes.released_slots)
+        with OpenwrtServices() as services:
+            # ip rules are managed by netifd, they change only when routing is enabled or disabled
+            if any(previous.values()) != bool(prefixes or sources or domains):
+                services.reload("network", delay=3)
+            if previous["domains"] != domains:
+                # dnsmasq is not the default resolver on every system
+                services.reload("dnsmasq", fail_on_error=False, delay=3)
+        return True
 
-            file_path = pathlib.Path("/etc/openvpn/foris") / f"{id}.conf"
-            BaseFile().delete_file(str(file_path))
+    @staticmethod
+    def _apply_routing(sections: typing.Dict[str, dict], states: ClientStates, released: typing.List[int]):
+        """ Routes traffic of enabled clients through their tunnels, routes of other clients are removed """
+        targets = {}
+        released = list(released)
+        for id, section in sections.items():
+            if not _is_foris_client(section) or "_route_slot" not in section["data"]:
+                continue
+            slot = int(section["data"]["_route_slot"])
+            state = states.get(id)
+            if state is None or not state.enabled:
+                released.append(slot)
+                continue
+            routing = _routing(section)
+            targets[id] = RouteTarget(
+                slot, state.dev, tuple(routing["prefixes"]), tuple(routing["sources"]), bool(routing["domains"])
+            )
+
+        try:
+            PolicyRouting().apply(targets, released)
+        except (BackendCommandFailed, OSError):
+            logger.exception("Failed to apply policy routing")
+
+    def list_groups(self) -> typing.List[dict]:
+        with UciBackend() as backend, metrics.span("uci_read"):
+            data = backend.read("openvpn")
+        return [_group(e) for e in get_sections_by_type(data, "openvpn", "client_group")]
 
-        self.restart_openvpn()
+    def add_group(
+        self, id: str, mode: str, members: typing.List[dict], probe: typing.Optional[str] = None,
+        max_latency: int = 0, interface: str = "lan",
+    ) -> bool:
+        return self._set_group(id, mode, members, probe, max_latency, interface, new=True)
 
+    def set_group(
+        self, id: str, mode: str, members: typing.List[dict], probe: typing.Optional[str] = None,
+        max_latency: int = 0, interface: str = "lan",
+    ) -> bool:
+        return self._set_group(id, mode, members, probe, max_latency, interface, new=False)
+
+    def _set_group(
+        self, id: str, mode: str, members: typing.List[dict], probe: typing.Optional[str],
+        max_latency: int, interface: str, new: bool,
+    ) -> bool:
+        with metrics.span("uci_session"), UciBackend() as backend:
+            with metrics.span("uci_read"):
+                sections = _index_sections(backend.read("openvpn"), "openvpn")
+            previous = sections[id]["data"].get("interface", "lan") if id in sections else None
+            changes = _ClientChanges(backend, sections)
+            if not changes.set_group(id, mode, members, probe, max_latency, interface, new):
+                return False
+
+        # ip rules are changed only when the group is added or its interface differs
+        self._groups_changed([], reload_network=previous != interface)
+        return True
+
+    def delete_group(self, id: str) -> bool:
+        with metrics.span("uci_session"), UciBackend() as backend:
+            with metrics.span("uci_read"):
+                sections = _index_sections(backend.read("openvpn"), "openvpn")
+            changes = _ClientChanges(backend, sections)
+            if not changes.delete_group(id):
+                return False
+
+        self._groups_changed(changes.released_groups, reload_network=True)
         return True
 
+    @staticmethod
+    def _groups_changed(released: typing.List[int], reload_network: bool):
+        OpenVpnClientUci.group_policies.invalidate()
+        OpenVpnClientUci.probe_targets.invalidate()
+        OpenVpnClientUci.probes.wake()
+        try:
+            for slot in released:
+                GroupRoutes().flush(group_table(slot))
+        except OSError:
+            logger.exception("Failed to remove routes of deleted group")
+        if reload_network:
+            with OpenwrtServices() as services:
+                services.reload("network", delay=3)
+        OpenVpnClientUci.groups.wake()
+
+    def get_group_status(self, id: typing.Optional[str] = None) -> typing.List[dict]:
+        """ Members which currently carry traffic of groups together with health of all members """
+        running = self._running_instances()
+        active, health = OpenVpnClientUci.groups.status()
+
+        res = []
+        for policy in sorted(self._group_policies().values(), key=lambda e: e.id):
+            if id is not None and policy.id != id:
+                continue
+            members = []
+            for member in policy.members:
+                # members which were not evaluated yet are considered healthy
+                state = health.get(probe_key(policy.id, member.id), {"healthy": True, "rtt": None})
+                item = {
+                    "id": member.id,
+                    "weight": member.weight,
+                    "running": member.id in running,
+                    "healthy": member.id in running and (state["healthy"] or not policy.probe),
+                }
+                if state["rtt"] is not None:
+                    item["rtt"] = round(state["rtt"], 1)
+                members.append(item)
+            res.append({"id": policy.id, "mode": policy.mode, "active": active.get(policy.id, []), "members": members})
+        return res
+
+    def submit(
+        self, operations: typing.List[dict]
+    ) -> typing.Tuple[typing.List[bool], str, typing.List[typing.Optional[str]]]:
+        """ Same as batch(), but services are always reconciled in background
+
+            Returns results of the operations, id of the job which tracks the restart
+            and actions which the restart performs on openvpn instances of set operations.
+        """
+        results, future, actions = self._apply(operations, inline=False)
+        if future is None:
+            # nothing was changed -> nothing to restart
+            future = Future()
+            future.set_result({"ids": [], "merged": 0, "waited": 0.0})
+        return results, OpenVpnClientUci.jobs.track(future), actions
+
+    def _apply(
+        self, operations: typing.List[dict], inline: bool
+    ) -> typing.Tuple[typing.List[bool], typing.Optional[Future], typing.List[typing.Optional[str]]]:
+        """ Returns results of the operations, future of the restart (None when nothing was changed)
+            and actions performed on openvpn instances by set operations
+        """
+        # session includes the final commit of all the changes
+        with metrics.span("uci_session"), UciBackend() as backend:
+            with metrics.span("uci_read"):
+                sections = _index_sections(backend.read("openvpn"), "openvpn")
+            changes = _ClientChanges(backend, sections)
+
+            results, actions = [], []
+            for operation in operations:
+                action = None
+                if operation["action"] == "add":
+                    res = changes.add(
+                        operation["id"], operation.get("config"), operation.get("credentials"), operation.get("upload")
+                    )
+                elif operation["action"] == "set":
+                    action = changes.set(operation["id"], operation["enabled"], operation.get("credentials"))
+                    res = action is not None
+                elif operation["action"] == "del":
+                    res = changes.delete(operation["id"])
+                else:
+                    raise ValueError(f"Unknown operation '{operation['action']}'")
+                results.append(res)
+                actions.append(action)
+
+        if changes.modified:
+            return results, self._reconcile(sections, changes, inline), actions
+
+        return results, None, actions
+
+    def _reconcile(self, sections: typing.Dict[str, dict], changes: _ClientChanges, inline: bool) -> Future:
+        OpenVpnClientUci.cache.invalidate()
+        if changes.routing:
+            OpenVpnClientUci._apply_routing(sections, changes.after, changes.released_slots)
+        OpenVpnClientUci.policies.invalidate()
+        OpenVpnClientUci.group_policies.invalidate()
+        OpenVpnClientUci.probe_targets.invalidate()
+        OpenVpnClientUci.probes.wake()
+        OpenVpnClientUci.scheduler.configure(
+            _float_option(sections, SETTINGS_SECTION, "restart_window", DEFAULT_WINDOW),
+            _float_option(sections, SETTINGS_SECTION, "restart_max_delay", DEFAULT_MAX_DELAY),
+            _float_option(sections, SETTINGS_SECTION, "ready_timeout", READY_TIMEOUT),
+        )
+        return OpenVpnClientUci.scheduler.request(changes.before, changes.after, inline=inline)
+
     @staticmethod
     def _set_client_credentials(
         backend: UciBackend,
@@ -176,14 +1169,15 @@ class OpenVpnClientUci:
                 backend.set_option("openvpn", client_id, "password", password)
 
     @staticmethod
-    def restart_openvpn():
+    def restart_openvpn() -> typing.List[dict]:
         """ Restart or reload network interfaces, openvpn itself and firewall rules.
             To make sure that as openvpn works as expected after reconfiguration.
+
+            Returns timings of the performed steps.
         """
-        with OpenwrtServices() as services:
-            MaintainCommands().restart_network()
-            services.restart("openvpn", delay=3)
-            # reload DNS resolver to try to use VPN native DNS
-            services.reload("resolver", delay=3)
-            # force firewall reload as it doesn't always get triggered by network restart
-            services.reload("firewall", delay=3)
+        with UciBackend() as backend, metrics.span("uci_read"):
+            sections = _index_sections(backend.read("openvpn"), "openvpn")
+        return restart_all(
+            [e.dev for e in _client_states(sections).values() if e.enabled],
+            _float_option(sections, SETTINGS_SECTION, "ready_timeout", READY_TIMEOUT),
+        )
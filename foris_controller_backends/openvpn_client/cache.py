@@ -0,0 +1,94 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import os
+import threading
+import time
+import typing
+
+RUNNING_TTL = 2.0
+
+
+class ClientListCache:
+    """ Caches parsed client sections and running openvpn instances
+
+        Parsed sections are valid as long as the uci config file is not replaced
+        or modified and until invalidate() is called. Running instances are kept
+        only for a short time.
+    """
+
+    def __init__(self, running_ttl: float = RUNNING_TTL):
+        self.running_ttl = running_ttl
+
+        self._lock = threading.Lock()
+        self._generation = 0  # results loaded before invalidate() are not stored
+        self._stamp: typing.Optional[tuple] = None
+        self._clients: typing.Optional[list] = None
+        self._running: typing.Optional[typing.Set[str]] = None
+        self._running_expires = 0.0
+        self._stats = {"config_hits": 0, "config_misses": 0, "running_hits": 0, "running_misses": 0}
+
+    @staticmethod
+    def _file_stamp(path: str) -> typing.Optional[tuple]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def clients(self, path: str, load: typing.Callable[[], list]) -> list:
+        """ Returns cached clients or calls `load` when config at `path` changed """
+        stamp = self._file_stamp(path)
+        with self._lock:
+            if stamp is not None and stamp == self._stamp and self._clients is not None:
+                self._stats["config_hits"] += 1
+                return self._clients
+            self._stats["config_misses"] += 1
+            generation = self._generation
+
+        clients = load()
+        with self._lock:
+            if generation == self._generation:
+                self._stamp, self._clients = stamp, clients
+        return clients
+
+    def running(self, load: typing.Callable[[], typing.Set[str]]) -> typing.Set[str]:
+        """ Returns cached running instances or calls `load` when they are too old """
+        now = time.monotonic()
+        with self._lock:
+            if self._running is not None and now < self._running_expires:
+                self._stats["running_hits"] += 1
+                return self._running
+            self._stats["running_misses"] += 1
+            generation = self._generation
+
+        running = load()
+        with self._lock:
+            if generation == self._generation:
+                self._running, self._running_expires = running, now + self.running_ttl
+        return running
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._stamp = self._clients = self._running = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,127 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import logging
+import time
+import typing
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from .metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 4
+READY_TIMEOUT = 10.0
+READY_POLL = 0.1
+
+
+class Step(typing.NamedTuple):
+    name: str
+    run: typing.Callable[[], None]
+    after: typing.Tuple[str, ...] = ()  # steps which have to be finished (and ready) first
+    ready: typing.Optional[typing.Callable[[], bool]] = None  # polled after run() until it returns True
+    timeout: float = READY_TIMEOUT  # dependent steps continue when readiness is not reached in time
+
+
+class StepFailed(Exception):
+    """ Step raised an exception (available as __cause__), steps which depend on it were skipped """
+
+    def __init__(self, step: str, steps: typing.List[dict]):
+        super().__init__(f"Step '{step}' failed")
+        self.step = step
+        self.steps = steps
+
+
+def _run_step(step: Step, origin: float) -> typing.Tuple[dict, typing.Optional[Exception]]:
+    started = time.monotonic()
+    timing = {"name": step.name, "started": round(started - origin, 3)}
+    try:
+        with metrics.span(step.name):
+            step.run()
+    except Exception as exc:
+        logger.warning("Step '%s' failed: %s", step.name, exc)
+        return {**timing, "duration": round(time.monotonic() - started, 3), "waited": 0.0, "result": "failed"}, exc
+
+    finished = time.monotonic()
+    result = "ok"
+    if step.ready:
+        deadline = finished + step.timeout
+        while not step.ready():
+            if time.monotonic() >= deadline:
+                logger.warning("Step '%s' is not ready after %.1f seconds", step.name, step.timeout)
+                result = "timeout"
+                break
+            time.sleep(READY_POLL)
+    timing.update(
+        duration=round(finished - started, 3), waited=round(time.monotonic() - finished, 3), result=result
+    )
+    return timing, None
+
+
+def run_steps(steps: typing.List[Step], max_workers: int = MAX_WORKERS) -> typing.List[dict]:
+    """ Runs steps concurrently as soon as the steps they depend on are done
+
+        Returns timing of each step (in the order of `steps`), offsets and durations are in seconds.
+        Raises StepFailed when any of the steps failed.
+    """
+    names = {e.name for e in steps}
+    for step in steps:
+        if not set(step.after) <= names:
+            raise ValueError(f"Unknown dependency of step '{step.name}': {sorted(set(step.after) - names)}")
+
+    origin = time.monotonic()
+    pending = {e.name: e for e in steps}
+    running: typing.Dict[Future, Step] = {}
+    timings: typing.Dict[str, dict] = {}
+    failed: typing.Optional[typing.Tuple[str, Exception]] = None
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="openvpn-client-step") as executor:
+        while pending or running:
+            for step in list(pending.values()):
+                if not all(e in timings for e in step.after):
+                    continue
+                del pending[step.name]
+                if any(timings[e]["result"] in ("failed", "skipped") for e in step.after):
+                    timings[step.name] = {
+                        "name": step.name, "started": round(time.monotonic() - origin, 3),
+                        "duration": 0.0, "waited": 0.0, "result": "skipped",
+                    }
+                else:
+                    running[executor.submit(_run_step, step, origin)] = step
+
+            if not running:
+                if pending:
+                    # skipped steps might have unblocked others
+                    if any(all(e in timings for e in step.after) for step in pending.values()):
+                        continue
+                    raise ValueError(f"Cyclic dependencies of steps {sorted(pending)}")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                timings[step.name], error = future.result()
+                if error is not None and failed is None:
+                    failed = step.name, error
+
+    result = [timings[e.name] for e in steps]
+    logger.debug("Steps performed: %s", result)
+    if failed:
+        raise StepFailed(failed[0], result) from failed[1]
+    return result
@@ -0,0 +1,118 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import copy
+import json
+import logging
+import re
+import tempfile
+import typing
+
+from foris_controller.exceptions import BackendCommandFailed
+from foris_controller_backends.cmdline import BaseCmdLine
+from foris_controller_backends.uci import UciBackend, get_option_named
+
+logger = logging.getLogger(__name__)
+
+ZONE_SECTION = "turris_vpn_client"
+NFT_PATH = "/usr/sbin/nft"
+DEVICE_KEYS = ("iifname", "oifname")
+
+
+def _device_match(expr: dict) -> typing.Optional[dict]:
+    match = expr.get("match")
+    if isinstance(match, dict) and match.get("left", {}).get("meta", {}).get("key") in DEVICE_KEYS:
+        return match
+    return None
+
+
+def zone_name() -> str:
+    """ fw4 names chains and rules of the zone after its name option """
+    with UciBackend() as backend:
+        data = backend.read("firewall")
+    return get_option_named(data, "firewall", ZONE_SECTION, "name", ZONE_SECTION)
+
+
+def zone_rule_updates(
+    ruleset: dict, zone: str, added: typing.Set[str], removed: typing.Set[str]
+) -> typing.Optional[typing.List[dict]]:
+    """ Returns nft json commands which replace device matches of the zone rules
+
+        None is returned when the rules can't be updated in place (zone rules are missing,
+        have unexpected form or the zone would have no devices left).
+    """
+    # rules generated by fw4 for the zone, e.g. "!fw4: Handle tr_vpn_cl IPv4/IPv6 input traffic"
+    comment_re = re.compile(rf"^!fw4: .*\b{re.escape(zone)}\b")
+    commands = []
+    for item in ruleset.get("nftables", []):
+        rule = item.get("rule")
+        if not rule or not comment_re.match(rule.get("comment", "")):
+            continue
+
+        rule = copy.deepcopy(rule)
+        matches = [e for e in (_device_match(expr) for expr in rule["expr"]) if e is not None]
+        if not matches:
+            continue
+        if len(matches) != 1:
+            return None
+
+        match = matches[0]
+        right = match["right"]
+        if isinstance(right, str):
+            devices = {right}
+        elif isinstance(right, dict) and isinstance(right.get("set"), list):
+            devices = set(right["set"])
+        else:
+            return None
+
+        devices = (devices - removed) | added
+        if not devices:
+            return None
+        match["right"] = devices.pop() if len(devices) == 1 else {"set": sorted(devices)}
+        commands.append({"replace": {"rule": {
+            k: rule[k] for k in ("family", "table", "chain", "handle", "expr", "comment")
+        }}})
+
+    return commands or None
+
+
+class Fw4ZoneDevices(BaseCmdLine):
+    """ Updates devices of the zone in the running fw4 ruleset without reloading the firewall """
+
+    def __init__(self, zone: str):
+        self.zone = zone
+
+    def update(self, added: typing.Set[str], removed: typing.Set[str]) -> bool:
+        """ Returns False when the ruleset was not updated and firewall has to be reloaded """
+        try:
+            output, _ = self._run_command_and_check_retval([NFT_PATH, "-j", "list", "table", "inet", "fw4"], 0)
+            commands = zone_rule_updates(json.loads(output), self.zone, added, removed)
+            if commands is None:
+                return False
+            # all the rules are replaced within a single transaction
+            with tempfile.NamedTemporaryFile("w", prefix="openvpn_client_fw4_", suffix=".json") as f:
+                json.dump({"nftables": commands}, f)
+                f.flush()
+                self._run_command_and_check_retval([NFT_PATH, "-j", "-f", f.name], 0)
+        except (BackendCommandFailed, OSError, ValueError, KeyError, TypeError):
+            logger.debug("Failed to update devices of zone '%s' in place", self.zone, exc_info=True)
+            return False
+
+        logger.debug("Devices of zone '%s' updated in place (+%s -%s)", self.zone, sorted(added), sorted(removed))
+        return True
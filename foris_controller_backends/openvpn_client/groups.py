@@ -0,0 +1,281 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import logging
+import threading
+import typing
+
+from foris_controller.exceptions import BackendCommandFailed
+from foris_controller_backends.cmdline import BaseCmdLine
+
+from .metrics import registry as metrics
+from .probes import ProbeTarget
+from .routing import MAX_SLOTS, TABLE_BASE
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 5.0  # seconds between latency probes
+PROBE_TIMEOUT = 1.0
+RECOVERY_PROBES = 2  # member which failed is used again after this number of successful probes
+MAX_LOSS = 0.5  # member which lost more of its recent probes is not healthy
+GROUP_PRIORITY = 6000  # after rules of per client policy routing
+GROUP_TABLE_BASE = TABLE_BASE + MAX_SLOTS
+MAX_GROUPS = 32
+ROUTE_METRIC = "1"
+BLACKHOLE_METRIC = "65535"
+
+
+def group_table(slot: int) -> int:
+    return GROUP_TABLE_BASE + slot
+
+
+def group_priority(slot: int) -> int:
+    """ priority of the rule which skips default routes of the main table, the group table follows """
+    return GROUP_PRIORITY + 2 * slot
+
+
+class GroupMember(typing.NamedTuple):
+    id: str
+    weight: int = 1
+
+
+class GroupPolicy(typing.NamedTuple):
+    """ Group settings (stored in client_group section of openvpn config) """
+    id: str
+    mode: str  # failover or balance
+    members: typing.Tuple[GroupMember, ...]  # in order of preference
+    slot: int
+    probe: typing.Optional[typing.Tuple[str, int]] = None  # host and port used to measure latency
+    max_latency: float = 0.0  # seconds, 0 means that any latency is fine
+
+
+def select_members(policy: GroupPolicy, healthy: typing.Set[str]) -> typing.Tuple[GroupMember, ...]:
+    """ Members which should carry traffic of the group """
+    candidates = tuple(e for e in policy.members if e.id in healthy)
+    if policy.mode == "failover":
+        return candidates[:1]
+    return candidates
+
+
+def probe_key(group: str, member: str) -> str:
+    """ key of the probe of group member in the probe engine (client probes are keyed by client ids) """
+    return f"{group}:{member}"
+
+
+def probe_targets(policy: GroupPolicy, dev: typing.Callable[[str], str]) -> typing.Dict[str, ProbeTarget]:
+    """ Probes of the group target sent through tunnels (`dev` of member id) of all the members """
+    if not policy.probe:
+        return {}
+    return {
+        probe_key(policy.id, e.id): ProbeTarget(
+            "tcp", *policy.probe, interval=CHECK_INTERVAL, dev=dev(e.id), timeout=PROBE_TIMEOUT
+        )
+        for e in policy.members
+    }
+
+
+def probe_healthy(stats: dict, max_latency: float, recovering: bool) -> bool:
+    """ The last probe succeeded, most of the recent ones were not lost and median RTT is within `max_latency`
+
+        Member which is recovering has to succeed repeatedly.
+    """
+    if "rtt_last" not in stats or stats["loss"] > MAX_LOSS:
+        return False
+    if recovering and stats["samples"] - stats["lost"] < RECOVERY_PROBES:
+        return False
+    return not max_latency or stats["rtt_p50"] <= max_latency * 1000
+
+
+class _Member:
+    __slots__ = ("healthy", "rtt")
+
+    def __init__(self):
+        self.healthy = True
+        self.rtt: typing.Optional[float] = None  # median in milliseconds
+
+
+class GroupManager:
+    """ Routes traffic of client groups through their healthy members
+
+        Member is healthy when its instance is running and (when the group has a probe target)
+        its probes measured by the probe engine (see `stats`) succeed within `max_latency`.
+        Routes are switched right after the running state changes (see wake()) and probe
+        results are re-evaluated every `interval`. Only routes are changed, so openvpn
+        instances of standby members keep running.
+    """
+
+    def __init__(
+        self,
+        load: typing.Callable[[], typing.Dict[str, GroupPolicy]],
+        running: typing.Callable[[typing.Set[str]], typing.Set[str]],
+        switch: typing.Callable[[GroupPolicy, typing.Tuple[GroupMember, ...]], None],
+        stats: typing.Callable[[typing.Set[str]], typing.Dict[str, dict]],
+        interval: float = CHECK_INTERVAL,
+    ):
+        self.load = load
+        self.running = running  # which of the given instances are running
+        self.switch = switch
+        self.stats = stats  # probe statistics of the given probe_key()s
+        self.interval = interval
+        self.listener: typing.Optional[typing.Callable[[str, dict], None]] = None
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._members: typing.Dict[str, _Member] = {}  # keyed by probe_key()
+        self._active: typing.Dict[str, typing.Tuple[GroupMember, ...]] = {}
+        self._stale: typing.Set[str] = set()  # groups whose routes have to be added again
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="openvpn-client-groups", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """ re-evaluate groups right now (e.g. a member went down) """
+        self._wake.set()
+
+    def member_started(self, id: str):
+        """ routes through the tunnel disappeared together with its device when the instance was restarted """
+        with self._lock:
+            self._stale.update(k for k, v in self._active.items() if any(e.id == id for e in v))
+        self.wake()
+
+    def _run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Evaluation of client groups failed")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _healthy(self, policy: GroupPolicy, running: typing.Set[str], stats: typing.Dict[str, dict]) -> typing.Set[str]:
+        res = set()
+        with self._lock:
+            for member in policy.members:
+                health = self._members.setdefault(probe_key(policy.id, member.id), _Member())
+                if member.id not in running:
+                    # member which was restarted has to prove it works again
+                    health.healthy, health.rtt = not policy.probe, None
+                    continue
+                if not policy.probe:
+                    res.add(member.id)
+                    continue
+                member_stats = stats.get(probe_key(policy.id, member.id))
+                # members which were not probed yet keep their state
+                if member_stats and member_stats["samples"]:
+                    health.healthy = probe_healthy(member_stats, policy.max_latency, not health.healthy)
+                    health.rtt = member_stats.get("rtt_p50")
+                if health.healthy:
+                    res.add(member.id)
+        return res
+
+    def tick(self):
+        policies = self.load()
+        members = {probe_key(policy.id, e.id) for policy in policies.values() for e in policy.members}
+
+        with self._lock:
+            for id in set(self._active) - set(policies):
+                del self._active[id]
+            self._stale &= set(policies)
+            for key in set(self._members) - members:
+                del self._members[key]
+
+        if not policies:
+            # nothing to query when the feature is not used
+            return
+        running = self.running({e.id for policy in policies.values() for e in policy.members})
+        probed = {probe_key(policy.id, e.id) for policy in policies.values() if policy.probe for e in policy.members}
+        stats = self.stats(probed) if probed else {}
+
+        for id, policy in sorted(policies.items()):
+            active = select_members(policy, self._healthy(policy, running, stats))
+            with self._lock:
+                previous = self._active.get(id)
+                if previous == active and id not in self._stale:
+                    continue
+            try:
+                self.switch(policy, active)
+            except Exception:
+                logger.exception("Switching of group '%s' failed", id)
+                continue
+            with self._lock:
+                self._active[id] = active
+                self._stale.discard(id)
+            if previous == active:
+                logger.debug("Routes of group '%s' were restored", id)
+                continue
+            logger.info("Traffic of group '%s' is routed through %s", id, [e.id for e in active])
+            self._report("group_switched", {"id": id, "active": [e.id for e in active]})
+
+    def status(self) -> typing.Tuple[typing.Dict[str, typing.List[str]], typing.Dict[str, dict]]:
+        """ Returns active members of groups and health of members (keyed by probe_key()) """
+        with self._lock:
+            active = {k: [e.id for e in v] for k, v in self._active.items()}
+            members = {
+                k: {"healthy": v.healthy, "rtt": v.rtt} for k, v in self._members.items()
+            }
+        return active, members
+
+    def _report(self, action: str, data: dict):
+        if self.listener:
+            try:
+                self.listener(action, data)
+            except Exception:
+                logger.exception("Failed to report %s of '%s'", action, data["id"])
+
+
+class GroupRoutes(BaseCmdLine):
+    """ Default routes of group routing tables
+
+        Table contains a blackhole route, so traffic of the group is dropped instead of leaking
+        outside of the tunnels when none of the members is healthy.
+    """
+
+    def _ip(self, *args: str, check: bool = True):
+        try:
+            self._run_command_and_check_retval(["/sbin/ip", *args], 0)
+        except BackendCommandFailed:
+            if check:
+                raise
+
+    def switch(self, table: int, nexthops: typing.List[typing.Tuple[str, int]]):
+        """ Routes the table through devices (weighted multipath when there are more of them) """
+        number = str(table)
+        with metrics.span("group_switch"):
+            for family in ("-4", "-6"):
+                check = family == "-4"  # IPv6 might be disabled
+                self._ip(family, "route", "replace", "blackhole", "default", "table", number,
+                         "metric", BLACKHOLE_METRIC, check=check)
+                route = [family, "route", "replace", "default", "table", number, "metric", ROUTE_METRIC]
+                if not nexthops:
+                    self._ip(family, "route", "del", "default", "table", number, "metric", ROUTE_METRIC, check=False)
+                elif len(nexthops) == 1:
+                    self._ip(*route, "dev", nexthops[0][0], check=check)
+                else:
+                    for dev, weight in nexthops:
+                        route.extend(["nexthop", "dev", dev, "weight", str(weight)])
+                    self._ip(*route, check=check)
+
+    def flush(self, table: int):
+        for family in ("-4", "-6"):
+            self._ip(family, "route", "flush", "table", str(table), check=False)
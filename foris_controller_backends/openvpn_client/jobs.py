@@ -0,0 +1,77 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import logging
+import threading
+import typing
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+MAX_JOBS = 256  # the oldest finished jobs are forgotten
+
+
+class JobRegistry:
+    """ Tracks restarts performed in background after an asynchronous request
+
+        Each job wraps a future returned by RestartScheduler.request().
+    """
+
+    def __init__(self, max_jobs: int = MAX_JOBS):
+        self.max_jobs = max_jobs
+        self.listener: typing.Optional[typing.Callable[[dict], None]] = None
+
+        self._lock = threading.Lock()
+        self._jobs: typing.Dict[str, dict] = OrderedDict()
+
+    def track(self, future: Future) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {"job_id": job_id, "status": "pending"}
+            self._cleanup()
+        # callback is called right away when the future is already resolved
+        future.add_done_callback(lambda f: self._finished(job_id, f))
+        return job_id
+
+    def _cleanup(self):
+        finished = [k for k, v in self._jobs.items() if v["status"] != "pending"]
+        for job_id in finished[:max(len(self._jobs) - self.max_jobs, 0)]:
+            del self._jobs[job_id]
+
+    def _finished(self, job_id: str, future: Future):
+        exc = future.exception()
+        if exc is None:
+            job = {"job_id": job_id, "status": "succeeded", "report": future.result()}
+        else:
+            job = {"job_id": job_id, "status": "failed", "error": str(exc) or type(exc).__name__}
+
+        with self._lock:
+            self._jobs[job_id] = job
+
+        if self.listener:
+            try:
+                self.listener(dict(job))
+            except Exception:
+                logger.exception("Failed to report finished job '%s'", job_id)
+
+    def status(self, job_id: str) -> dict:
+        with self._lock:
+            return dict(self._jobs.get(job_id, {"job_id": job_id, "status": "unknown"}))
@@ -0,0 +1,184 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import logging
+import socket
+import threading
+import typing
+
+from foris_controller_backends.files import inject_file_root
+
+logger = logging.getLogger(__name__)
+
+MANAGEMENT_PATH = "/var/run/openvpn.{}.mgmt"
+TIMEOUT = 2.0
+BYTECOUNT_INTERVAL = 5  # seconds between >BYTECOUNT: notifications
+
+
+class ManagementError(Exception):
+    pass
+
+
+class ManagementConnection:
+    """ Persistent connection to openvpn management interface (unix socket) """
+
+    def __init__(self, path: str, timeout: float = TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.bytecount: typing.Optional[typing.Tuple[int, int]] = None
+
+        self._sock: typing.Optional[socket.socket] = None
+        self._file = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(inject_file_root(self.path))
+        except OSError:
+            sock.close()
+            raise
+        self._sock, self._file = sock, sock.makefile("r", encoding="utf-8", newline="\n")
+        # let openvpn push byte counters on its own
+        self.command(f"bytecount {BYTECOUNT_INTERVAL}")
+
+    def close(self):
+        if self._sock:
+            self._file.close()
+            self._sock.close()
+        self._sock = self._file = None
+
+    def _readline(self) -> str:
+        line = self._file.readline()
+        if not line:
+            raise ManagementError("connection closed")
+        return line.rstrip("\r\n")
+
+    def _handle_realtime(self, line: str):
+        # >BYTECOUNT:{BYTES_IN},{BYTES_OUT}
+        if line.startswith(">BYTECOUNT:"):
+            bytes_in, _, bytes_out = line[len(">BYTECOUNT:"):].partition(",")
+            try:
+                self.bytecount = int(bytes_in), int(bytes_out)
+            except ValueError:
+                pass
+
+    def command(self, cmd: str, multiline: bool = False) -> typing.List[str]:
+        """ Sends a command and returns lines of the reply
+
+            Multi-line replies are terminated by END, others are a single SUCCESS/ERROR line.
+        """
+        if self._sock is None:
+            self._connect()
+
+        self._sock.sendall(f"{cmd}\n".encode())
+        lines = []
+        while True:
+            line = self._readline()
+            if line.startswith(">"):
+                self._handle_realtime(line)
+                continue
+            if line.startswith("ERROR:"):
+                raise ManagementError(line)
+            if not multiline:
+                return [line]
+            if line == "END":
+                return lines
+            lines.append(line)
+
+
+def parse_state(lines: typing.List[str]) -> dict:
+    """ Parses reply to `state` command
+
+        {TIME},{STATE},{DESC},{LOCAL_IP},{REMOTE_IP},{REMOTE_PORT},{LOCAL_ADDR},{LOCAL_PORT},{LOCAL_IPV6}
+    """
+    if not lines:
+        return {}
+    fields = lines[-1].split(",")
+    fields += [""] * (9 - len(fields))
+    res = {"state": fields[1], "state_since": int(fields[0]) if fields[0].isdigit() else 0}
+    if fields[3]:
+        res["vpn_ip"] = fields[3]
+    if fields[4]:
+        res["remote_ip"] = fields[4]
+    if fields[5].isdigit():
+        res["remote_port"] = int(fields[5])
+    return res
+
+
+def parse_load_stats(lines: typing.List[str]) -> dict:
+    """ Parses reply to `load-stats` command
+
+        SUCCESS: nclients=0,bytesin=123,bytesout=456
+    """
+    values = {}
+    for item in lines[0].partition(":")[2].strip().split(","):
+        key, _, value = item.partition("=")
+        if value.isdigit():
+            values[key] = int(value)
+    res = {}
+    if "bytesin" in values and "bytesout" in values:
+        res["bytes_in"], res["bytes_out"] = values["bytesin"], values["bytesout"]
+    return res
+
+
+class ManagementPool:
+    """ Keeps one persistent management connection per client """
+
+    def __init__(self, timeout: float = TIMEOUT):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._connections: typing.Dict[str, typing.Tuple[ManagementConnection, threading.Lock]] = {}
+
+    def _connection(self, id: str) -> typing.Tuple[ManagementConnection, threading.Lock]:
+        with self._lock:
+            if id not in self._connections:
+                self._connections[id] = (
+                    ManagementConnection(MANAGEMENT_PATH.format(id), self.timeout), threading.Lock()
+                )
+            return self._connections[id]
+
+    def stats(self, id: str) -> typing.Optional[dict]:
+        """ Returns live statistics of the client or None when management is not reachable """
+        connection, lock = self._connection(id)
+        with lock:
+            # stale connection (e.g. instance restarted) is reopened once
+            for attempt in range(2):
+                try:
+                    res = parse_state(connection.command("state", multiline=True))
+                    res.update(parse_load_stats(connection.command("load-stats")))
+                    break
+                except (OSError, ManagementError) as exc:
+                    connection.close()
+                    if attempt:
+                        logger.debug("Management of '%s' is not available: %s", id, exc)
+                        return None
+
+            # counters pushed by openvpn are used only when load-stats doesn't provide them
+            if connection.bytecount and "bytes_in" not in res:
+                res["bytes_in"], res["bytes_out"] = connection.bytecount
+        return res
+
+    def forget(self, ids: typing.Iterable[str]):
+        """ close connections of clients which no longer exist """
+        with self._lock:
+            for id in set(self._connections) - set(ids):
+                connection, lock = self._connections.pop(id)
+                with lock:
+                    connection.close()
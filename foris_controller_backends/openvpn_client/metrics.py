@@ -0,0 +1,131 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import contextlib
+import functools
+import threading
+import time
+import typing
+
+# upper bounds (in seconds) of histogram buckets exported to prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_PREFIX = "foris_openvpn_client"
+
+
+class _Span:
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """ Collects durations of named stages (uci access, service restarts, ...) in memory """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans: typing.Dict[str, _Span] = {}
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self._spans.setdefault(name, _Span()).observe(seconds)
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        """ Measures the duration of the with block (failed attempts are measured as well) """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name: str):
+        """ Decorator which measures each call of the function """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self) -> typing.List[dict]:
+        with self._lock:
+            return [
+                {
+                    "name": name,
+                    "count": span.count,
+                    "total": round(span.total, 6),
+                    "min": round(span.min, 6),
+                    "max": round(span.max, 6),
+                    "avg": round(span.total / span.count, 6),
+                }
+                for name, span in sorted(self._spans.items())
+            ]
+
+    def prometheus(self, cache_stats: typing.Optional[typing.Dict[str, int]] = None) -> str:
+        """ Exports spans as histograms in prometheus text format """
+        name = f"{PROMETHEUS_PREFIX}_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Duration of openvpn_client stages.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for stage, span in sorted(self._spans.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, span.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {span.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {span.total:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {span.count}')
+
+        if cache_stats is not None:
+            name = f"{PROMETHEUS_PREFIX}_cache_lookups_total"
+            lines += [f"# HELP {name} Lookups of the client list cache.", f"# TYPE {name} counter"]
+            for key, value in sorted(cache_stats.items()):
+                cache, _, result = key.rpartition("_")  # e.g. config_hits
+                result = {"hits": "hit", "misses": "miss"}.get(result, result)
+                lines.append(f'{name}{{cache="{cache}",result="{result}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,144 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import json
+import logging
+import os
+import select
+import subprocess
+import threading
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+RESYNC_INTERVAL = 60.0  # events might be missed (e.g. process exit before respawn)
+RETRY_INTERVAL = 30.0
+
+
+class InstanceMonitor:
+    """ Keeps running state of openvpn instances up to date using procd events
+
+        Events are read from a single long running `ubus subscribe service` process.
+        The table is seeded and periodically resynchronized by `load` which returns
+        currently running instances.
+    """
+
+    def __init__(self, load: typing.Callable[[], typing.Set[str]]):
+        self.load = load
+        self.listener: typing.Optional[typing.Callable[[str, bool], None]] = None
+
+        self._lock = threading.Lock()
+        self._states: typing.Dict[str, bool] = {}
+        self._active = False
+        self._seeded = False
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="openvpn-client-monitor", daemon=True)
+            self._thread.start()
+
+    def running_instances(self) -> typing.Optional[typing.Set[str]]:
+        """ returns running instances or None when events are not being received """
+        with self._lock:
+            if not self._active:
+                return None
+            return {k for k, v in self._states.items() if v}
+
+    def _set_state(self, instance: str, running: bool, report: bool = True):
+        with self._lock:
+            changed = self._states.get(instance, False) != running
+            self._states[instance] = running
+
+        if changed and report and self.listener:
+            try:
+                self.listener(instance, running)
+            except Exception:
+                logger.exception("Failed to report state change of '%s'", instance)
+
+    def _resync(self):
+        running = self.load()
+        with self._lock:
+            known = set(self._states)
+        # initial state is not a change
+        for instance in known | running:
+            self._set_state(instance, instance in running, report=self._seeded)
+        self._seeded = True
+
+    def handle_event(self, line: str):
+        """ handles single line printed by `ubus subscribe service` """
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return
+        if not isinstance(event, dict):
+            return
+
+        for event_type, data in event.items():
+            if not isinstance(data, dict) or data.get("service") != "openvpn" or "instance" not in data:
+                continue
+            if event_type == "instance.start":
+                self._set_state(data["instance"], True)
+            elif event_type in ("instance.stop", "instance.fail", "instance.respawn"):
+                self._set_state(data["instance"], False)
+
+    def _read_events(self, process: subprocess.Popen):
+        buffer = b""
+        last_resync = time.monotonic()
+        while True:
+            timeout = max(last_resync + RESYNC_INTERVAL - time.monotonic(), 0)
+            ready, _, _ = select.select([process.stdout], [], [], timeout)
+            if ready:
+                chunk = os.read(process.stdout.fileno(), 4096)
+                if not chunk:
+                    return
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    self.handle_event(line.decode(errors="replace"))
+            if time.monotonic() - last_resync >= RESYNC_INTERVAL:
+                self._resync()
+                last_resync = time.monotonic()
+
+    def _run(self):
+        while True:
+            try:
+                process = subprocess.Popen(["/bin/ubus", "-S", "subscribe", "service"], stdout=subprocess.PIPE)
+            except OSError:
+                logger.warning("Unable to subscribe to procd events, running state will be polled")
+                return
+
+            try:
+                self._resync()
+                with self._lock:
+                    self._active = True
+                self._read_events(process)
+            except Exception:
+                logger.exception("Processing of procd events failed")
+            finally:
+                with self._lock:
+                    self._active = False
+                process.kill()
+                process.wait()
+
+            logger.warning("Subscription to procd events ended, retrying in %d seconds", RETRY_INTERVAL)
+            time.sleep(RETRY_INTERVAL)
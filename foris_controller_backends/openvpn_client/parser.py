@@ -0,0 +1,211 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import threading
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from .store import config_digest
+
+DEFAULT_PORT = 1194
+DEFAULT_PROTO = "udp"
+
+# directives which make sense only for openvpn server
+SERVER_DIRECTIVES = {
+    "server", "server-bridge", "server-ipv6", "client-config-dir", "ifconfig-pool", "duplicate-cn", "client-to-client",
+}
+# directives which are set by the init script or by this module
+MANAGED_DIRECTIVES = {
+    "status", "management", "daemon", "log", "log-append", "syslog", "writepid", "cd", "chroot",
+}
+CACHE_SIZE = 256
+
+
+class Remote(typing.NamedTuple):
+    host: str
+    port: int
+    proto: str
+
+
+class Directive(typing.NamedTuple):
+    name: str
+    args: typing.List[str]
+    line: int
+
+
+@dataclass
+class ParsedConfig:
+    directives: typing.List[Directive] = field(default_factory=list)
+    blocks: typing.Dict[str, str] = field(default_factory=dict)
+    remotes: typing.List[Remote] = field(default_factory=list)
+    dev: typing.Optional[str] = None
+    errors: typing.List[str] = field(default_factory=list)
+    warnings: typing.List[str] = field(default_factory=list)
+
+    def conflicts(self, dev: str) -> typing.List[str]:
+        """ Warnings which depend on the client the config belongs to """
+        if self.dev is not None and self.dev != dev:
+            return [f"'dev {self.dev}' conflicts with interface '{dev}' managed by foris"]
+        return []
+
+    def metadata(self, dev: str) -> dict:
+        res = {"remotes": [e._asdict() for e in self.remotes], "warnings": self.warnings + self.conflicts(dev)}
+        if self.errors:
+            res["errors"] = self.errors
+        return res
+
+
+def split_line(line: str) -> typing.List[str]:
+    """ Splits line into tokens the same way as openvpn does (quotes, escapes and comments) """
+    tokens: typing.List[str] = []
+    token: typing.Optional[str] = None
+    quote = None
+    escaped = False
+    for char in line:
+        if escaped:
+            token = (token or "") + char
+            escaped = False
+        elif char == "\\" and quote != "'":
+            escaped = True
+        elif quote:
+            if char == quote:
+                quote = None
+            else:
+                token += char
+        elif char in "\"'":
+            quote = char
+            token = token or ""
+        elif char.isspace():
+            if token is not None:
+                tokens.append(token)
+                token = None
+        elif char in "#;" and token is None:
+            break
+        else:
+            token = (token or "") + char
+    if token is not None:
+        tokens.append(token)
+    return tokens
+
+
+def parse_config(config: typing.Union[str, typing.Iterable[str]]) -> ParsedConfig:
+    """ Tokenizes client config and validates directives which are relevant for foris
+
+        `config` is either the content or its lines (e.g. an open file which is read line by line).
+    """
+    res = ParsedConfig()
+    proto, port = DEFAULT_PROTO, DEFAULT_PORT
+    remotes: typing.List[typing.List[str]] = []
+    block_name, block_lines, block_start = None, [], 0
+
+    lines = config.splitlines() if isinstance(config, str) else (e.rstrip("\r\n") for e in config)
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if block_name is not None:
+            if stripped == f"</{block_name}>":
+                res.blocks[block_name] = "\n".join(block_lines) + "\n"
+                if block_name == "connection":
+                    # only remotes are interesting within the connection profile
+                    remotes += [e.args for e in parse_config(res.blocks[block_name]).directives if e.name == "remote"]
+                block_name = None
+            else:
+                block_lines.append(line)
+            continue
+
+        if stripped.startswith("</") and stripped.endswith(">"):
+            res.errors.append(f"line {number}: unexpected '{stripped}'")
+            continue
+        if stripped.startswith("<") and stripped.endswith(">"):
+            block_name, block_lines, block_start = stripped[1:-1], [], number
+            continue
+
+        tokens = split_line(line)
+        if not tokens:
+            continue
+        name = tokens[0][2:] if tokens[0].startswith("--") else tokens[0]
+        directive = Directive(name, tokens[1:], number)
+        res.directives.append(directive)
+
+        if name == "remote" and directive.args:
+            remotes.append(directive.args)
+        elif name == "proto" and directive.args:
+            proto = directive.args[0]
+        elif name in ("port", "rport") and directive.args and directive.args[0].isdigit():
+            port = int(directive.args[0])
+        elif name == "dev" and directive.args:
+            res.dev = directive.args[0]
+        elif name in SERVER_DIRECTIVES or (name == "mode" and directive.args[:1] == ["server"]):
+            res.errors.append(f"line {number}: '{name}' is not supported in client config")
+        elif name in MANAGED_DIRECTIVES:
+            res.warnings.append(f"line {number}: '{name}' is overridden")
+
+    if block_name is not None:
+        res.errors.append(f"line {block_start}: <{block_name}> is not terminated")
+
+    for args in remotes:
+        remote_port = int(args[1]) if len(args) > 1 and args[1].isdigit() else port
+        res.remotes.append(Remote(args[0], remote_port, args[2] if len(args) > 2 else proto))
+
+    names = {e.name for e in res.directives}
+    if "client" not in names and not {"pull", "tls-client"} <= names:
+        res.warnings.append("'client' directive is missing")
+    if not res.remotes:
+        res.warnings.append("no 'remote' is specified")
+
+    return res
+
+
+class ParserCache:
+    """ Keeps parsed configs by the hash of their content """
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._parsed: typing.Dict[str, ParsedConfig] = OrderedDict()
+
+    def get(self, digest: str) -> typing.Optional[ParsedConfig]:
+        with self._lock:
+            res = self._parsed.get(digest)
+            if res is not None:
+                self._parsed.move_to_end(digest)
+            return res
+
+    def _store(self, digest: str, parsed: ParsedConfig):
+        with self._lock:
+            self._parsed[digest] = parsed
+            while len(self._parsed) > self.size:
+                self._parsed.popitem(last=False)
+
+    def parse(self, config: str, digest: typing.Optional[str] = None) -> ParsedConfig:
+        digest = digest or config_digest(config)
+        res = self.get(digest)
+        if res is None:
+            res = parse_config(config)
+            self._store(digest, res)
+        return res
+
+    def parse_file(self, path: str, digest: str) -> ParsedConfig:
+        """ Parses config file line by line, its content is never loaded at once """
+        res = self.get(digest)
+        if res is None:
+            with open(path, errors="replace") as f:
+                res = parse_config(f)
+            self._store(digest, res)
+        return res
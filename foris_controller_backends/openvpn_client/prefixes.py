@@ -0,0 +1,109 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import ipaddress
+import typing
+
+Network = typing.Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class _Node:
+    __slots__ = ("children", "covered")
+
+    def __init__(self):
+        self.children: typing.List[typing.Optional[_Node]] = [None, None]
+        self.covered = False  # whole subtree is part of the set
+
+
+class PrefixTrie:
+    """ Binary trie of prefixes of a single address family
+
+        Prefixes covered by shorter ones are dropped when inserted and sibling prefixes
+        are merged into their parent, so `prefixes()` returns the smallest equivalent set.
+    """
+
+    def __init__(self, version: int = 4):
+        self.version = version
+        self.bits = 32 if version == 4 else 128
+        self._root = _Node()
+
+    def add(self, network: Network):
+        if network.version != self.version:
+            raise ValueError(f"{network} is not an IPv{self.version} prefix")
+
+        address = int(network.network_address)
+        node = self._root
+        path = []
+        for depth in range(network.prefixlen):
+            if node.covered:
+                return
+            bit = (address >> (self.bits - 1 - depth)) & 1
+            if node.children[bit] is None:
+                node.children[bit] = _Node()
+            path.append(node)
+            node = node.children[bit]
+
+        node.covered = True
+        node.children = [None, None]
+
+        # merge complete siblings upwards
+        for parent in reversed(path):
+            left, right = parent.children
+            if not (left and left.covered and right and right.covered):
+                break
+            parent.covered = True
+            parent.children = [None, None]
+
+    def __contains__(self, address: typing.Union[ipaddress.IPv4Address, ipaddress.IPv6Address]) -> bool:
+        value, node = int(address), self._root
+        for depth in range(self.bits):
+            if node.covered:
+                return True
+            node = node.children[(value >> (self.bits - 1 - depth)) & 1]
+            if node is None:
+                return False
+        return node.covered
+
+    def prefixes(self) -> typing.List[Network]:
+        """ Returns the compacted prefixes ordered by address """
+        network_class = ipaddress.IPv4Network if self.version == 4 else ipaddress.IPv6Network
+        res = []
+        stack = [(self._root, 0, 0)]
+        while stack:
+            node, value, depth = stack.pop()
+            if node.covered:
+                res.append(network_class((value << (self.bits - depth), depth)))
+                continue
+            # right child is pushed first so that the output is ordered
+            for bit in (1, 0):
+                child = node.children[bit]
+                if child is not None:
+                    stack.append((child, (value << 1) | bit, depth + 1))
+        return res
+
+
+def compile_prefixes(
+    values: typing.Iterable[str],
+) -> typing.Tuple[typing.List[ipaddress.IPv4Network], typing.List[ipaddress.IPv6Network]]:
+    """ Parses prefixes (host bits are ignored) and returns compacted IPv4 and IPv6 prefixes """
+    tries = {4: PrefixTrie(4), 6: PrefixTrie(6)}
+    for value in values:
+        network = ipaddress.ip_network(value, strict=False)
+        tries[network.version].add(network)
+    return tries[4].prefixes(), tries[6].prefixes()
@@ -0,0 +1,321 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import array
+import asyncio
+import logging
+import math
+import os
+import socket
+import struct
+import threading
+import typing
+
+from foris_controller_openvpn_client_module.utils import parse_probe
+
+logger = logging.getLogger(__name__)
+
+PROBE_KINDS = ("tcp", "udp", "icmp")
+DEFAULT_INTERVAL = 10.0
+MIN_INTERVAL = 1.0
+TIMEOUT = 2.0
+HISTORY_SIZE = 120  # samples kept for each client
+RELOAD_INTERVAL = 30.0
+# DNS query for NS records of the root zone, DNS servers reply to it and other services usually ignore it
+UDP_PAYLOAD = struct.pack("!HHHHHH", 0x466F, 0x0100, 1, 0, 0, 0) + b"\0" + struct.pack("!HH", 2, 1)
+ICMP_PAYLOAD = b"foris-openvpn-client-probe"
+SO_BINDTODEVICE = getattr(socket, "SO_BINDTODEVICE", 25)
+
+
+class ProbeTarget(typing.NamedTuple):
+    kind: str  # tcp, udp or icmp
+    host: str
+    port: int = 0  # not used by icmp
+    interval: float = DEFAULT_INTERVAL
+    dev: typing.Optional[str] = None  # probes are sent through this device only
+    timeout: float = TIMEOUT
+
+    @property
+    def spec(self) -> str:
+        if self.kind == "icmp":
+            return f"icmp:{self.host}"
+        host = f"[{self.host}]" if ":" in self.host else self.host
+        return f"{self.kind}:{host}:{self.port}"
+
+
+def parse_probe_spec(value: str) -> typing.Optional[typing.Tuple[str, str, int]]:
+    """ Parses "tcp:<host>:<port>", "udp:<host>:<port>" or "icmp:<IPv4 address>" """
+    kind, _, rest = value.partition(":")
+    if kind == "icmp":
+        try:
+            socket.inet_aton(rest)
+        except OSError:
+            return None
+        return kind, rest, 0
+    if kind not in PROBE_KINDS:
+        return None
+    address = parse_probe(rest)
+    return None if address is None else (kind, *address)
+
+
+class RttHistory:
+    """ Ring buffer of the latest round trip times (NaN stands for a lost probe) """
+
+    __slots__ = ("_values", "_next", "_count")
+
+    def __init__(self, size: int = HISTORY_SIZE):
+        self._values = array.array("d", [math.nan] * size)
+        self._next = 0
+        self._count = 0
+
+    def add(self, rtt: typing.Optional[float]):
+        self._values[self._next] = math.nan if rtt is None else rtt
+        self._next = (self._next + 1) % len(self._values)
+        self._count = min(self._count + 1, len(self._values))
+
+    def clear(self):
+        self._next = self._count = 0
+
+    def stats(self) -> dict:
+        """ Number of samples, loss and percentiles of RTT in milliseconds """
+        values = self._values[:self._count]
+        rtts = sorted(e for e in values if not math.isnan(e))
+        lost = self._count - len(rtts)
+        res = {"samples": self._count, "lost": lost, "loss": round(lost / self._count, 3) if self._count else 0.0}
+        if rtts:
+            # nearest rank
+            res["rtt_p50"] = round(rtts[math.ceil(len(rtts) * 0.5) - 1] * 1000, 2)
+            res["rtt_p95"] = round(rtts[math.ceil(len(rtts) * 0.95) - 1] * 1000, 2)
+        last = self._values[self._next - 1]
+        if self._count and not math.isnan(last):
+            res["rtt_last"] = round(last * 1000, 2)
+        return res
+
+
+def _socket(target: ProbeTarget, family: int, type: int, proto: int = 0) -> socket.socket:
+    sock = socket.socket(family, type, proto)
+    try:
+        if target.dev:
+            sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, target.dev.encode())
+        sock.setblocking(False)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+async def resolve(target: ProbeTarget) -> typing.Tuple[int, tuple]:
+    """ Family and address of the target (icmp targets are IPv4 addresses) """
+    if target.kind == "icmp":
+        return socket.AF_INET, (target.host, 0)
+    loop = asyncio.get_running_loop()
+    type = socket.SOCK_STREAM if target.kind == "tcp" else socket.SOCK_DGRAM
+    family, _, _, _, address = (await loop.getaddrinfo(target.host, target.port, type=type))[0]
+    return family, address
+
+
+async def probe_tcp(target: ProbeTarget, family: int, address: tuple) -> None:
+    """ TCP handshake, refused connection is a reply as well """
+    loop = asyncio.get_running_loop()
+    with _socket(target, family, socket.SOCK_STREAM) as sock:
+        try:
+            await loop.sock_connect(sock, address)
+        except ConnectionRefusedError:
+            pass
+
+
+async def probe_udp(target: ProbeTarget, family: int, address: tuple) -> None:
+    """ Datagram which is answered by the target (or refused by ICMP port unreachable) """
+    loop = asyncio.get_running_loop()
+    with _socket(target, family, socket.SOCK_DGRAM) as sock:
+        sock.connect(address)
+        await loop.sock_sendall(sock, UDP_PAYLOAD)
+        try:
+            await loop.sock_recv(sock, 512)
+        except ConnectionRefusedError:
+            pass
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def echo_request(ident: int, sequence: int) -> bytes:
+    header = struct.pack("!BBHHH", 8, 0, 0, ident, sequence)
+    checksum = _checksum(header + ICMP_PAYLOAD)
+    return struct.pack("!BBHHH", 8, 0, checksum, ident, sequence) + ICMP_PAYLOAD
+
+
+def icmp_socket(target: ProbeTarget) -> typing.Tuple[socket.socket, bool]:
+    """ Unprivileged ICMP socket or raw socket when it is not allowed, returns whether it is raw """
+    try:
+        return _socket(target, socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except PermissionError:
+        return _socket(target, socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+
+
+_sequence = 0
+
+
+async def probe_icmp(target: ProbeTarget, family: int, address: tuple) -> None:
+    """ ICMP echo (IPv4 only) """
+    global _sequence
+    _sequence = (_sequence + 1) & 0xFFFF
+    sequence, ident = _sequence, os.getpid() & 0xFFFF
+
+    loop = asyncio.get_running_loop()
+    sock, raw = icmp_socket(target)
+    with sock:
+        sock.connect(address)
+        await loop.sock_sendall(sock, echo_request(ident, sequence))
+        while True:
+            data = await loop.sock_recv(sock, 1024)
+            if raw:
+                # raw socket receives IP header and all ICMP messages
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < 8:
+                continue
+            kind, _, _, reply_ident, reply_sequence = struct.unpack("!BBHHH", data[:8])
+            # identifier of unprivileged socket is set by kernel
+            if kind == 0 and reply_sequence == sequence and (not raw or reply_ident == ident):
+                return
+
+
+PROBES = {"tcp": probe_tcp, "udp": probe_udp, "icmp": probe_icmp}
+
+
+async def measure(target: ProbeTarget) -> typing.Optional[float]:
+    """ Round trip time of a single probe in seconds or None when it was lost """
+    loop = asyncio.get_running_loop()
+    try:
+        # name resolution is not a part of the round trip
+        family, address = await asyncio.wait_for(resolve(target), target.timeout)
+        start = loop.time()
+        await asyncio.wait_for(PROBES[target.kind](target, family, address), target.timeout)
+    except (asyncio.TimeoutError, OSError):
+        return None
+    return loop.time() - start
+
+
+class ProbeEngine:
+    """ Measures latency and loss of tunnels using probes running concurrently in asyncio loop
+
+        Targets are obtained by `load` (every `reload_interval` or after wake()),
+        each client keeps a fixed size history of its samples.
+    """
+
+    def __init__(
+        self,
+        load: typing.Callable[[], typing.Dict[str, ProbeTarget]],
+        history_size: int = HISTORY_SIZE,
+        reload_interval: float = RELOAD_INTERVAL,
+    ):
+        self.load = load
+        self.history_size = history_size
+        self.reload_interval = reload_interval
+
+        self._lock = threading.Lock()
+        self._histories: typing.Dict[str, typing.Tuple[ProbeTarget, RttHistory]] = {}
+        self._loop: typing.Optional[asyncio.AbstractEventLoop] = None
+        self._wake: typing.Optional[asyncio.Event] = None
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=lambda: asyncio.run(self._main()), name="openvpn-client-probes", daemon=True
+            )
+            self._thread.start()
+
+    def wake(self):
+        """ reload targets right now """
+        with self._lock:
+            loop, event = self._loop, self._wake
+        if loop and event:
+            loop.call_soon_threadsafe(event.set)
+
+    async def _main(self):
+        wake = asyncio.Event()
+        with self._lock:
+            self._loop, self._wake = asyncio.get_running_loop(), wake
+
+        tasks: typing.Dict[str, typing.Tuple[ProbeTarget, asyncio.Task]] = {}
+        while True:
+            try:
+                # blocking read would delay the loop and prolong RTT of probes in flight
+                targets = await asyncio.get_running_loop().run_in_executor(None, self.load)
+                self._sync(tasks, targets)
+            except Exception:
+                logger.exception("Failed to load probe targets")
+            try:
+                await asyncio.wait_for(wake.wait(), self.reload_interval)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+
+    def _sync(self, tasks: typing.Dict[str, typing.Tuple[ProbeTarget, asyncio.Task]], targets: dict):
+        for id in list(tasks):
+            if targets.get(id) != tasks[id][0]:
+                tasks.pop(id)[1].cancel()
+
+        with self._lock:
+            # history of a changed target is started over
+            for id in list(self._histories):
+                if targets.get(id) != self._histories[id][0]:
+                    del self._histories[id]
+            for id, target in targets.items():
+                if id not in self._histories:
+                    self._histories[id] = (target, RttHistory(self.history_size))
+
+        for id, target in targets.items():
+            if id not in tasks:
+                history = self._histories[id][1]
+                tasks[id] = (target, asyncio.get_running_loop().create_task(self._probe(target, history)))
+
+    async def _probe(self, target: ProbeTarget, history: RttHistory):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            rtt = await measure(target)
+            with self._lock:
+                history.add(rtt)
+            await asyncio.sleep(max(target.interval - (loop.time() - start), 0))
+
+    def reset(self, ids: typing.Iterable[str]):
+        """ start histories of the targets over (e.g. the tunnel was restarted) """
+        with self._lock:
+            for id in ids:
+                if id in self._histories:
+                    self._histories[id][1].clear()
+
+    def stats(self, ids: typing.Optional[typing.Set[str]] = None) -> typing.Dict[str, dict]:
+        """ Statistics of all targets or only of `ids` """
+        with self._lock:
+            return {
+                id: {"target": target.spec, "interval": target.interval, **history.stats()}
+                for id, (target, history) in self._histories.items()
+                if ids is None or id in ids
+            }
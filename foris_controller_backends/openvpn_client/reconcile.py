@@ -0,0 +1,242 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import logging
+import os
+import typing
+from dataclasses import dataclass, field
+
+from foris_controller.exceptions import BackendCommandFailed
+from foris_controller_backends.cmdline import BaseCmdLine
+from foris_controller_backends.files import inject_file_root
+from foris_controller_backends.maintain import MaintainCommands
+from foris_controller_backends.services import OpenwrtServices
+from foris_controller_openvpn_client_module.utils import instance_action
+
+from .executor import READY_TIMEOUT, Step, StepFailed, run_steps
+from .firewall import Fw4ZoneDevices, zone_name
+from .metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ClientState(typing.NamedTuple):
+    """ Part of the client configuration which affects running services """
+    enabled: bool
+    dev: str
+    config: str
+    username: str
+    password: str
+    digest: str = ""  # hash of the config content
+
+
+ClientStates = typing.Dict[str, ClientState]
+
+
+@dataclass
+class ReconcilePlan:
+    """ Minimal set of service operations needed to apply a configuration change """
+    start: typing.Set[str] = field(default_factory=set)
+    stop: typing.Set[str] = field(default_factory=set)
+    restart: typing.Set[str] = field(default_factory=set)
+    resolver: bool = False
+    firewall: bool = False
+    devices_added: typing.Set[str] = field(default_factory=set)  # tunnel interfaces of the firewall zone
+    devices_removed: typing.Set[str] = field(default_factory=set)
+    devices_started: typing.Set[str] = field(default_factory=set)  # tunnels which should come up
+    devices_stopped: typing.Set[str] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.start or self.stop or self.restart or self.resolver or self.firewall
+        )
+
+    @staticmethod
+    def from_states(before: ClientStates, after: ClientStates) -> "ReconcilePlan":
+        plan = ReconcilePlan()
+
+        for id in before.keys() | after.keys():
+            old, new = before.get(id), after.get(id)
+            action = instance_action(old is not None and old.enabled, new is not None and new.enabled, old != new)
+
+            if action == "stop":
+                plan.stop.add(id)
+                plan.devices_stopped.add(old.dev)
+            elif action == "start":
+                plan.start.add(id)
+                plan.devices_started.add(new.dev)
+            elif action == "restart":
+                plan.restart.add(id)
+                plan.devices_started.add(new.dev)
+
+        devices_before = {e.dev for e in before.values()}
+        devices_after = {e.dev for e in after.values()}
+        # zone membership changed -> devices of the zone are updated in the running firewall,
+        # tunnels are not managed by netifd so the network doesn't have to be restarted
+        plan.firewall = devices_before != devices_after
+        plan.devices_added, plan.devices_removed = devices_after - devices_before, devices_before - devices_after
+
+        # tunnel interface appeared or disappeared -> try to use VPN native DNS
+        enabled_before = {e.dev for e in before.values() if e.enabled}
+        enabled_after = {e.dev for e in after.values() if e.enabled}
+        plan.resolver = enabled_before != enabled_after
+
+        return plan
+
+
+class OpenVpnInstances(BaseCmdLine):
+    """ Controls single openvpn instances via its init script """
+
+    def _instance_action(self, action: str, instance: str):
+        with metrics.span(f"openvpn_{action}"):
+            self._run_command_and_check_retval(["/etc/init.d/openvpn", action, instance], 0)
+
+    def start(self, instance: str):
+        self._instance_action("start", instance)
+
+    def stop(self, instance: str):
+        self._instance_action("stop", instance)
+
+    def restart(self, instance: str):
+        self._instance_action("restart", instance)
+
+
+class Netifd(BaseCmdLine):
+    """ Detects that netifd was restarted """
+
+    def object_id(self) -> typing.Optional[str]:
+        """ id of network.interface ubus object, a new one is registered when netifd starts """
+        # 'network.interface' @1a2b3c4d
+        try:
+            rv, output, _ = self._run_command("/bin/ubus", "-v", "list", "network.interface")
+        except OSError:
+            return None
+        if rv != 0:
+            return None
+        for word in output.decode(errors="replace").split():
+            if word.startswith("@"):
+                return word
+        return None
+
+
+def _restart_network(timeout: float) -> Step:
+    netifd = Netifd()
+    before = netifd.object_id()
+
+    def ready() -> bool:
+        current = netifd.object_id()
+        return current is not None and current != before
+
+    return Step("network_restart", lambda: MaintainCommands().restart_network(), ready=ready, timeout=timeout)
+
+
+def _devices_ready(up: typing.Set[str], down: typing.Set[str]) -> typing.Callable[[], bool]:
+    def exists(dev: str) -> bool:
+        return os.path.exists(inject_file_root(f"/sys/class/net/{dev}"))
+
+    return lambda: all(exists(e) for e in up) and not any(exists(e) for e in down)
+
+
+def _service(action: str, name: str, **kwargs) -> typing.Callable[[], None]:
+    def run():
+        with OpenwrtServices() as services:
+            getattr(services, action)(name, **kwargs)
+
+    return run
+
+
+def restart_all(
+    devices: typing.Iterable[str] = (), ready_timeout: float = READY_TIMEOUT, wait: bool = True
+) -> typing.List[dict]:
+    """ Restart or reload network interfaces, openvpn itself and firewall rules.
+        To make sure that as openvpn works as expected after reconfiguration.
+
+        Tunnel devices are not waited for when `wait` is not set. Returns timings of the steps.
+    """
+    return run_steps([
+        _restart_network(ready_timeout),
+        Step(
+            "openvpn_restart_all", _service("restart", "openvpn"), after=("network_restart", ),
+            ready=_devices_ready(set(devices), set()) if wait else None, timeout=ready_timeout,
+        ),
+        # reload DNS resolver to try to use VPN native DNS
+        Step("resolver_reload", _service("reload", "resolver"), after=("openvpn_restart_all", )),
+        # force firewall reload as it doesn't always get triggered by network restart
+        Step("firewall_reload", _service("reload", "firewall"), after=("openvpn_restart_all", )),
+    ])
+
+
+def _instances(plan: ReconcilePlan) -> typing.Callable[[], None]:
+    def run():
+        instances = OpenVpnInstances()
+        for id in sorted(plan.stop):
+            instances.stop(id)
+        for id in sorted(plan.start):
+            instances.start(id)
+        for id in sorted(plan.restart):
+            instances.restart(id)
+
+    return run
+
+
+def _firewall(plan: ReconcilePlan) -> typing.Callable[[], None]:
+    def run():
+        # full reload is slow on large rule sets and disrupts conntrack
+        if not Fw4ZoneDevices(zone_name()).update(plan.devices_added, plan.devices_removed):
+            with metrics.span("firewall_reload"):
+                _service("reload", "firewall")()
+
+    return run
+
+
+def apply_plan(plan: ReconcilePlan, ready_timeout: float = READY_TIMEOUT, wait: bool = True) -> typing.List[dict]:
+    """ Perform only the operations listed in the plan
+
+        Independent operations run concurrently, operations which need tunnels wait until
+        their devices appear (unless `wait` is not set, tunnels which never connect would
+        delay the caller). Falls back to the full restart when a single instance can't be controlled.
+        Returns timings of the steps.
+    """
+    if not plan:
+        logger.debug("Nothing to reconcile")
+        return []
+
+    logger.debug("Reconciling openvpn clients %s", plan)
+
+    steps = []
+    if plan.start or plan.stop or plan.restart:
+        steps.append(Step(
+            "openvpn_instances", _instances(plan),
+            ready=_devices_ready(plan.devices_started, plan.devices_stopped) if wait else None,
+            timeout=ready_timeout,
+        ))
+    instances = tuple(e.name for e in steps)
+    if plan.resolver:
+        steps.append(Step("resolver_reload", _service("reload", "resolver"), after=instances))
+    if plan.firewall:
+        # zone rules match devices by name, they don't have to exist yet
+        steps.append(Step("firewall_update", _firewall(plan)))
+
+    try:
+        return run_steps(steps)
+    except StepFailed as exc:
+        if exc.step != "openvpn_instances" or not isinstance(exc.__cause__, (BackendCommandFailed, OSError)):
+            raise
+        logger.warning("Failed to reconcile openvpn instances, restarting all of them")
+        return exc.steps + restart_all(plan.devices_started, ready_timeout, wait)
@@ -0,0 +1,164 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import logging
+import os
+import typing
+
+from foris_controller.exceptions import BackendCommandFailed
+from foris_controller_backends.cmdline import BaseCmdLine
+from foris_controller_backends.files import BaseFile, inject_file_root, makedirs
+
+from .metrics import registry as metrics
+from .prefixes import Network, compile_prefixes
+
+logger = logging.getLogger(__name__)
+
+NFT_TABLE = "openvpn_client"
+# fw4 includes these files at the end of its ruleset, so the table survives firewall reloads and reboots
+NFT_INCLUDE_PATH = "/usr/share/nftables.d/ruleset-post/50-openvpn-client.nft"
+HOTPLUG_PATH = "/etc/hotplug.d/openvpn/50-openvpn-client-routes"
+TABLE_BASE = 200  # routing table of a client is TABLE_BASE + its slot
+RULE_PRIORITY = 5000
+MARK_SHIFT = 16
+MARK_MASK = 0xFF << MARK_SHIFT
+MAX_SLOTS = 250
+# destinations of routed LAN hosts which stay in the main table (other local subnets, the router itself)
+LOCAL_PREFIXES = ("10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "169.254.0.0/16", "fc00::/7", "fe80::/10")
+NOT_LOCAL = "fib daddr type != local"
+
+HOTPLUG_SCRIPT = f"""\
+# generated by foris-controller openvpn_client module
+# routes tunnel of clients with policy routing as soon as its device is up
+[ "$ACTION" = "up" ] || exit 0
+slot="$(uci -q get "openvpn.$INSTANCE._route_slot")" || exit 0
+ip route replace default dev "$dev" table "$(({TABLE_BASE} + slot))"
+ip -6 route replace default dev "$dev" table "$(({TABLE_BASE} + slot))" 2>/dev/null
+exit 0
+"""
+
+
+def table(slot: int) -> int:
+    return TABLE_BASE + slot
+
+
+def mark(slot: int) -> int:
+    return (slot + 1) << MARK_SHIFT
+
+
+class RouteTarget(typing.NamedTuple):
+    """ Traffic of an enabled client which is routed through its tunnel """
+    slot: int
+    dev: str
+    prefixes: typing.Tuple[str, ...] = ()  # destinations
+    sources: typing.Tuple[str, ...] = ()  # LAN hosts
+    domains: bool = False  # destinations resolved by dnsmasq are added to the dns4 set
+
+
+def _set(name: str, family: str, networks: typing.List[Network]) -> typing.List[str]:
+    res = [f"\tset {name} {{", f"\t\ttype {family}_addr", "\t\tflags interval"]
+    if networks:
+        res.append(f"\t\telements = {{ {', '.join(str(e) for e in networks)} }}")
+    res.append("\t}")
+    return res
+
+
+def render_nft(targets: typing.Dict[str, RouteTarget]) -> str:
+    """ nft script which replaces the whole table with sets and marking rules of the clients
+
+        Prefixes are compacted first, so sets hold the smallest number of intervals.
+        Traffic of routed LAN hosts to local destinations is not marked.
+    """
+    lines = [f"table inet {NFT_TABLE}", f"delete table inet {NFT_TABLE}", f"table inet {NFT_TABLE} {{"]
+    prerouting, output = [], []
+    if any(e.sources for e in targets.values()):
+        local4, local6 = compile_prefixes(LOCAL_PREFIXES)
+        lines.extend(_set("local4", "ipv4", local4))
+        lines.extend(_set("local6", "ipv6", local6))
+    for id, target in sorted(targets.items(), key=lambda e: e[1].slot):
+        slot = target.slot
+        set_mark = f"meta mark set meta mark and 0x{~MARK_MASK & 0xFFFFFFFF:08x} or 0x{mark(slot):08x}"
+        comment = f'comment "{id}"'
+        dst4, dst6 = compile_prefixes(target.prefixes)
+        src4, src6 = compile_prefixes(target.sources)
+        # local destinations of routed LAN hosts (including the router itself) use the main table
+        for name, family, networks, match, chains in [
+            (f"dst4_{slot}", "ipv4", dst4, f"ip daddr @dst4_{slot}", (prerouting, output)),
+            (f"dst6_{slot}", "ipv6", dst6, f"ip6 daddr @dst6_{slot}", (prerouting, output)),
+            (f"src4_{slot}", "ipv4", src4, f"ip saddr @src4_{slot} ip daddr != @local4 {NOT_LOCAL}", (prerouting, )),
+            (f"src6_{slot}", "ipv6", src6, f"ip6 saddr @src6_{slot} ip6 daddr != @local6 {NOT_LOCAL}", (prerouting, )),
+        ]:
+            if networks:
+                lines.extend(_set(name, family, networks))
+                for chain in chains:
+                    chain.append(f"\t\t{match} {set_mark} {comment}")
+        if target.domains:
+            # filled by dnsmasq (nftset)
+            lines.extend(_set(f"dns4_{target.slot}", "ipv4", []))
+            for chain in (prerouting, output):
+                chain.append(f"\t\tip daddr @dns4_{target.slot} {set_mark} {comment}")
+
+    for name, hook, chain_type, rules in [
+        ("prerouting", "prerouting", "filter", prerouting), ("output", "output", "route", output)
+    ]:
+        lines.append(f"\tchain {name} {{")
+        lines.append(f"\t\ttype {chain_type} hook {hook} priority mangle; policy accept;")
+        lines.extend(rules)
+        lines.append("\t}")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+class PolicyRouting(BaseCmdLine, BaseFile):
+    """ Marks traffic of the clients in nftables and routes it via their routing tables
+
+        ip rules (fwmark -> table) are persistent network config, default route of a table
+        is added when the tunnel goes up (openvpn hotplug) or right away when it is up already.
+    """
+
+    def _ip(self, *args: str, check: bool = True):
+        try:
+            self._run_command_and_check_retval(["/sbin/ip", *args], 0)
+        except BackendCommandFailed:
+            if check:
+                raise
+
+    def apply(self, targets: typing.Dict[str, RouteTarget], released: typing.Iterable[int] = ()):
+        with metrics.span("routing_apply"):
+            makedirs(os.path.dirname(NFT_INCLUDE_PATH))
+            self._store_to_file(NFT_INCLUDE_PATH, render_nft(targets))
+            self._run_command_and_check_retval(["/usr/sbin/nft", "-f", NFT_INCLUDE_PATH], 0)
+
+            makedirs(os.path.dirname(HOTPLUG_PATH))
+            self._store_to_file(HOTPLUG_PATH, HOTPLUG_SCRIPT)
+
+            for slot in released:
+                self._ip("route", "flush", "table", str(table(slot)), check=False)
+                self._ip("-6", "route", "flush", "table", str(table(slot)), check=False)
+
+            for target in targets.values():
+                number = str(table(target.slot))
+                # marked traffic is dropped while the tunnel is down instead of leaking outside of it
+                self._ip("route", "replace", "blackhole", "default", "table", number, "metric", "65535")
+                self._ip("-6", "route", "replace", "blackhole", "default", "table", number, "metric", "65535",
+                         check=False)
+                if os.path.exists(inject_file_root(f"/sys/class/net/{target.dev}")):
+                    self._ip("route", "replace", "default", "dev", target.dev, "table", number)
+                    self._ip("-6", "route", "replace", "default", "dev", target.dev, "table", number, check=False)
+        logger.debug("Policy routing applied for %s", sorted(targets))
@@ -0,0 +1,149 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import logging
+import threading
+import time
+import typing
+from concurrent.futures import Future
+
+from .executor import READY_TIMEOUT
+from .reconcile import ClientStates, ReconcilePlan, apply_plan
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 2.0
+DEFAULT_MAX_DELAY = 10.0
+
+
+class RestartScheduler:
+    """ Coalesces restart requests which arrive within a short time window
+
+        Each background request prolongs the waiting by `window` seconds, but the merged
+        restart is never postponed more than `max_delay` seconds after the first
+        pending request. Inline requests (and all requests with `window` set to 0)
+        are performed immediately together with the pending ones. Inline restarts don't
+        wait for tunnel devices, the caller is replied right after services are restarted.
+    """
+
+    def __init__(self, window: float = DEFAULT_WINDOW, max_delay: float = DEFAULT_MAX_DELAY):
+        self.window = window
+        self.max_delay = max_delay
+        self.ready_timeout = READY_TIMEOUT
+        self.listener: typing.Optional[typing.Callable[[dict], None]] = None
+
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()  # merged restarts must not overlap
+        self._timer: typing.Optional[threading.Timer] = None
+        self._before: ClientStates = {}
+        self._after: ClientStates = {}
+        self._known: typing.Set[str] = set()
+        self._futures: typing.List[Future] = []
+        self._first_request: typing.Optional[float] = None
+
+    def configure(self, window: float, max_delay: float, ready_timeout: float = READY_TIMEOUT):
+        with self._lock:
+            self.window = max(window, 0.0)
+            self.max_delay = max(max_delay, self.window)
+            self.ready_timeout = max(ready_timeout, 0.0)
+
+    def request(self, before: ClientStates, after: ClientStates, inline: bool = True) -> Future:
+        """ Schedule reconciliation of services from `before` to `after` state
+
+            Returns future which is resolved with a report once the merged restart is performed.
+            With `inline` set the restart is performed before the call returns.
+        """
+        future = Future()
+        with self._lock:
+            self._merge(before, after)
+            self._futures.append(future)
+            now = time.monotonic()
+            if self._first_request is None:
+                self._first_request = now
+
+            run_now = self.window <= 0 or inline
+            if not run_now:
+                if self._timer:
+                    self._timer.cancel()
+                deadline = min(now + self.window, self._first_request + self.max_delay)
+                self._timer = threading.Timer(max(deadline - now, 0.0), self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if run_now:
+            self.flush(wait=not inline)
+
+        return future
+
+    def _merge(self, before: ClientStates, after: ClientStates):
+        for id in before.keys() | after.keys():
+            # state from the first request which mentions the client is the one currently applied
+            if id not in self._known:
+                self._known.add(id)
+                if id in before:
+                    self._before[id] = before[id]
+            # clients which are not mentioned in the newer request keep their pending state
+            self._after.pop(id, None)
+        self._after.update(after)
+
+    def exclusive(self) -> threading.Lock:
+        """ lock which prevents merged restarts from being performed while it is held """
+        return self._apply_lock
+
+    def flush(self, wait: bool = True):
+        """ Perform pending restart right now, `wait` for tunnel devices to appear """
+        with self._apply_lock:
+            self._flush(wait)
+
+    def _flush(self, wait: bool):
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if not self._futures:
+                return
+            before, after, futures = self._before, self._after, self._futures
+            waited = time.monotonic() - self._first_request
+            self._before, self._after, self._futures, self._known = {}, {}, [], set()
+            self._first_request = None
+            ready_timeout = self.ready_timeout
+
+        plan = ReconcilePlan.from_states(before, after)
+        report = {
+            "ids": sorted(plan.start | plan.stop | plan.restart),
+            "merged": len(futures),
+            "waited": round(waited, 3),
+        }
+        try:
+            report["steps"] = apply_plan(plan, ready_timeout, wait)
+        except Exception as exc:
+            logger.exception("Merged restart of %d requests failed", len(futures))
+            for future in futures:
+                future.set_exception(exc)
+            return
+
+        logger.debug("Merged restart of %d requests performed: %s", len(futures), report)
+        for future in futures:
+            future.set_result(report)
+
+        if plan and self.listener:
+            try:
+                self.listener(report)
+            except Exception:
+                logger.exception("Failed to report merged restart")
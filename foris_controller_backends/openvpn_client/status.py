@@ -0,0 +1,195 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import datetime
+import fcntl
+import logging
+import os
+import socket
+import struct
+import threading
+import typing
+
+from foris_controller_backends.files import inject_file_root
+
+from .parser import Remote, parse_config
+
+logger = logging.getLogger(__name__)
+
+STATUS_PATH = "/var/run/openvpn.{}.status"
+SIOCGIFADDR = 0x8915
+MAX_STATUS_SIZE = 64 * 1024  # client status contains just a few counters
+
+
+class StatusSample(typing.NamedTuple):
+    updated: float
+    bytes_in: int
+    bytes_out: int
+
+
+class _ClientStatus:
+    __slots__ = ("stamp", "sample", "previous", "connected_since", "config_stamp", "remote")
+
+    def __init__(self):
+        self.stamp = None
+        self.sample: typing.Optional[StatusSample] = None
+        self.previous: typing.Optional[StatusSample] = None
+        self.connected_since: typing.Optional[float] = None
+        self.config_stamp = None
+        self.remote: typing.Optional[Remote] = None
+
+    def clear(self):
+        """ status file is not available """
+        self.stamp = self.sample = self.previous = self.connected_since = None
+
+
+def _file_stamp(path: str) -> typing.Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _parse_updated(value: str, default: float) -> float:
+    value = " ".join(value.split())
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%a %b %d %H:%M:%S %Y"):
+        try:
+            return datetime.datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            pass
+    return default
+
+
+def parse_status(content: str, mtime: float) -> StatusSample:
+    """ Parses client status file (OPENVPN STATISTICS section) """
+    fields = {}
+    for line in content.splitlines():
+        key, sep, value = line.partition(",")
+        if sep:
+            fields[key.strip()] = value.strip()
+        if line.strip() == "END":
+            break
+
+    def number(key: str) -> int:
+        try:
+            return int(fields.get(key, 0))
+        except ValueError:
+            return 0
+
+    return StatusSample(
+        updated=_parse_updated(fields.get("Updated", ""), mtime),
+        bytes_in=number("TCP/UDP read bytes"),
+        bytes_out=number("TCP/UDP write bytes"),
+    )
+
+
+def interface_address(dev: str) -> typing.Optional[str]:
+    """ IPv4 address assigned to the interface (no subprocess is required) """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            res = fcntl.ioctl(sock.fileno(), SIOCGIFADDR, struct.pack("256s", dev.encode()[:15]))
+        except OSError:
+            return None
+    return socket.inet_ntoa(res[20:24])
+
+
+class StatusReader:
+    """ Reads openvpn status files and computes throughput from consecutive samples
+
+        Files are parsed only when they were changed since the last read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: typing.Dict[str, _ClientStatus] = {}
+
+    def _update(self, id: str, status: _ClientStatus):
+        path = inject_file_root(STATUS_PATH.format(id))
+        stamp = _file_stamp(path)
+        if stamp is None:
+            status.clear()
+            return
+        if stamp == status.stamp:
+            return
+
+        try:
+            with open(path) as f:
+                sample = parse_status(f.read(MAX_STATUS_SIZE), stamp[1] / 1e9)
+        except OSError:
+            # removed after stat() or not readable at all
+            status.clear()
+            return
+        status.stamp = stamp
+
+        if status.sample and sample.updated == status.sample.updated:
+            return
+        # counters start from zero after the instance is restarted
+        if status.sample is None or sample.bytes_in < status.sample.bytes_in \
+                or sample.bytes_out < status.sample.bytes_out:
+            status.previous, status.connected_since = None, sample.updated
+        else:
+            status.previous = status.sample
+        status.sample = sample
+
+    def _update_remote(self, config_path: str, status: _ClientStatus):
+        path = inject_file_root(config_path)
+        stamp = _file_stamp(path)
+        if stamp != status.config_stamp:
+            status.config_stamp = stamp
+            try:
+                with open(path) as f:
+                    remotes = parse_config(f.read()).remotes
+                status.remote = remotes[0] if remotes else None
+            except OSError:
+                status.remote = None
+
+    def get(self, id: str, dev: str, config_path: str) -> dict:
+        with self._lock:
+            status = self._clients.setdefault(id, _ClientStatus())
+            self._update(id, status)
+            self._update_remote(config_path, status)
+            sample, previous, since, remote = status.sample, status.previous, status.connected_since, status.remote
+
+        res = {"id": id, "available": sample is not None}
+        if remote:
+            res["remote"] = remote._asdict()
+        vpn_ip = interface_address(dev)
+        if vpn_ip:
+            res["vpn_ip"] = vpn_ip
+        if sample is None:
+            return res
+
+        res.update({
+            "updated": int(sample.updated),
+            "connected_since": int(since),
+            "bytes_in": sample.bytes_in,
+            "bytes_out": sample.bytes_out,
+        })
+        if previous and sample.updated > previous.updated:
+            elapsed = sample.updated - previous.updated
+            res["rate_in"] = round((sample.bytes_in - previous.bytes_in) / elapsed, 1)
+            res["rate_out"] = round((sample.bytes_out - previous.bytes_out) / elapsed, 1)
+        return res
+
+    def forget(self, ids: typing.Iterable[str]):
+        """ drop data of clients which no longer exist """
+        with self._lock:
+            for id in set(self._clients) - set(ids):
+                del self._clients[id]
@@ -0,0 +1,120 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import hashlib
+import logging
+import os
+import pathlib
+import re
+import typing
+
+from foris_controller_backends.files import BaseFile, inject_file_root, makedirs
+
+logger = logging.getLogger(__name__)
+
+# inline blocks which are usually shared among profiles of the same provider
+SHARED_BLOCKS = ("ca", "extra-certs", "crl-verify", "tls-auth", "tls-crypt")
+BLOCK_RE = re.compile(r"blocks/([0-9a-f]{64})\.pem\b")
+
+
+def config_digest(config: str) -> str:
+    return hashlib.sha256(config.encode()).hexdigest()
+
+
+class ConfigStore:
+    """ Stores client configs with shared inline blocks moved to deduplicated files
+
+        Block files are named by the hash of their content, so profiles which
+        share e.g. the same CA reference the same file.
+    """
+
+    def __init__(self, directory: pathlib.Path):
+        self.directory = directory
+        self.blocks_dir = directory / "blocks"
+
+    def split_blocks(self, config: str) -> typing.Tuple[str, typing.Dict[str, str]]:
+        """ Returns config with shared blocks replaced by file references and the blocks by their digests """
+        key_direction = None
+        for line in config.splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[0] == "key-direction":
+                key_direction = parts[1]
+
+        lines, blocks = [], {}
+        block_name, block_lines = None, []
+        for line in config.splitlines(keepends=True):
+            stripped = line.strip()
+            if block_name is None:
+                if stripped.startswith("<") and stripped.endswith(">") and stripped[1:-1] in SHARED_BLOCKS:
+                    block_name, block_lines = stripped[1:-1], []
+                else:
+                    lines.append(line)
+                continue
+
+            if stripped == f"</{block_name}>":
+                content = "".join(block_lines)
+                digest = config_digest(content)
+                blocks[digest] = content
+                reference = f"{block_name} {self.blocks_dir / digest}.pem"
+                # direction of inline tls-auth is set by key-direction
+                if block_name == "tls-auth" and key_direction is not None:
+                    reference += f" {key_direction}"
+                lines.append(reference + "\n")
+                block_name = None
+            else:
+                block_lines.append(line)
+
+        if block_name is not None:
+            # unterminated block -> let openvpn report the error
+            logger.warning("Block <%s> is not terminated, config is stored as it is", block_name)
+            return config, {}
+
+        return "".join(lines), blocks
+
+    def store(self, path: str, config: str):
+        rendered, blocks = self.split_blocks(config)
+        if blocks:
+            makedirs(str(self.blocks_dir), mask=0o0700)
+        for digest, content in blocks.items():
+            block_path = str(self.blocks_dir / f"{digest}.pem")
+            # content addressed -> existing file doesn't have to be rewritten
+            if not os.path.exists(inject_file_root(block_path)):
+                BaseFile()._store_to_file(block_path, content)
+        BaseFile()._store_to_file(path, rendered)
+
+    @staticmethod
+    def references(path: str) -> typing.Set[str]:
+        """ Returns digests of blocks referenced by the config """
+        try:
+            with open(inject_file_root(path)) as f:
+                return set(BLOCK_RE.findall(f.read()))
+        except OSError:
+            return set()
+
+    def collect_garbage(self, candidates: typing.Set[str]):
+        """ Removes blocks from `candidates` which are no longer referenced by any config """
+        if not candidates:
+            return
+        directory = inject_file_root(str(self.directory))
+        used = set()
+        for name in os.listdir(directory):
+            if name.endswith(".conf"):
+                used |= self.references(str(self.directory / name))
+        for digest in candidates - used:
+            BaseFile().delete_file(str(self.blocks_dir / f"{digest}.pem"))
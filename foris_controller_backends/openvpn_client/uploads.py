@@ -0,0 +1,140 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import hashlib
+import logging
+import os
+import pathlib
+import threading
+import time
+import typing
+import uuid
+
+from foris_controller_backends.files import inject_file_root, makedirs
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_SIZE = 4 * 1024 * 1024  # even profiles with large CRLs are much smaller
+MAX_UPLOADS = 4
+UPLOAD_TIMEOUT = 600.0  # seconds since the last chunk
+
+
+class _Upload:
+    __slots__ = ("id", "credentials", "path", "received", "digest", "expires")
+
+    def __init__(self, id: str, credentials: typing.Optional[dict], path: str):
+        self.id = id
+        self.credentials = credentials
+        self.path = path
+        self.received = 0
+        self.digest = hashlib.sha256()
+        self.expires = time.monotonic() + UPLOAD_TIMEOUT
+
+
+class UploadStore:
+    """ Receives client configs in chunks
+
+        Chunks are appended to a temporary file right away so only a single chunk
+        is kept in memory. The file is moved to its place when the upload is committed.
+    """
+
+    def __init__(self, directory: pathlib.Path):
+        self.directory = directory
+
+        self._lock = threading.Lock()
+        self._uploads: typing.Dict[str, _Upload] = {}
+
+    def _expire(self):
+        now = time.monotonic()
+        for upload_id in [k for k, v in self._uploads.items() if v.expires < now]:
+            logger.warning("Upload of '%s' expired", self._uploads[upload_id].id)
+            self._discard(upload_id)
+
+    def _discard(self, upload_id: str):
+        self.discard(self._uploads.pop(upload_id).path)
+
+    def begin(self, id: str, credentials: typing.Optional[dict] = None) -> typing.Optional[str]:
+        """ Returns id of the new upload or None when too many uploads are in progress """
+        with self._lock:
+            self._expire()
+            if len(self._uploads) >= MAX_UPLOADS:
+                return None
+
+            upload_id = uuid.uuid4().hex
+            path = str(self.directory / f".upload_{upload_id}")
+            makedirs(str(self.directory), mask=0o0700)
+            fd = os.open(inject_file_root(path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            os.close(fd)
+            self._uploads[upload_id] = _Upload(id, credentials, path)
+        return upload_id
+
+    def chunk(self, upload_id: str, offset: int, data: bytes) -> typing.Optional[int]:
+        """ Appends data to the upload
+
+            Returns number of bytes received so far or None when the upload doesn't exist.
+            Chunk which doesn't continue at the end of the received data is ignored.
+        """
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None:
+                return None
+            if offset != upload.received:
+                return upload.received
+            if upload.received + len(data) > MAX_UPLOAD_SIZE:
+                logger.warning("Upload of '%s' exceeded %d bytes", upload.id, MAX_UPLOAD_SIZE)
+                self._discard(upload_id)
+                return None
+
+            with open(inject_file_root(upload.path), "ab") as f:
+                f.write(data)
+            upload.received += len(data)
+            upload.digest.update(data)
+            upload.expires = time.monotonic() + UPLOAD_TIMEOUT
+            return upload.received
+
+    def finish(
+        self, upload_id: str, sha256: typing.Optional[str] = None
+    ) -> typing.Optional[typing.Tuple[str, typing.Optional[dict], str, str]]:
+        """ Ends the upload and returns client id, credentials, path of the received file and its sha256
+
+            The file is flushed to disk, the caller is responsible for moving it.
+            Digest is computed from the chunks as they arrive, the file is not read again.
+            Returns None when the upload doesn't exist or its content doesn't match `sha256`.
+        """
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None:
+                return None
+            digest = upload.digest.hexdigest()
+            if sha256 is not None and digest != sha256.lower():
+                logger.warning("Upload of '%s' doesn't match its checksum", upload.id)
+                self._discard(upload_id)
+                return None
+
+            with open(inject_file_root(upload.path), "ab") as f:
+                os.fsync(f.fileno())
+            del self._uploads[upload_id]
+            return upload.id, upload.credentials, upload.path, digest
+
+    def discard(self, path: str):
+        """ Removes received file which was not used """
+        try:
+            os.unlink(inject_file_root(path))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,171 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import logging
+import random
+import threading
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 10.0
+JITTER = 0.2  # restart delays are randomly prolonged or shortened by up to 20 %
+
+
+class WatchdogPolicy(typing.NamedTuple):
+    """ Per client settings (stored as _watchdog* and _backoff_* options of the client section) """
+    enabled: bool = False  # clients have to opt in, restarts of working clients would drop their traffic
+    backoff_initial: float = 10.0  # grace period before the first restart
+    backoff_max: float = 600.0
+    retries: int = 5  # restarts before the client is reported as failed, 0 means unlimited
+    handshake_timeout: float = 300.0  # tunnel not connected for this long is considered dead, 0 disables the check
+
+
+def stale_reason(
+    management: typing.Optional[dict], status: typing.Optional[dict], timeout: float, now: float
+) -> typing.Optional[str]:
+    """ Returns why the tunnel is considered stuck or None
+
+        State reported by the management interface is used when it is available (the tunnel has
+        to be CONNECTED or get connected within `timeout`), age of the status file is only a fallback
+        as openvpn refreshes it even when the tunnel is not connected.
+    """
+    if management and management.get("state"):
+        since = management.get("state_since") or now
+        if management["state"] != "CONNECTED" and now - since > timeout:
+            return f"{management['state'].lower()} for {int(now - since)} seconds"
+        return None
+    if status and status["available"] and now - status["updated"] > timeout:
+        return f"status not updated for {int(now - status['updated'])} seconds"
+    return None
+
+
+class _Health:
+    __slots__ = ("attempts", "next_attempt", "failed")
+
+    def __init__(self, next_attempt: float):
+        self.attempts = 0
+        self.next_attempt = next_attempt
+        self.failed = False
+
+
+class Watchdog:
+    """ Restarts instances of enabled clients which are not healthy
+
+        Restarts of a client are spread using exponential backoff with jitter.
+        `reconnected` is reported when a restarted client becomes healthy again
+        and `failed` when it is still unhealthy after all the retries.
+    """
+
+    def __init__(
+        self,
+        load: typing.Callable[[], typing.Dict[str, WatchdogPolicy]],
+        probe: typing.Callable[[str, WatchdogPolicy], typing.Optional[str]],
+        restart: typing.Callable[[str], None],
+        interval: float = CHECK_INTERVAL,
+    ):
+        self.load = load
+        self.probe = probe  # returns reason why the client is unhealthy or None
+        self.restart = restart
+        self.interval = interval
+        self.listener: typing.Optional[typing.Callable[[str, dict], None]] = None
+        self.random = random.Random()
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._clients: typing.Dict[str, _Health] = {}
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="openvpn-client-watchdog", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """ check clients right now (e.g. an instance was stopped) """
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Health check of openvpn clients failed")
+
+    def delay(self, policy: WatchdogPolicy, attempts: int) -> float:
+        """ waiting before restart which follows `attempts` previous ones """
+        delay = min(policy.backoff_initial * 2 ** attempts, policy.backoff_max)
+        return delay * self.random.uniform(1 - JITTER, 1 + JITTER)
+
+    def tick(self, now: typing.Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        policies = {k: v for k, v in self.load().items() if v.enabled}
+
+        with self._lock:
+            for id in set(self._clients) - set(policies):
+                del self._clients[id]
+
+        for id, policy in sorted(policies.items()):
+            reason = self.probe(id, policy)
+            report = self._update(id, policy, reason, now)
+            if report == "restart":
+                logger.info("Restarting unhealthy client '%s' (%s)", id, reason)
+                try:
+                    self.restart(id)
+                except Exception:
+                    logger.exception("Restart of client '%s' failed", id)
+            elif report:
+                self._report(*report)
+
+    def _update(self, id: str, policy: WatchdogPolicy, reason: typing.Optional[str], now: float):
+        """ Updates health of the client and returns what should be done """
+        with self._lock:
+            health = self._clients.get(id)
+            if reason is None:
+                if health is None:
+                    return None
+                del self._clients[id]
+                return ("reconnected", {"id": id, "attempts": health.attempts}) if health.attempts else None
+
+            if health is None:
+                # instance might be just starting or respawned by procd
+                self._clients[id] = _Health(now + self.delay(policy, 0))
+                return None
+            if health.failed or now < health.next_attempt:
+                return None
+
+            if policy.retries and health.attempts >= policy.retries:
+                health.failed = True
+                logger.warning("Client '%s' is still unhealthy after %d restarts", id, health.attempts)
+                return "failed", {"id": id, "attempts": health.attempts, "reason": reason}
+            health.attempts += 1
+            health.next_attempt = now + self.delay(policy, health.attempts)
+            return "restart"
+
+    def _report(self, action: str, data: dict):
+        if self.listener:
+            try:
+                self.listener(action, data)
+            except Exception:
+                logger.exception("Failed to report %s of '%s'", action, data["id"])
@@ -17,39 +17,208 @@
 # Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
 #
 
+import base64
+import binascii
 import logging
 
 from foris_controller.module_base import BaseModule
 from foris_controller.handler_base import wrap_required_functions
-from foris_controller_openvpn_client_module.utils import sanitize_id
+from foris_controller_openvpn_client_module.utils import UNCHANGED, sanitize_id
 
 
 class OpenVpnClientModule(BaseModule):
     logger = logging.getLogger(__name__)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # let handler report events which are not triggered by a request
+        self.handler.register_notify(self.notify)
+
     def action_list(self, data: dict):
-        return {"clients": self.handler.list()}
+        clients, next_cursor = self.handler.list(**(data or {}))
+        res = {"clients": clients}
+        if next_cursor is not None:
+            res["next_cursor"] = next_cursor
+        return res
+
+    def action_get_status(self, data: dict):
+        return {"clients": self.handler.get_status(**data)}
+
+    def action_get_live_stats(self, data: dict):
+        return {"clients": self.handler.get_live_stats(**data)}
+
+    def action_get_probe_stats(self, data: dict):
+        return {"clients": self.handler.get_probe_stats(**data)}
+
+    def action_get_cache_stats(self, data: dict):
+        return self.handler.get_cache_stats()
+
+    def action_get_metrics(self, data: dict):
+        return self.handler.get_metrics(**data)
+
+    def _submit(self, action: str, data: dict) -> dict:
+        """ Stores the change and lets services restart in background """
+        results, job_id, _ = self.handler.submit([{"action": action, **data}])
+        return {"result": results[0], "job_id": job_id}
 
     def action_add(self, data: dict):
         data["id"] = sanitize_id(data["id"])
-        res = self.handler.add(**data)
-        if res:
+        if data.pop("async", False):
+            reply = self._submit("add", data)
+        else:
+            reply = {"result": self.handler.add(**data)}
+        if reply["result"]:
             self.notify("add", {"id": data["id"]})
-        return {"result": res}
+        return reply
 
     def action_set(self, data: dict):
-        res = self.handler.set(**data)
-        if res:
+        if data.pop("async", False):
+            results, job_id, actions = self.handler.submit([{"action": "set", **data}])
+            action, reply = actions[0], {"result": results[0], "job_id": job_id}
+        else:
+            action = self.handler.set(**data)
+            reply = {"result": action is not None}
+        if action is not None:
+            reply["instance_action"] = "none" if action == UNCHANGED else action
+        # nothing was written -> nothing to notify about
+        if action not in (None, UNCHANGED):
             self.notify("set", data)
-        return {"result": res}
+        return reply
 
     def action_del(self, data: dict):
-        res = self.handler.delete(**data)
-        if res:
+        if data.pop("async", False):
+            reply = self._submit("del", data)
+        else:
+            reply = {"result": self.handler.delete(**data)}
+        if reply["result"]:
             self.notify("del", {"id": data["id"]})
-        return {"result": res}
+        return reply
+
+    def action_upload_begin(self, data: dict):
+        data["id"] = sanitize_id(data["id"])
+        upload_id = self.handler.upload_begin(**data)
+        if upload_id is None:
+            return {"result": False}
+        return {"result": True, "upload_id": upload_id}
+
+    def action_upload_chunk(self, data: dict):
+        try:
+            chunk = base64.b64decode(data["data"], validate=True)
+        except binascii.Error:
+            return {"result": False}
+
+        received = self.handler.upload_chunk(data["upload_id"], data["offset"], chunk)
+        if received is None:
+            return {"result": False}
+        # chunk with unexpected offset is not stored, client should continue from `received`
+        return {"result": received == data["offset"] + len(chunk), "received": received}
+
+    def action_upload_commit(self, data: dict):
+        id = self.handler.upload_commit(**data)
+        if id is None:
+            return {"result": False}
+        self.notify("add", {"id": id})
+        return {"result": True, "id": id}
+
+    def action_update_config(self, data: dict):
+        changed = self.handler.update_config(**data)
+        if changed is None:
+            return {"result": False}
+        if changed:
+            self.notify("update_config", {"id": data["id"]})
+        return {"result": True, "changed": changed}
+
+    def action_set_routing(self, data: dict):
+        result = self.handler.set_routing(
+            data["id"], data.get("prefixes", []), data.get("sources", []), data.get("domains", [])
+        )
+        if result:
+            self.notify("set_routing", {"id": data["id"]})
+        return {"result": result}
+
+    def action_get_routing(self, data: dict):
+        routing = self.handler.get_routing(**data)
+        if routing is None:
+            return {"result": False}
+        return {"result": True, "routing": routing}
+
+    def action_list_groups(self, data: dict):
+        return {"groups": self.handler.list_groups()}
+
+    @staticmethod
+    def _group(data: dict) -> dict:
+        return {
+            "id": data["id"],
+            "mode": data.get("mode", "failover"),
+            "members": [{"id": e["id"], "weight": e.get("weight", 1)} for e in data["members"]],
+            "probe": data.get("probe"),
+            "max_latency": data.get("max_latency", 0),
+            "interface": data.get("interface", "lan"),
+        }
+
+    def action_add_group(self, data: dict):
+        data["id"] = sanitize_id(data["id"])
+        result = self.handler.add_group(**self._group(data))
+        if result:
+            self.notify("add_group", {"id": data["id"]})
+        return {"result": result}
+
+    def action_set_group(self, data: dict):
+        result = self.handler.set_group(**self._group(data))
+        if result:
+            self.notify("set_group", {"id": data["id"]})
+        return {"result": result}
+
+    def action_del_group(self, data: dict):
+        result = self.handler.delete_group(**data)
+        if result:
+            self.notify("del_group", {"id": data["id"]})
+        return {"result": result}
+
+    def action_get_group_status(self, data: dict):
+        return {"groups": self.handler.get_group_status(**data)}
+
+    def action_job_status(self, data: dict):
+        return self.handler.job_status(**data)
+
+    def action_batch(self, data: dict):
+        operations = data["operations"]
+        for operation in operations:
+            if operation["action"] == "add":
+                operation["id"] = sanitize_id(operation["id"])
+
+        job_id = None
+        if data.get("async", False):
+            results, job_id, actions = self.handler.submit(operations)
+        else:
+            results, actions = self.handler.batch(operations)
+
+        for operation, res, action in zip(operations, results, actions):
+            if not res or action == UNCHANGED:
+                continue
+            if operation["action"] == "set":
+                self.notify("set", {k: v for k, v in operation.items() if k != "action"})
+            else:
+                self.notify(operation["action"], {"id": operation["id"]})
+
+        reply = {
+            "results": [
+                {"action": operation["action"], "id": operation["id"], "result": res}
+                for operation, res in zip(operations, results)
+            ]
+        }
+        if job_id is not None:
+            reply["job_id"] = job_id
+        return reply
 
 
-@wrap_required_functions(["list", "add", "delete", "set"])
+@wrap_required_functions(
+    [
+        "list", "add", "delete", "set", "batch", "get_status", "get_live_stats", "get_cache_stats",
+        "get_metrics", "submit", "job_status", "upload_begin", "upload_chunk", "upload_commit",
+        "update_config", "set_routing", "get_routing", "list_groups", "add_group", "set_group",
+        "delete_group", "get_group_status", "get_probe_stats", "register_notify",
+    ]
+)
 class Handler(object):
     pass
@@ -7,3 +7,31 @@ import typing
 class OpenVPNClientCredentials(typing.TypedDict):
     username: str
     password: str
+
+
+class OpenVPNClient(typing.NamedTuple):
+    """ Stored client, converted to a reply dict only when it is returned """
+
+    id: str
+    enabled: bool
+    username: str = ""
+    password: str = ""
+    digest: str = ""  # sha256 of the config
+
+    @property
+    def credentials(self) -> OpenVPNClientCredentials:
+        return {"username": self.username, "password": self.password}
+
+    def to_dict(
+        self, fields: typing.Collection[str], running: bool = False, config: typing.Optional[dict] = None
+    ) -> dict:
+        res = {"id": self.id}
+        if "enabled" in fields:
+            res["enabled"] = self.enabled
+        if "running" in fields:
+            res["running"] = running
+        if "credentials" in fields:
+            res["credentials"] = self.credentials
+        if "config" in fields and config is not None:
+            res["config"] = config
+        return res
@@ -17,67 +17,530 @@
 # Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
 #
 
+import atexit
+import contextlib
+import hashlib
+import ipaddress
+import json
 import logging
+import os
+import random
+import threading
+import time
 import typing
+import uuid
 
 from foris_controller.handler_base import BaseMockHandler
 from foris_controller.utils import logger_wrapper
 
+from foris_controller_openvpn_client_module.utils import (
+    DEFAULT_LIST_FIELDS,
+    UNCHANGED,
+    instance_action,
+    paginate,
+    valid_group,
+    valid_routing,
+)
+
 from .. import Handler
-from ..datatypes import OpenVPNClientCredentials
+from ..datatypes import OpenVPNClient, OpenVPNClientCredentials
 
 logger = logging.getLogger(__name__)
 
+ENV_PREFIX = "FORIS_OPENVPN_CLIENT_MOCK_"
+# the same limits as in the openwrt backend
+MAX_JOBS = 256  # the oldest finished jobs are forgotten
+MAX_UPLOADS = 4
+UPLOAD_TIMEOUT = 600.0  # seconds since the last chunk
+
+
+class MockSettings(typing.NamedTuple):
+    """ Behavior of the mock handler, read from FORIS_OPENVPN_CLIENT_MOCK_* environment variables """
+
+    path: typing.Optional[str] = None  # clients are persisted to this json file
+    flush_interval: float = 1.0  # changes made within this interval are written at once
+    simulate: bool = False  # enabled clients become running after a restart
+    restart_delay: float = 0.0
+    restart_jitter: float = 0.0  # random extra delay of a restart
+    failure_rate: float = 0.0  # probability that an instance fails to start
+    seed: typing.Optional[int] = None
+
+    @staticmethod
+    def from_env() -> "MockSettings":
+        def env(name: str, convert: typing.Callable, default):
+            value = os.environ.get(ENV_PREFIX + name)
+            if value is None:
+                return default
+            try:
+                return convert(value)
+            except ValueError:
+                logger.warning("Ignoring invalid value of %s%s: %r", ENV_PREFIX, name, value)
+                return default
+
+        return MockSettings(
+            path=os.environ.get(ENV_PREFIX + "FILE") or None,
+            flush_interval=env("FLUSH_INTERVAL", float, 1.0),
+            simulate=env("SIMULATE", lambda e: e.lower() in ("1", "true", "yes"), False),
+            restart_delay=env("RESTART_DELAY", float, 0.0),
+            restart_jitter=env("RESTART_JITTER", float, 0.0),
+            failure_rate=env("FAILURE_RATE", float, 0.0),
+            seed=env("SEED", int, None),
+        )
+
 
 class MockOpenVpnClientHandler(Handler, BaseMockHandler):
-    clients = {}
+    settings = MockSettings.from_env()
+
+    clients: typing.Dict[str, OpenVPNClient] = {}
+    configs: typing.Dict[str, str] = {}
+    routing: typing.Dict[str, dict] = {}
+    groups: typing.Dict[str, dict] = {}
+    running: typing.Set[str] = set()
+    jobs = {}
+    uploads = {}
+    notify_function = None
+
+    _lock = threading.RLock()
+    _loaded = False
+    _flush_timer: typing.Optional[threading.Timer] = None
+    _random = random.Random(settings.seed)
+
+    def register_notify(self, notify: typing.Callable[[str, dict], None]):
+        MockOpenVpnClientHandler.notify_function = notify
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _locked():
+        """ holds the lock, clients are loaded from the persistence file on the first access """
+        with MockOpenVpnClientHandler._lock:
+            if not MockOpenVpnClientHandler._loaded:
+                MockOpenVpnClientHandler._load()
+                MockOpenVpnClientHandler._loaded = True
+            yield
+
+    @staticmethod
+    def _load():
+        path = MockOpenVpnClientHandler.settings.path
+        if not path:
+            return
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logger.warning("Unable to load mock clients from '%s': %s", path, exc)
+            return
+
+        for e in data.get("clients", []):
+            client = OpenVPNClient(e["id"], e["enabled"], e.get("username", ""), e.get("password", ""))
+            MockOpenVpnClientHandler.clients[client.id] = client
+            MockOpenVpnClientHandler.configs[client.id] = e.get("config", "")
+            if e.get("routing"):
+                MockOpenVpnClientHandler.routing[client.id] = e["routing"]
+            # openvpn instances keep running while the controller is restarted
+            if client.enabled and MockOpenVpnClientHandler.settings.simulate:
+                MockOpenVpnClientHandler.running.add(client.id)
+        for e in data.get("groups", []):
+            MockOpenVpnClientHandler.groups[e["id"]] = e
+        logger.debug("Loaded %d mock clients from '%s'", len(data.get("clients", [])), path)
+
+    @staticmethod
+    def _changed():
+        """ schedules writing of the persistence file, consecutive changes are written together """
+        settings = MockOpenVpnClientHandler.settings
+        if not settings.path or MockOpenVpnClientHandler._flush_timer:
+            return
+        timer = threading.Timer(settings.flush_interval, MockOpenVpnClientHandler.flush)
+        timer.daemon = True
+        MockOpenVpnClientHandler._flush_timer = timer
+        timer.start()
+
+    @staticmethod
+    def flush():
+        """ writes pending changes to the persistence file right now """
+        with MockOpenVpnClientHandler._lock:
+            timer, MockOpenVpnClientHandler._flush_timer = MockOpenVpnClientHandler._flush_timer, None
+            if timer is None:
+                return
+            timer.cancel()
+            path = MockOpenVpnClientHandler.settings.path
+            data = {
+                "clients": [
+                    {
+                        **e._asdict(),
+                        "config": MockOpenVpnClientHandler.configs.get(e.id, ""),
+                        "routing": MockOpenVpnClientHandler.routing.get(e.id),
+                    }
+                    for e in MockOpenVpnClientHandler.clients.values()
+                ],
+                "groups": list(MockOpenVpnClientHandler.groups.values()),
+            }
+            # file is replaced so it is never left half written
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+
+    @staticmethod
+    def _notify(action: str, data: dict):
+        if MockOpenVpnClientHandler.notify_function:
+            MockOpenVpnClientHandler.notify_function(action, data)
+
+    @staticmethod
+    def _restart(ids: typing.Iterable[str]) -> dict:
+        """ Simulates restart of openvpn instances of changed clients
+
+            Enabled clients are running afterwards unless their start randomly fails.
+        """
+        ids = sorted(set(ids))
+        settings = MockOpenVpnClientHandler.settings
+        report = {"ids": ids, "merged": 1, "waited": 0.0}
+        if not settings.simulate or not ids:
+            return report
+
+        time.sleep(settings.restart_delay + MockOpenVpnClientHandler._random.uniform(0, settings.restart_jitter))
+
+        changes = []
+        with MockOpenVpnClientHandler._lock:
+            for id in ids:
+                client = MockOpenVpnClientHandler.clients.get(id)
+                running = bool(client and client.enabled) \
+                    and MockOpenVpnClientHandler._random.random() >= settings.failure_rate
+                if running != (id in MockOpenVpnClientHandler.running):
+                    changes.append({"id": id, "running": running})
+                if running:
+                    MockOpenVpnClientHandler.running.add(id)
+                else:
+                    MockOpenVpnClientHandler.running.discard(id)
+
+        for change in changes:
+            MockOpenVpnClientHandler._notify("state_changed", change)
+        MockOpenVpnClientHandler._notify("restarted", report)
+        return report
 
     @logger_wrapper(logger)
-    def list(self):
+    def list(self, ids=None, fields=None, enabled=None, running=None, limit=None, cursor=None):
+        fields = set(fields or DEFAULT_LIST_FIELDS)
+        with MockOpenVpnClientHandler._locked():
+            running_instances = set(MockOpenVpnClientHandler.running)
+            clients = [
+                e for e in MockOpenVpnClientHandler.clients.values()
+                if (ids is None or e.id in ids) and (enabled is None or e.enabled == enabled)
+                and (running is None or (e.id in running_instances) == running)
+            ]
+        clients, next_cursor = paginate(clients, limit, cursor, key=lambda e: e.id)
+
+        # configs are not parsed in mock
         return [
-            {
-                "id": k,
-                "enabled": v["enabled"],
-                "running": False,
-                "credentials": {
-                    "username": v.get("username", ""),
-                    "password": v.get("password", ""),
-                }
-            }
-            for k, v in MockOpenVpnClientHandler.clients.items()
-        ]
+            e.to_dict(fields, running=e.id in running_instances, config={"remotes": [], "warnings": []})
+            for e in clients
+        ], next_cursor
 
     @logger_wrapper(logger)
-    def set(self, id, enabled, credentials: typing.Optional[OpenVPNClientCredentials] = None):
+    def get_status(self, id: typing.Optional[str] = None):
+        # there are no statistics of simulated tunnels
+        with MockOpenVpnClientHandler._locked():
+            return [
+                {"id": k, "available": False}
+                for k in MockOpenVpnClientHandler.clients
+                if id is None or k == id
+            ]
 
-        if id not in MockOpenVpnClientHandler.clients:
-            return False
+    @logger_wrapper(logger)
+    def get_live_stats(self, id: typing.Optional[str] = None):
+        return self.get_status(id)
 
-        MockOpenVpnClientHandler.clients[id]["enabled"] = enabled
-        MockOpenVpnClientHandler._set_client_credentials(id, credentials)
+    @logger_wrapper(logger)
+    def get_probe_stats(self, id: typing.Optional[str] = None):
+        # simulated tunnels are not probed
+        return self.get_status(id)
 
-        return True
+    @logger_wrapper(logger)
+    def get_cache_stats(self):
+        # mock handler keeps everything in memory, so there is nothing to cache
+        return {"config_hits": 0, "config_misses": 0, "running_hits": 0, "running_misses": 0}
 
     @logger_wrapper(logger)
-    def add(self, id, config, credentials: typing.Optional[OpenVPNClientCredentials] = None):
+    def get_metrics(self, format: str = "json"):
+        # nothing is measured in the mock handler
+        if format == "prometheus":
+            return {"format": format, "text": ""}
+        return {"format": format, "spans": [], "cache": self.get_cache_stats()}
+
+    @staticmethod
+    def _set(id, enabled, credentials: typing.Optional[OpenVPNClientCredentials] = None) -> typing.Optional[str]:
+        old = MockOpenVpnClientHandler.clients.get(id)
+        if old is None:
+            return None
 
+        MockOpenVpnClientHandler.clients[id] = old._replace(enabled=enabled)
+        MockOpenVpnClientHandler._set_client_credentials(id, credentials)
+        new = MockOpenVpnClientHandler.clients[id]
+        if new == old:
+            return UNCHANGED
+        MockOpenVpnClientHandler._changed()
+        return instance_action(old.enabled, new.enabled, True)
+
+    @staticmethod
+    def _add(id, config, credentials: typing.Optional[OpenVPNClientCredentials] = None) -> bool:
         if id in MockOpenVpnClientHandler.clients:
             return False
 
-        MockOpenVpnClientHandler.clients[id] = {"enabled": False, "config": config}
+        MockOpenVpnClientHandler.clients[id] = OpenVPNClient(id, False)
+        MockOpenVpnClientHandler.configs[id] = config
         MockOpenVpnClientHandler._set_client_credentials(id, credentials)
+        MockOpenVpnClientHandler._changed()
+        return True
 
+    @staticmethod
+    def _delete(id) -> bool:
+        if id not in MockOpenVpnClientHandler.clients:
+            return False
+
+        del MockOpenVpnClientHandler.clients[id]
+        del MockOpenVpnClientHandler.configs[id]
+        MockOpenVpnClientHandler.routing.pop(id, None)
+        for group in MockOpenVpnClientHandler.groups.values():
+            group["members"] = [e for e in group["members"] if e["id"] != id]
+        MockOpenVpnClientHandler._changed()
         return True
 
+    @staticmethod
+    def _apply(operations: typing.List[dict]) -> typing.List[typing.Union[bool, str, None]]:
+        """ Returns result of each operation, set returns action performed on the instance (None when it failed) """
+        results = []
+        with MockOpenVpnClientHandler._locked():
+            for operation in operations:
+                if operation["action"] == "add":
+                    res = MockOpenVpnClientHandler._add(
+                        operation["id"], operation["config"], operation.get("credentials")
+                    )
+                elif operation["action"] == "set":
+                    res = MockOpenVpnClientHandler._set(
+                        operation["id"], operation["enabled"], operation.get("credentials")
+                    )
+                else:
+                    res = MockOpenVpnClientHandler._delete(operation["id"])
+                results.append(res)
+        return results
+
+    @staticmethod
+    def _actions(operations: typing.List[dict], results: typing.List[typing.Union[bool, str, None]]):
+        return [e if operation["action"] == "set" else None for operation, e in zip(operations, results)]
+
+    @staticmethod
+    def _changed_ids(operations: typing.List[dict], results: typing.List[typing.Union[bool, str, None]]):
+        return [e["id"] for e, res in zip(operations, results) if res and res not in ("none", UNCHANGED)]
+
+    @logger_wrapper(logger)
+    def set(self, id, enabled, credentials: typing.Optional[OpenVPNClientCredentials] = None):
+        operations = [{"action": "set", "id": id, "enabled": enabled, "credentials": credentials}]
+        results = MockOpenVpnClientHandler._apply(operations)
+        MockOpenVpnClientHandler._restart(MockOpenVpnClientHandler._changed_ids(operations, results))
+        return results[0]
+
+    @logger_wrapper(logger)
+    def add(self, id, config, credentials: typing.Optional[OpenVPNClientCredentials] = None):
+        return self.batch([{"action": "add", "id": id, "config": config, "credentials": credentials}])[0][0]
+
     @logger_wrapper(logger)
     def delete(self, id):
+        return self.batch([{"action": "del", "id": id}])[0][0]
 
-        if id not in MockOpenVpnClientHandler.clients:
+    @logger_wrapper(logger)
+    def batch(
+        self, operations: typing.List[dict]
+    ) -> typing.Tuple[typing.List[bool], typing.List[typing.Optional[str]]]:
+        results = MockOpenVpnClientHandler._apply(operations)
+        MockOpenVpnClientHandler._restart(MockOpenVpnClientHandler._changed_ids(operations, results))
+        return [bool(e) for e in results], MockOpenVpnClientHandler._actions(operations, results)
+
+    @logger_wrapper(logger)
+    def submit(
+        self, operations: typing.List[dict]
+    ) -> typing.Tuple[typing.List[bool], str, typing.List[typing.Optional[str]]]:
+        results = MockOpenVpnClientHandler._apply(operations)
+        ids = MockOpenVpnClientHandler._changed_ids(operations, results)
+        actions = MockOpenVpnClientHandler._actions(operations, results)
+        results = [bool(e) for e in results]
+        job_id = uuid.uuid4().hex
+        with MockOpenVpnClientHandler._lock:
+            jobs = MockOpenVpnClientHandler.jobs
+            jobs[job_id] = {"job_id": job_id, "status": "pending"}
+            finished = [k for k, v in jobs.items() if v["status"] != "pending"]
+            for old_id in finished[:max(len(jobs) - MAX_JOBS, 0)]:
+                del jobs[old_id]
+
+        def finish():
+            job = {"job_id": job_id, "status": "succeeded", "report": MockOpenVpnClientHandler._restart(ids)}
+            with MockOpenVpnClientHandler._lock:
+                MockOpenVpnClientHandler.jobs[job_id] = job
+            MockOpenVpnClientHandler._notify("job_finished", job)
+
+        # without simulated restarts the job is finished right away
+        if MockOpenVpnClientHandler.settings.simulate and ids:
+            threading.Thread(target=finish, name="openvpn-client-mock-restart", daemon=True).start()
+        else:
+            finish()
+        return results, job_id, actions
+
+    @logger_wrapper(logger)
+    def upload_begin(self, id: str, credentials: typing.Optional[OpenVPNClientCredentials] = None):
+        upload_id = uuid.uuid4().hex
+        with MockOpenVpnClientHandler._lock:
+            uploads = MockOpenVpnClientHandler.uploads
+            # uploads which were never committed are dropped together with their content
+            now = time.monotonic()
+            for expired in [k for k, v in uploads.items() if v["expires"] < now]:
+                del uploads[expired]
+            if len(uploads) >= MAX_UPLOADS:
+                return None
+            uploads[upload_id] = {
+                "id": id, "credentials": credentials, "content": b"", "expires": now + UPLOAD_TIMEOUT,
+            }
+        return upload_id
+
+    @logger_wrapper(logger)
+    def upload_chunk(self, upload_id: str, offset: int, data: bytes):
+        with MockOpenVpnClientHandler._lock:
+            upload = MockOpenVpnClientHandler.uploads.get(upload_id)
+            if upload is None:
+                return None
+            if offset == len(upload["content"]):
+                upload["content"] += data
+                upload["expires"] = time.monotonic() + UPLOAD_TIMEOUT
+            return len(upload["content"])
+
+    @logger_wrapper(logger)
+    def upload_commit(self, upload_id: str, sha256: typing.Optional[str] = None):
+        with MockOpenVpnClientHandler._lock:
+            upload = MockOpenVpnClientHandler.uploads.pop(upload_id, None)
+        if upload is None:
+            return None
+        if sha256 is not None and hashlib.sha256(upload["content"]).hexdigest() != sha256.lower():
+            return None
+        if not self.add(upload["id"], upload["content"].decode(errors="replace"), upload["credentials"]):
+            return None
+        return upload["id"]
+
+    @logger_wrapper(logger)
+    def update_config(self, id: str, config: str):
+        with MockOpenVpnClientHandler._locked():
+            if id not in MockOpenVpnClientHandler.clients:
+                return None
+            if MockOpenVpnClientHandler.configs[id] == config:
+                return False
+            MockOpenVpnClientHandler.configs[id] = config
+            MockOpenVpnClientHandler._changed()
+        MockOpenVpnClientHandler._restart([id])
+        return True
+
+    @logger_wrapper(logger)
+    def set_routing(self, id: str, prefixes: typing.List[str], sources: typing.List[str], domains: typing.List[str]):
+        if not valid_routing(prefixes, sources, domains):
             return False
+        with MockOpenVpnClientHandler._locked():
+            if id not in MockOpenVpnClientHandler.clients:
+                return False
+            if prefixes or sources or domains:
+                MockOpenVpnClientHandler.routing[id] = {"prefixes": prefixes, "sources": sources, "domains": domains}
+            else:
+                MockOpenVpnClientHandler.routing.pop(id, None)
+            MockOpenVpnClientHandler._changed()
+        return True
 
-        del MockOpenVpnClientHandler.clients[id]
+    @logger_wrapper(logger)
+    def get_routing(self, id: str):
+        with MockOpenVpnClientHandler._locked():
+            if id not in MockOpenVpnClientHandler.clients:
+                return None
+            routing = MockOpenVpnClientHandler.routing.get(id, {"prefixes": [], "sources": [], "domains": []})
+
+        def compiled(values):
+            networks = [ipaddress.ip_network(e, strict=False) for e in values]
+            return sum(
+                len(list(ipaddress.collapse_addresses(e for e in networks if e.version == version)))
+                for version in (4, 6)
+            )
+
+        return {
+            "id": id, **routing,
+            "compiled": {"prefixes": compiled(routing["prefixes"]), "sources": compiled(routing["sources"])},
+        }
+
+    @logger_wrapper(logger)
+    def list_groups(self):
+        with MockOpenVpnClientHandler._locked():
+            return [
+                {k: v for k, v in e.items() if v is not None}
+                for e in MockOpenVpnClientHandler.groups.values()
+            ]
+
+    @staticmethod
+    def _set_group(group: dict, new: bool) -> bool:
+        if not valid_group(group["members"], group["probe"]):
+            return False
+        with MockOpenVpnClientHandler._locked():
+            id = group["id"]
+            if (id in MockOpenVpnClientHandler.groups) == new or id in MockOpenVpnClientHandler.clients:
+                return False
+            ids = {e["id"] for e in group["members"]}
+            if not ids <= set(MockOpenVpnClientHandler.clients):
+                return False
+            for other in MockOpenVpnClientHandler.groups.values():
+                if other["id"] != id and ids & {e["id"] for e in other["members"]}:
+                    return False
+            MockOpenVpnClientHandler.groups[id] = group
+            MockOpenVpnClientHandler._changed()
         return True
 
+    @logger_wrapper(logger)
+    def add_group(self, id, mode, members, probe, max_latency, interface):
+        return MockOpenVpnClientHandler._set_group(
+            {"id": id, "mode": mode, "members": members, "probe": probe or None,
+             "max_latency": max_latency, "interface": interface}, new=True
+        )
+
+    @logger_wrapper(logger)
+    def set_group(self, id, mode, members, probe, max_latency, interface):
+        return MockOpenVpnClientHandler._set_group(
+            {"id": id, "mode": mode, "members": members, "probe": probe or None,
+             "max_latency": max_latency, "interface": interface}, new=False
+        )
+
+    @logger_wrapper(logger)
+    def delete_group(self, id):
+        with MockOpenVpnClientHandler._locked():
+            if MockOpenVpnClientHandler.groups.pop(id, None) is None:
+                return False
+            MockOpenVpnClientHandler._changed()
+        return True
+
+    @logger_wrapper(logger)
+    def get_group_status(self, id: typing.Optional[str] = None):
+        # simulated members are healthy while they are running
+        res = []
+        with MockOpenVpnClientHandler._locked():
+            for group in sorted(MockOpenVpnClientHandler.groups.values(), key=lambda e: e["id"]):
+                if id is not None and group["id"] != id:
+                    continue
+                members = [
+                    {**e, "running": e["id"] in MockOpenVpnClientHandler.running,
+                     "healthy": e["id"] in MockOpenVpnClientHandler.running}
+                    for e in group["members"]
+                ]
+                active = [e["id"] for e in members if e["healthy"]]
+                if group["mode"] == "failover":
+                    active = active[:1]
+                res.append({"id": group["id"], "mode": group["mode"], "active": active, "members": members})
+        return res
+
+    @logger_wrapper(logger)
+    def job_status(self, job_id: str) -> dict:
+        with MockOpenVpnClientHandler._lock:
+            return MockOpenVpnClientHandler.jobs.get(job_id, {"job_id": job_id, "status": "unknown"})
+
     @staticmethod
     @logger_wrapper(logger)
     def _set_client_credentials(id: str, credentials: typing.Optional[OpenVPNClientCredentials] = None) -> None:
@@ -85,5 +548,10 @@ class MockOpenVpnClientHandler(Handler, BaseMockHandler):
             username = credentials.get("username")
             password = credentials.get("password")
             if username is not None and password is not None:
-                MockOpenVpnClientHandler.clients[id]["username"] = username
-                MockOpenVpnClientHandler.clients[id]["password"] = password
+                MockOpenVpnClientHandler.clients[id] = MockOpenVpnClientHandler.clients[id]._replace(
+                    username=username, password=password
+                )
+
+
+# pending changes are not lost when the controller exits
+atexit.register(MockOpenVpnClientHandler.flush)
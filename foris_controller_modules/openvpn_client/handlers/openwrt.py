@@ -24,6 +24,7 @@ from foris_controller.handler_base import BaseOpenwrtHandler
 from foris_controller.utils import logger_wrapper
 
 from foris_controller_backends.openvpn_client import OpenVpnClientUci
+from foris_controller_backends.openvpn_client.metrics import registry as metrics
 
 from .. import Handler
 from ..datatypes import OpenVPNClientCredentials
@@ -35,18 +36,143 @@ class OpenwrtOpenVpnClientHandler(Handler, BaseOpenwrtHandler):
 
     uci = OpenVpnClientUci()
 
+    def register_notify(self, notify: typing.Callable[[str, dict], None]):
+        OpenwrtOpenVpnClientHandler.uci.scheduler.listener = lambda report: notify("restarted", report)
+        OpenwrtOpenVpnClientHandler.uci.jobs.listener = lambda job: notify("job_finished", job)
+        OpenwrtOpenVpnClientHandler.uci.start_monitoring(
+            lambda id, running: notify("state_changed", {"id": id, "running": running})
+        )
+        OpenwrtOpenVpnClientHandler.uci.start_watchdog(notify)
+        OpenwrtOpenVpnClientHandler.uci.start_groups(notify)
+        OpenwrtOpenVpnClientHandler.uci.start_probes()
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_list")
+    def list(
+        self,
+        ids: typing.Optional[typing.List[str]] = None,
+        fields: typing.Optional[typing.List[str]] = None,
+        enabled: typing.Optional[bool] = None,
+        running: typing.Optional[bool] = None,
+        limit: typing.Optional[int] = None,
+        cursor: typing.Optional[str] = None,
+    ) -> typing.Tuple[typing.List[dict], typing.Optional[str]]:
+        return OpenwrtOpenVpnClientHandler.uci.list(ids, fields, enabled, running, limit, cursor)
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_get_status")
+    def get_status(self, id: typing.Optional[str] = None) -> typing.List[dict]:
+        return OpenwrtOpenVpnClientHandler.uci.get_status(id)
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_get_live_stats")
+    def get_live_stats(self, id: typing.Optional[str] = None) -> typing.List[dict]:
+        return OpenwrtOpenVpnClientHandler.uci.get_live_stats(id)
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_get_probe_stats")
+    def get_probe_stats(self, id: typing.Optional[str] = None) -> typing.List[dict]:
+        return OpenwrtOpenVpnClientHandler.uci.get_probe_stats(id)
+
+    @logger_wrapper(logger)
+    def get_metrics(self, format: str = "json") -> dict:
+        return OpenwrtOpenVpnClientHandler.uci.get_metrics(format)
+
     @logger_wrapper(logger)
-    def list(self) -> typing.List[dict]:
-        return OpenwrtOpenVpnClientHandler.uci.list()
+    def get_cache_stats(self) -> dict:
+        return OpenwrtOpenVpnClientHandler.uci.cache.stats()
 
     @logger_wrapper(logger)
-    def set(self, id: str, enabled: bool, credentials: typing.Optional[OpenVPNClientCredentials] = None) -> bool:
+    @metrics.timed("action_set")
+    def set(
+        self, id: str, enabled: bool, credentials: typing.Optional[OpenVPNClientCredentials] = None
+    ) -> typing.Optional[str]:
         return OpenwrtOpenVpnClientHandler.uci.set(id, enabled, credentials)
 
     @logger_wrapper(logger)
+    @metrics.timed("action_add")
     def add(self, id: str, config: str, credentials: typing.Optional[OpenVPNClientCredentials] = None) -> bool:
         return OpenwrtOpenVpnClientHandler.uci.add(id, config, credentials)
 
     @logger_wrapper(logger)
+    @metrics.timed("action_del")
     def delete(self, id: str) -> bool:
         return OpenwrtOpenVpnClientHandler.uci.delete(id)
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_batch")
+    def batch(
+        self, operations: typing.List[dict]
+    ) -> typing.Tuple[typing.List[bool], typing.List[typing.Optional[str]]]:
+        return OpenwrtOpenVpnClientHandler.uci.batch(operations)
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_submit")
+    def submit(
+        self, operations: typing.List[dict]
+    ) -> typing.Tuple[typing.List[bool], str, typing.List[typing.Optional[str]]]:
+        return OpenwrtOpenVpnClientHandler.uci.submit(operations)
+
+    @logger_wrapper(logger)
+    def upload_begin(
+        self, id: str, credentials: typing.Optional[OpenVPNClientCredentials] = None
+    ) -> typing.Optional[str]:
+        return OpenwrtOpenVpnClientHandler.uci.upload_begin(id, credentials)
+
+    @logger_wrapper(logger)
+    def upload_chunk(self, upload_id: str, offset: int, data: bytes) -> typing.Optional[int]:
+        return OpenwrtOpenVpnClientHandler.uci.upload_chunk(upload_id, offset, data)
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_upload_commit")
+    def upload_commit(self, upload_id: str, sha256: typing.Optional[str] = None) -> typing.Optional[str]:
+        return OpenwrtOpenVpnClientHandler.uci.upload_commit(upload_id, sha256)
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_update_config")
+    def update_config(self, id: str, config: str) -> typing.Optional[bool]:
+        return OpenwrtOpenVpnClientHandler.uci.update_config(id, config)
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_set_routing")
+    def set_routing(
+        self, id: str, prefixes: typing.List[str], sources: typing.List[str], domains: typing.List[str]
+    ) -> bool:
+        return OpenwrtOpenVpnClientHandler.uci.set_routing(id, prefixes, sources, domains)
+
+    @logger_wrapper(logger)
+    def get_routing(self, id: str) -> typing.Optional[dict]:
+        return OpenwrtOpenVpnClientHandler.uci.get_routing(id)
+
+    @logger_wrapper(logger)
+    def list_groups(self) -> typing.List[dict]:
+        return OpenwrtOpenVpnClientHandler.uci.list_groups()
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_add_group")
+    def add_group(
+        self, id: str, mode: str, members: typing.List[dict], probe: typing.Optional[str],
+        max_latency: int, interface: str,
+    ) -> bool:
+        return OpenwrtOpenVpnClientHandler.uci.add_group(id, mode, members, probe, max_latency, interface)
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_set_group")
+    def set_group(
+        self, id: str, mode: str, members: typing.List[dict], probe: typing.Optional[str],
+        max_latency: int, interface: str,
+    ) -> bool:
+        return OpenwrtOpenVpnClientHandler.uci.set_group(id, mode, members, probe, max_latency, interface)
+
+    @logger_wrapper(logger)
+    @metrics.timed("action_del_group")
+    def delete_group(self, id: str) -> bool:
+        return OpenwrtOpenVpnClientHandler.uci.delete_group(id)
+
+    @logger_wrapper(logger)
+    def get_group_status(self, id: typing.Optional[str] = None) -> typing.List[dict]:
+        return OpenwrtOpenVpnClientHandler.uci.get_group_status(id)
+
+    @logger_wrapper(logger)
+    def job_status(self, job_id: str) -> dict:
+        return OpenwrtOpenVpnClientHandler.uci.jobs.status(job_id)
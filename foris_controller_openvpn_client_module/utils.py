@@ -17,8 +17,75 @@
 # Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
 #
 
+import ipaddress
 import re
+import typing
+
+T = typing.TypeVar("T")
+
+DEFAULT_LIST_FIELDS = ("id", "enabled", "running", "credentials")
+GROUP_MODES = ("failover", "balance")
+INSTANCE_ACTIONS = ("none", "start", "stop", "restart")
+UNCHANGED = "unchanged"  # set didn't change the client at all (reported as "none")
+DOMAIN_LABEL = r"[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?"
+DOMAIN_RE = re.compile(rf"^(?=.{{1,253}}$)({DOMAIN_LABEL}\.)*{DOMAIN_LABEL}$", re.I)
 
 
 def sanitize_id(name):
     return re.sub(r"\W", "_", name)
+
+
+def paginate(
+    items: typing.List[T], limit: typing.Optional[int], cursor: typing.Optional[str], key: typing.Callable[[T], str]
+) -> typing.Tuple[typing.List[T], typing.Optional[str]]:
+    """ Returns items which follow `cursor` (at most `limit` of them) and cursor of the next page
+
+        Items are ordered by `key` when a page is requested, cursor is the key of the last returned item.
+    """
+    if limit is None and cursor is None:
+        return items, None
+
+    items = sorted(items, key=key)
+    if cursor is not None:
+        items = [e for e in items if key(e) > cursor]
+    if limit is None or len(items) <= limit:
+        return items, None
+    return items[:limit], key(items[limit - 1])
+
+
+def valid_routing(prefixes: typing.List[str], sources: typing.List[str], domains: typing.List[str]) -> bool:
+    """ Prefixes and sources are networks or addresses (host bits are allowed), domains are host names """
+    try:
+        for value in prefixes + sources:
+            ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        return False
+    return all(DOMAIN_RE.match(e) for e in domains)
+
+
+def parse_probe(value: str) -> typing.Optional[typing.Tuple[str, int]]:
+    """ Splits probe target "host:port" ("[address]:port" for IPv6), returns None when it is not valid """
+    host, sep, port = value.rpartition(":")
+    if not sep or not port.isdigit() or not 0 < int(port) < 65536:
+        return None
+    if host.startswith("[") and host.endswith("]"):
+        host = host[1:-1]
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        if not DOMAIN_RE.match(host):
+            return None
+    return host, int(port)
+
+
+def instance_action(was_enabled: bool, is_enabled: bool, changed: bool) -> str:
+    """ The smallest operation on the openvpn instance of the client which applies its change """
+    if was_enabled != is_enabled:
+        return "start" if is_enabled else "stop"
+    return "restart" if is_enabled and changed else "none"
+
+
+def valid_group(members: typing.List[dict], probe: typing.Optional[str]) -> bool:
+    """ Group has unique members and its probe target (if any) is valid """
+    ids = [e["id"] for e in members]
+    return bool(ids) and len(set(ids)) == len(ids) and (not probe or parse_probe(probe) is not None)
@@ -63,6 +63,17 @@ def pytest_addoption(parser):
         default=False,
         help=("Whether show output of foris-controller cmd"),
     )
+    parser.addoption(
+        "--benchmark",
+        action="store_true",
+        default=False,
+        help=("Run benchmarks of openvpn_client actions (skipped by default)"),
+    )
+    parser.addoption(
+        "--benchmark-json",
+        default=None,
+        help=("Store benchmark results to this file"),
+    )
 
 
 def pytest_generate_tests(metafunc):
@@ -0,0 +1,208 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import json
+import os
+import platform
+import statistics
+import textwrap
+import time
+import tracemalloc
+
+import pytest
+from foris_controller_testtools.utils import FileFaker
+
+from foris_controller_backends.openvpn_client import OpenVpnClientUci
+from foris_controller_modules.openvpn_client.datatypes import OpenVPNClient
+from foris_controller_modules.openvpn_client.handlers.mock import MockOpenVpnClientHandler
+
+from .conftest import CMDLINE_SCRIPT_ROOT
+from .test_openvpn_client import batch
+
+SCALES = [1, 50, 500]
+ROUNDS = 20
+FILL_CHUNK = 50
+FORK_LOG = "/tmp/openvpn_client_benchmark_forks"
+MEMORY_SCALE = 1000
+
+
+@pytest.fixture(scope="session")
+def benchmark_results(request):
+    if not request.config.getoption("--benchmark"):
+        pytest.skip("benchmarks are run only with --benchmark")
+
+    results = []
+    yield results
+
+    path = request.config.getoption("--benchmark-json")
+    if path:
+        with open(path, "w") as f:
+            json.dump(
+                {"created": int(time.time()), "python": platform.python_version(), "results": results},
+                f, indent=2,
+            )
+
+
+@pytest.fixture(scope="function")
+def fork_counting_cmds(request):
+    """ Fakes commands which are executed by the backend and records each call """
+
+    ubus_content = f"""\
+        #!/bin/sh
+        echo "/bin/ubus $@" >> {FORK_LOG}
+        [ "$1" = "call" ] && echo '{{}}'
+        exit 0
+    """
+    openvpn_content = f"""\
+        #!/bin/sh
+        echo "/etc/init.d/openvpn $@" >> {FORK_LOG}
+    """
+    forked_calls()
+    with FileFaker(CMDLINE_SCRIPT_ROOT, "/bin/ubus", True, textwrap.dedent(ubus_content)), \
+            FileFaker(CMDLINE_SCRIPT_ROOT, "/etc/init.d/openvpn", True, textwrap.dedent(openvpn_content)):
+        yield
+    forked_calls()
+
+
+def forked_calls():
+    """ Returns (and clears) commands recorded by faked scripts """
+    try:
+        with open(FORK_LOG) as f:
+            calls = f.read().splitlines()
+        os.unlink(FORK_LOG)
+    except FileNotFoundError:
+        calls = []
+    # long running event subscription is not related to any action
+    return [e.split()[0] for e in calls if "subscribe" not in e]
+
+
+def message(action, data=None):
+    res = {"module": "openvpn_client", "action": action, "kind": "request"}
+    if data is not None:
+        res["data"] = data
+    return res
+
+
+def summarize(backend, scale, action, durations, forks):
+    quantiles = statistics.quantiles(durations, n=100, method="inclusive")
+    per_command = {}
+    for command in forks:
+        per_command[command] = per_command.get(command, 0) + 1
+    return {
+        "backend": backend,
+        "scale": scale,
+        "action": action,
+        "rounds": len(durations),
+        "mean_ms": round(statistics.mean(durations) * 1000, 3),
+        "p50_ms": round(quantiles[49] * 1000, 3),
+        "p90_ms": round(quantiles[89] * 1000, 3),
+        "p99_ms": round(quantiles[98] * 1000, 3),
+        "max_ms": round(max(durations) * 1000, 3),
+        "forks_per_call": round(len(forks) / len(durations), 2),
+        "forks": {k: round(v / len(durations), 2) for k, v in sorted(per_command.items())},
+    }
+
+
+@pytest.mark.parametrize("scale", SCALES)
+def test_actions(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    fork_counting_cmds,
+    benchmark_results,
+    backend,
+    scale,
+):
+    fill_ids = [f"bench_fill_{i}" for i in range(scale)]
+    for i in range(0, scale, FILL_CHUNK):
+        res = batch(infrastructure, [
+            {"action": "add", "id": id, "config": "client\nremote vpn.example.com 1194\n"}
+            for id in fill_ids[i:i + FILL_CHUNK]
+        ])
+        assert all(e["result"] for e in res["data"]["results"])
+
+    timings = {"add": [], "set": [], "list": [], "del": []}
+    forks = {"add": [], "set": [], "list": [], "del": []}
+    forked_calls()
+    for i in range(ROUNDS):
+        id = f"bench_{i}"
+        for action, data in [
+            ("add", {"id": id, "config": "client\nremote vpn.example.com 1194\n"}),
+            ("set", {"id": id, "enabled": True}),
+            ("list", None),
+            ("del", {"id": id}),
+        ]:
+            start = time.perf_counter()
+            res = infrastructure.process_message(message(action, data))
+            timings[action].append(time.perf_counter() - start)
+            forks[action].extend(forked_calls())
+            assert "errors" not in res
+            assert action == "list" or res["data"]["result"] is True
+
+    for action in timings:
+        result = summarize(backend, scale, action, timings[action], forks[action])
+        benchmark_results.append(result)
+
+    for i in range(0, scale, FILL_CHUNK):
+        batch(infrastructure, [{"action": "del", "id": id} for id in fill_ids[i:i + FILL_CHUNK]])
+
+
+def measure_memory(call):
+    """ Returns result of `call` with its allocated blocks, retained and peak bytes """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        res = call()
+        current, peak = tracemalloc.get_traced_memory()
+        diff = tracemalloc.take_snapshot().compare_to(before, "filename")
+    finally:
+        tracemalloc.stop()
+    return res, {
+        "blocks": sum(e.count_diff for e in diff if e.count_diff > 0),
+        "retained_kib": round((current - start) / 1024, 1),
+        "peak_kib": round((peak - start) / 1024, 1),
+    }
+
+
+@pytest.mark.parametrize("backend_name", ["mock", "openwrt"])
+def test_list_memory(benchmark_results, monkeypatch, backend_name):
+    def records():
+        return [OpenVPNClient(f"bench_{i}", bool(i % 2), f"user{i}", f"pass{i}") for i in range(MEMORY_SCALE)]
+
+    clients, stored = measure_memory(records)
+    if backend_name == "mock":
+        monkeypatch.setattr(MockOpenVpnClientHandler, "clients", {e.id: e for e in clients})
+        handler = MockOpenVpnClientHandler()
+    else:
+        monkeypatch.setattr(OpenVpnClientUci, "_clients", lambda self: clients)
+        monkeypatch.setattr(OpenVpnClientUci, "_running_instances", lambda self: set())
+        handler = OpenVpnClientUci()
+
+    for action, data in [
+        ("list", {}),
+        ("list_ids", {"fields": ["id"]}),
+        ("list_page", {"limit": 50}),
+    ]:
+        (res, _), listed = measure_memory(lambda: handler.list(**data))
+        assert len(res) == (50 if "limit" in data else MEMORY_SCALE)
+        result = {"backend": backend_name, "scale": MEMORY_SCALE, "action": action, "stored": stored, **listed}
+        benchmark_results.append(result)
@@ -0,0 +1,103 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+
+import threading
+import time
+
+import pytest
+
+from foris_controller_backends.openvpn_client.executor import Step, StepFailed, run_steps
+
+
+def test_independent_steps_run_concurrently():
+    barrier = threading.Barrier(2, timeout=2)
+
+    steps = run_steps([Step("first", barrier.wait), Step("second", barrier.wait)])
+    assert [e["name"] for e in steps] == ["first", "second"]
+    assert [e["result"] for e in steps] == ["ok", "ok"]
+
+
+def test_dependencies():
+    order = []
+
+    def step(name):
+        return lambda: order.append(name)
+
+    steps = run_steps([
+        Step("firewall", step("firewall"), after=("openvpn", )),
+        Step("network", step("network")),
+        Step("openvpn", step("openvpn"), after=("network", )),
+    ])
+    assert order == ["network", "openvpn", "firewall"]
+    # timings are returned in the order of the steps
+    assert [e["name"] for e in steps] == ["firewall", "network", "openvpn"]
+    firewall, network, openvpn = steps
+    assert openvpn["started"] >= network["started"]
+    assert firewall["started"] >= openvpn["started"]
+
+
+def test_ready():
+    ready_at = time.monotonic() + 0.3
+    started = []
+
+    steps = run_steps([
+        Step("openvpn", lambda: None, ready=lambda: time.monotonic() >= ready_at, timeout=5),
+        Step("resolver", lambda: started.append(time.monotonic()), after=("openvpn", )),
+    ])
+    assert steps[0]["result"] == "ok"
+    assert 0.2 <= steps[0]["waited"] < 5
+    # dependent step waits for readiness
+    assert started[0] >= ready_at
+
+
+def test_ready_timeout():
+    steps = run_steps([
+        Step("openvpn", lambda: None, ready=lambda: False, timeout=0.2),
+        Step("resolver", lambda: None, after=("openvpn", )),
+    ])
+    # dependent steps continue anyway
+    assert [e["result"] for e in steps] == ["timeout", "ok"]
+    assert steps[0]["waited"] >= 0.2
+
+
+def test_failed_step():
+    def fail():
+        raise OSError("init script missing")
+
+    with pytest.raises(StepFailed) as exc:
+        run_steps([
+            Step("openvpn", fail),
+            Step("resolver", lambda: None, after=("openvpn", )),
+            Step("firewall", lambda: None, after=("resolver", )),
+            Step("network", lambda: None),
+        ])
+    assert exc.value.step == "openvpn"
+    assert isinstance(exc.value.__cause__, OSError)
+    assert [e["result"] for e in exc.value.steps] == ["failed", "skipped", "skipped", "ok"]
+
+
+def test_invalid_dependencies():
+    with pytest.raises(ValueError):
+        run_steps([Step("openvpn", lambda: None, after=("missing", ))])
+    with pytest.raises(ValueError):
+        run_steps([
+            Step("first", lambda: None, after=("second", )),
+            Step("second", lambda: None, after=("first", )),
+        ])
@@ -0,0 +1,118 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import json
+
+from foris_controller.exceptions import BackendCommandFailed
+from foris_controller_backends.openvpn_client.firewall import Fw4ZoneDevices, zone_rule_updates
+
+
+def device_rule(chain, key, devices, handle, zone="tr_vpn_cl"):
+    right = devices[0] if len(devices) == 1 else {"set": devices}
+    return {"rule": {
+        "family": "inet", "table": "fw4", "chain": chain, "handle": handle,
+        "comment": f"!fw4: Handle {zone} IPv4/IPv6 {chain} traffic",
+        "expr": [
+            {"match": {"op": "==", "left": {"meta": {"key": key}}, "right": right}},
+            {"jump": {"target": f"{chain}_{zone}"}},
+        ],
+    }}
+
+
+RULESET = {"nftables": [
+    {"metainfo": {"version": "1.0.2", "json_schema_version": 1}},
+    {"table": {"family": "inet", "name": "fw4", "handle": 1}},
+    device_rule("input", "iifname", ["vpnfirst"], 10),
+    device_rule("output", "oifname", ["vpnfirst", "vpnsecond"], 11),
+    device_rule("input", "iifname", ["br-lan"], 12, zone="lan"),
+    {"rule": {
+        "family": "inet", "table": "fw4", "chain": "input_tr_vpn_cl", "handle": 20,
+        "expr": [{"jump": {"target": "reject_from_tr_vpn_cl"}}],
+    }},
+]}
+
+
+def devices(commands):
+    res = {}
+    for command in commands:
+        rule = command["replace"]["rule"]
+        right = rule["expr"][0]["match"]["right"]
+        res[rule["handle"]] = right
+    return res
+
+
+def test_zone_rule_updates():
+    commands = zone_rule_updates(RULESET, "tr_vpn_cl", {"vpnthird"}, set())
+    assert devices(commands) == {
+        10: {"set": ["vpnfirst", "vpnthird"]},
+        11: {"set": ["vpnfirst", "vpnsecond", "vpnthird"]},
+    }
+    assert commands[0]["replace"]["rule"]["expr"][1] == {"jump": {"target": "input_tr_vpn_cl"}}
+    # the original ruleset is kept
+    assert RULESET["nftables"][2]["rule"]["expr"][0]["match"]["right"] == "vpnfirst"
+
+    assert devices(zone_rule_updates(RULESET, "tr_vpn_cl", set(), {"vpnsecond"})) == {10: "vpnfirst", 11: "vpnfirst"}
+
+
+def test_zone_rule_updates_fallback():
+    # zone would be empty
+    assert zone_rule_updates(RULESET, "tr_vpn_cl", set(), {"vpnfirst", "vpnsecond"}) is None
+    # zone had no devices so fw4 didn't generate its rules
+    assert zone_rule_updates({"nftables": RULESET["nftables"][:2]}, "tr_vpn_cl", {"vpnthird"}, set()) is None
+    # unknown form of the device match
+    ruleset = {"nftables": [device_rule("input", "iifname", ["vpnfirst"], 10)]}
+    ruleset["nftables"][0]["rule"]["expr"][0]["match"]["right"] = {"prefix": "vpn"}
+    assert zone_rule_updates(ruleset, "tr_vpn_cl", {"vpnthird"}, set()) is None
+
+
+def fake_nft(monkeypatch, ruleset, fail_apply=False):
+    applied = []
+
+    def run(self, args, expected_retval, **kwargs):
+        assert args[0] == "/usr/sbin/nft"
+        if args[1:] == ["-j", "list", "table", "inet", "fw4"]:
+            return json.dumps(ruleset).encode(), b""
+        assert args[1:3] == ["-j", "-f"]
+        if fail_apply:
+            raise BackendCommandFailed(1, args)
+        with open(args[3]) as f:
+            applied.append(json.load(f))
+        return b"", b""
+
+    monkeypatch.setattr(Fw4ZoneDevices, "_run_command_and_check_retval", run)
+    return applied
+
+
+def test_update(monkeypatch):
+    applied = fake_nft(monkeypatch, RULESET)
+    assert Fw4ZoneDevices("tr_vpn_cl").update({"vpnthird"}, {"vpnsecond"})
+    assert len(applied) == 1
+    assert devices(applied[0]["nftables"]) == {
+        10: {"set": ["vpnfirst", "vpnthird"]},
+        11: {"set": ["vpnfirst", "vpnthird"]},
+    }
+
+
+def test_update_failed(monkeypatch):
+    applied = fake_nft(monkeypatch, RULESET, fail_apply=True)
+    assert not Fw4ZoneDevices("tr_vpn_cl").update({"vpnthird"}, set())
+
+    applied = fake_nft(monkeypatch, {"nftables": []})
+    assert not Fw4ZoneDevices("tr_vpn_cl").update({"vpnthird"}, set())
+    assert applied == []
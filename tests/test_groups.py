@@ -0,0 +1,251 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+
+import pytest
+
+from foris_controller_backends.openvpn_client.groups import (
+    GroupManager,
+    GroupMember,
+    GroupPolicy,
+    probe_healthy,
+    probe_key,
+    probe_targets,
+    select_members,
+)
+from foris_controller_backends.openvpn_client.probes import RttHistory
+from foris_controller_openvpn_client_module.utils import parse_probe
+
+
+class FakeGroups:
+    def __init__(self):
+        self.policies = {}
+        self.running = set()
+        self.queried = []
+        self.histories = {}
+        self.switches = []
+        self.reports = []
+
+    def probe(self, id, *rtts):
+        history = self.histories.setdefault(id, RttHistory(10))
+        for rtt in rtts:
+            history.add(rtt)
+
+    def query_running(self, ids):
+        self.queried.append(("running", ids))
+        return self.running & ids
+
+    def query_stats(self, keys):
+        self.queried.append(("stats", keys))
+        return {probe_key("exits", k): v.stats() for k, v in self.histories.items() if probe_key("exits", k) in keys}
+
+    def manager(self):
+        manager = GroupManager(
+            lambda: self.policies,
+            self.query_running,
+            lambda policy, active: self.switches.append((policy.id, [e.id for e in active])),
+            self.query_stats,
+        )
+        manager.listener = lambda action, data: self.reports.append((action, data))
+        return manager
+
+
+@pytest.fixture
+def groups():
+    return FakeGroups()
+
+
+def policy(mode="failover", probe=None, max_latency=0.0):
+    return GroupPolicy(
+        "exits", mode, (GroupMember("first", 3), GroupMember("second"), GroupMember("third")), 0,
+        probe, max_latency,
+    )
+
+
+def test_select_members():
+    assert select_members(policy(), {"second", "third"}) == (GroupMember("second"), )
+    assert select_members(policy(), set()) == ()
+    assert select_members(policy("balance"), {"first", "third"}) == (GroupMember("first", 3), GroupMember("third"))
+
+
+def test_failover_by_running_state(groups):
+    manager = groups.manager()
+    groups.policies = {"exits": policy()}
+    groups.running = {"first", "second"}
+
+    manager.tick()
+    assert groups.switches == [("exits", ["first"])]
+    # nothing is switched while the state is the same
+    manager.tick()
+    assert len(groups.switches) == 1
+
+    groups.running = {"second"}
+    manager.tick()
+    assert groups.switches[-1] == ("exits", ["second"])
+    assert groups.reports[-1] == ("group_switched", {"id": "exits", "active": ["second"]})
+
+    groups.running = set()
+    manager.tick()
+    assert groups.switches[-1] == ("exits", [])
+
+    # deleted group is forgotten
+    groups.policies = {}
+    manager.tick()
+    assert manager.status() == ({}, {})
+
+
+def test_queries(groups):
+    manager = groups.manager()
+
+    # nothing is queried when no group is configured
+    manager.tick()
+    assert groups.queried == []
+
+    groups.policies = {"exits": policy()}
+    manager.tick()
+    assert groups.queried == [("running", {"first", "second", "third"})]
+
+    groups.queried.clear()
+    groups.policies = {"exits": policy(probe="192.0.2.1:443")}
+    manager.tick()
+    assert groups.queried == [
+        ("running", {"first", "second", "third"}),
+        ("stats", {"exits:first", "exits:second", "exits:third"}),
+    ]
+
+    groups.queried.clear()
+    groups.policies = {}
+    manager.tick()
+    assert groups.queried == []
+    assert manager.status() == ({}, {})
+
+
+def test_failover_by_latency(groups):
+    manager = groups.manager()
+    groups.policies = {"exits": policy(probe=("192.0.2.1", 443), max_latency=0.2)}
+    groups.running = {"first", "second"}
+    # members which were not probed yet are used
+    manager.tick()
+    assert groups.switches == [("exits", ["first"])]
+
+    groups.probe("first", 0.5)
+    groups.probe("second", 0.05)
+    manager.tick()
+    assert groups.switches[-1] == ("exits", ["second"])
+    active, members = manager.status()
+    assert active == {"exits": ["second"]}
+    assert members[probe_key("exits", "first")] == {"healthy": False, "rtt": 500.0}
+
+    # recovered member has to succeed repeatedly before it is used again
+    groups.histories["first"] = RttHistory(10)
+    groups.probe("first", 0.05)
+    manager.tick()
+    assert groups.switches[-1] == ("exits", ["second"])
+    groups.probe("first", 0.05)
+    manager.tick()
+    assert groups.switches[-1] == ("exits", ["first"])
+
+    # lost probe makes the member unhealthy right away
+    groups.probe("first", None)
+    manager.tick()
+    assert groups.switches[-1] == ("exits", ["second"])
+
+    # member which was not running has to be probed first
+    groups.running = {"third"}
+    manager.tick()
+    assert groups.switches[-1] == ("exits", [])
+
+
+def test_probe_healthy():
+    history = RttHistory(10)
+    history.add(0.01)
+    assert probe_healthy(history.stats(), 0.0, recovering=False)
+    assert not probe_healthy(history.stats(), 0.0, recovering=True)
+    history.add(0.3)
+    assert probe_healthy(history.stats(), 0.0, recovering=True)
+    # median is compared with the limit
+    assert probe_healthy(history.stats(), 0.2, recovering=False)
+    history.add(0.3)
+    assert not probe_healthy(history.stats(), 0.2, recovering=False)
+
+    # too many recent probes were lost
+    for rtt in [None] * 5 + [0.01]:
+        history.add(rtt)
+    assert not probe_healthy(history.stats(), 0.0, recovering=False)
+
+
+def test_probe_targets():
+    assert probe_targets(policy(), lambda id: f"vpn{id}") == {}
+    targets = probe_targets(policy(probe=("192.0.2.1", 443)), lambda id: f"vpn{id}")
+    assert sorted(targets) == ["exits:first", "exits:second", "exits:third"]
+    assert targets["exits:first"].spec == "tcp:192.0.2.1:443"
+    assert targets["exits:first"].dev == "vpnfirst"
+
+
+def test_restarted_member(groups):
+    manager = groups.manager()
+    groups.policies = {"exits": policy("balance")}
+    groups.running = {"first", "second"}
+    manager.tick()
+    reports = len(groups.reports)
+
+    # device of the restarted instance was recreated without the route of the group
+    manager.member_started("second")
+    manager.tick()
+    assert groups.switches[-2:] == [("exits", ["first", "second"])] * 2
+    assert len(groups.reports) == reports
+
+    # members which are not active don't matter
+    manager.member_started("third")
+    manager.tick()
+    assert len(groups.switches) == 2
+
+
+def test_balance(groups):
+    manager = groups.manager()
+    groups.policies = {"exits": policy("balance")}
+    groups.running = {"first", "second", "third"}
+    manager.tick()
+    assert groups.switches == [("exits", ["first", "second", "third"])]
+
+    groups.running = {"first", "third"}
+    manager.tick()
+    assert groups.switches[-1] == ("exits", ["first", "third"])
+
+
+def test_switch_failure(groups):
+    manager = groups.manager()
+    groups.policies = {"exits": policy()}
+    groups.running = {"first"}
+    manager.switch = lambda policy, active: 1 / 0
+    manager.tick()
+    assert groups.reports == []
+
+    # retried in the next round
+    manager.switch = lambda policy, active: groups.switches.append(policy.id)
+    manager.tick()
+    assert groups.switches == ["exits"]
+
+
+def test_parse_probe():
+    assert parse_probe("192.0.2.1:443") == ("192.0.2.1", 443)
+    assert parse_probe("[2001:db8::1]:53") == ("2001:db8::1", 53)
+    assert parse_probe("example.com:80") == ("example.com", 80)
+    for value in ["example.com", "example.com:0", "example.com:70000", "-bad-:80", "2001:db8::1"]:
+        assert parse_probe(value) is None
@@ -0,0 +1,132 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import socket
+import threading
+
+import pytest
+
+from foris_controller_backends.openvpn_client import management
+
+
+class FakeManagement:
+    """ Minimal openvpn management interface listening on a unix socket """
+
+    def __init__(self, path: str, state: str, load_stats: str):
+        self.state = state
+        self.load_stats = load_stats
+        self.commands = []
+        self.connections = 0
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(1)
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            with conn, conn.makefile("r") as f:
+                conn.sendall(b">INFO:OpenVPN Management Interface Version 3 -- type 'help' for more info\r\n")
+                for line in f:
+                    cmd = line.strip()
+                    self.commands.append(cmd)
+                    if cmd.startswith("bytecount"):
+                        conn.sendall(b"SUCCESS: bytecount interval changed\r\n>BYTECOUNT:10,20\r\n")
+                    elif cmd == "state":
+                        conn.sendall(f"{self.state}\r\nEND\r\n".encode())
+                    elif cmd == "load-stats":
+                        conn.sendall(f"{self.load_stats}\r\n".encode())
+                    elif cmd == "quit":
+                        break
+                    else:
+                        conn.sendall(b"ERROR: unknown command\r\n")
+
+    def close(self):
+        self.server.close()
+
+
+@pytest.fixture
+def management_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(management, "MANAGEMENT_PATH", str(tmp_path / "{}.mgmt"))
+    return str(tmp_path / "{}.mgmt")
+
+
+def test_parse_state():
+    res = management.parse_state(["1700000000,CONNECTED,SUCCESS,10.8.0.6,192.0.2.1,1194,,"])
+    assert res == {
+        "state": "CONNECTED",
+        "state_since": 1700000000,
+        "vpn_ip": "10.8.0.6",
+        "remote_ip": "192.0.2.1",
+        "remote_port": 1194,
+    }
+    assert management.parse_state(["1700000000,WAIT,,,,,,"]) == {"state": "WAIT", "state_since": 1700000000}
+
+
+def test_parse_load_stats():
+    assert management.parse_load_stats(["SUCCESS: nclients=0,bytesin=123,bytesout=456"]) == {
+        "bytes_in": 123, "bytes_out": 456,
+    }
+    assert management.parse_load_stats(["SUCCESS: nclients=0"]) == {}
+
+
+def test_pool_stats(management_path):
+    server = FakeManagement(
+        management_path.format("first"),
+        "1700000000,CONNECTED,SUCCESS,10.8.0.6,192.0.2.1,1194,,",
+        "SUCCESS: nclients=0,bytesin=123,bytesout=456",
+    )
+    pool = management.ManagementPool(timeout=1.0)
+    try:
+        expected = {
+            "state": "CONNECTED",
+            "state_since": 1700000000,
+            "vpn_ip": "10.8.0.6",
+            "remote_ip": "192.0.2.1",
+            "remote_port": 1194,
+            "bytes_in": 123,
+            "bytes_out": 456,
+        }
+        assert pool.stats("first") == expected
+        assert pool.stats("first") == expected
+        # connection is kept open and bytecount is enabled only once
+        assert server.connections == 1
+        assert server.commands == ["bytecount 5", "state", "load-stats", "state", "load-stats"]
+
+        # counters pushed by bytecount are used when load-stats doesn't contain them
+        server.load_stats = "SUCCESS: nclients=0"
+        assert pool.stats("first")["bytes_in"] == 10
+
+        pool.forget([])
+        assert pool.stats("first")["state"] == "CONNECTED"
+        assert server.connections == 2
+    finally:
+        pool.forget([])
+        server.close()
+
+
+def test_pool_unavailable(management_path):
+    pool = management.ManagementPool(timeout=1.0)
+    assert pool.stats("missing") is None
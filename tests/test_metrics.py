@@ -0,0 +1,70 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import pytest
+
+from foris_controller_backends.openvpn_client.metrics import MetricsRegistry
+
+
+def test_spans():
+    registry = MetricsRegistry()
+    registry.observe("uci_read", 0.002)
+    registry.observe("uci_read", 0.004)
+
+    @registry.timed("action_list")
+    def action():
+        return "result"
+
+    assert action() == "result"
+
+    with pytest.raises(RuntimeError):
+        with registry.span("network_restart"):
+            raise RuntimeError("failed")
+
+    spans = {e["name"]: e for e in registry.snapshot()}
+    assert set(spans) == {"action_list", "network_restart", "uci_read"}
+    assert spans["uci_read"] == {
+        "name": "uci_read", "count": 2, "total": 0.006, "min": 0.002, "max": 0.004, "avg": 0.003,
+    }
+    assert spans["network_restart"]["count"] == 1
+
+    registry.reset()
+    assert registry.snapshot() == []
+
+
+def test_prometheus():
+    registry = MetricsRegistry()
+    registry.observe("uci_read", 0.002)
+    registry.observe("uci_read", 0.02)
+    registry.observe("network_restart", 20.0)
+
+    lines = registry.prometheus({"config_hits": 3, "config_misses": 1}).splitlines()
+    name = "foris_openvpn_client_stage_duration_seconds"
+    assert f"# TYPE {name} histogram" in lines
+    # buckets are cumulative
+    assert f'{name}_bucket{{stage="uci_read",le="0.005"}} 1' in lines
+    assert f'{name}_bucket{{stage="uci_read",le="0.025"}} 2' in lines
+    assert f'{name}_bucket{{stage="uci_read",le="+Inf"}} 2' in lines
+    assert f'{name}_count{{stage="uci_read"}} 2' in lines
+    assert f'{name}_sum{{stage="uci_read"}} 0.022000' in lines
+    assert f'{name}_bucket{{stage="network_restart",le="10.0"}} 0' in lines
+    assert f'{name}_bucket{{stage="network_restart",le="+Inf"}} 1' in lines
+
+    assert 'foris_openvpn_client_cache_lookups_total{cache="config",result="hit"} 3' in lines
+    assert 'foris_openvpn_client_cache_lookups_total{cache="config",result="miss"} 1' in lines
@@ -0,0 +1,198 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import json
+import threading
+import time
+
+import pytest
+
+from foris_controller_modules.openvpn_client.handlers import mock
+from foris_controller_modules.openvpn_client.handlers.mock import MockOpenVpnClientHandler, MockSettings
+from foris_controller_openvpn_client_module.utils import UNCHANGED
+
+
+@pytest.fixture
+def mock_handler(monkeypatch):
+    """ Handler with an empty state, returns settings setter and recorded notifications """
+    for name, value in [
+        ("clients", {}), ("configs", {}), ("routing", {}), ("groups", {}), ("running", set()), ("jobs", {}),
+        ("uploads", {}),
+    ]:
+        monkeypatch.setattr(MockOpenVpnClientHandler, name, value)
+    monkeypatch.setattr(MockOpenVpnClientHandler, "_loaded", False)
+    monkeypatch.setattr(MockOpenVpnClientHandler, "_flush_timer", None)
+    notifications = []
+    monkeypatch.setattr(MockOpenVpnClientHandler, "notify_function", lambda a, d: notifications.append((a, d)))
+
+    def configure(**kwargs):
+        monkeypatch.setattr(MockOpenVpnClientHandler, "settings", MockSettings(**kwargs))
+
+    configure()
+    yield MockOpenVpnClientHandler(), configure, notifications
+    MockOpenVpnClientHandler.flush()
+
+
+def reload(monkeypatch):
+    """ Forget everything as if the controller was restarted """
+    MockOpenVpnClientHandler.flush()
+    monkeypatch.setattr(MockOpenVpnClientHandler, "clients", {})
+    monkeypatch.setattr(MockOpenVpnClientHandler, "configs", {})
+    monkeypatch.setattr(MockOpenVpnClientHandler, "routing", {})
+    monkeypatch.setattr(MockOpenVpnClientHandler, "groups", {})
+    monkeypatch.setattr(MockOpenVpnClientHandler, "running", set())
+    monkeypatch.setattr(MockOpenVpnClientHandler, "_loaded", False)
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("FORIS_OPENVPN_CLIENT_MOCK_FILE", "/tmp/clients.json")
+    monkeypatch.setenv("FORIS_OPENVPN_CLIENT_MOCK_SIMULATE", "1")
+    monkeypatch.setenv("FORIS_OPENVPN_CLIENT_MOCK_RESTART_DELAY", "0.5")
+    monkeypatch.setenv("FORIS_OPENVPN_CLIENT_MOCK_FAILURE_RATE", "invalid")
+    assert MockSettings.from_env() == MockSettings(path="/tmp/clients.json", simulate=True, restart_delay=0.5)
+
+
+def test_persistence(mock_handler, monkeypatch, tmp_path):
+    handler, configure, _ = mock_handler
+    path = tmp_path / "clients.json"
+    configure(path=str(path), flush_interval=60.0, simulate=True)
+
+    assert handler.add("first", "config 1", {"username": "user", "password": "pass"})
+    assert handler.add("second", "config 2")
+    assert handler.set("first", True)
+    # changes are written together later
+    assert not path.exists()
+    MockOpenVpnClientHandler.flush()
+    assert [e["id"] for e in json.loads(path.read_text())["clients"]] == ["first", "second"]
+
+    reload(monkeypatch)
+    # file is read on the first access
+    assert MockOpenVpnClientHandler.clients == {}
+    assert handler.list()[0] == [
+        {"id": "first", "enabled": True, "running": True, "credentials": {"username": "user", "password": "pass"}},
+        {"id": "second", "enabled": False, "running": False, "credentials": {"username": "", "password": ""}},
+    ]
+    assert handler.update_config("second", "config 2") is False
+
+    assert handler.delete("first")
+    reload(monkeypatch)
+    assert [e["id"] for e in handler.list()[0]] == ["second"]
+
+
+def test_concurrent_changes(mock_handler):
+    handler, _, _ = mock_handler
+
+    def worker(n):
+        for i in range(50):
+            assert handler.add(f"client_{n}_{i}", "config")
+            assert handler.set(f"client_{n}_{i}", True)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    clients, _ = handler.list(enabled=True, fields=["id"])
+    assert len(clients) == 400
+
+
+def test_simulated_restarts(mock_handler):
+    handler, configure, notifications = mock_handler
+    configure(simulate=True)
+
+    assert handler.add("sim", "config")
+    assert handler.set("sim", True)
+    assert handler.list(running=True)[0] == [
+        {"id": "sim", "enabled": True, "running": True, "credentials": {"username": "", "password": ""}}
+    ]
+    assert ("state_changed", {"id": "sim", "running": True}) in notifications
+
+    configure(simulate=True, failure_rate=1.0)
+    assert handler.update_config("sim", "changed")
+    assert handler.list(fields=["id", "running"])[0] == [{"id": "sim", "running": False}]
+    assert notifications[-2:] == [
+        ("state_changed", {"id": "sim", "running": False}),
+        ("restarted", {"ids": ["sim"], "merged": 1, "waited": 0.0}),
+    ]
+
+
+def test_set_actions(mock_handler):
+    handler, configure, notifications = mock_handler
+    configure(simulate=True)
+
+    assert handler.add("sim", "config")
+    assert handler.set("sim", False, {"username": "user", "password": "secret"}) == "none"
+    assert handler.set("sim", True) == "start"
+    assert handler.set("sim", True, {"username": "user", "password": "changed"}) == "restart"
+    restarted = len([e for e in notifications if e[0] == "restarted"])
+
+    # unchanged client is not restarted
+    assert handler.set("sim", True, {"username": "user", "password": "changed"}) == UNCHANGED
+    assert len([e for e in notifications if e[0] == "restarted"]) == restarted
+
+    assert handler.set("sim", False) == "stop"
+    assert handler.set("missing", False) is None
+
+
+def test_simulated_restart_delay(mock_handler):
+    handler, configure, notifications = mock_handler
+    configure(simulate=True, restart_delay=0.2)
+
+    start = time.monotonic()
+    assert handler.add("slow", "config")
+    assert time.monotonic() - start >= 0.2
+
+    # asynchronous job replies before the restart is finished
+    start = time.monotonic()
+    results, job_id, actions = handler.submit([{"action": "set", "id": "slow", "enabled": True}])
+    assert results == [True]
+    assert actions == ["start"]
+    assert time.monotonic() - start < 0.2
+    assert handler.job_status(job_id)["status"] == "pending"
+
+    for _ in range(50):
+        if handler.job_status(job_id)["status"] != "pending":
+            break
+        time.sleep(0.05)
+    assert handler.job_status(job_id)["status"] == "succeeded"
+    assert notifications[-1][0] == "job_finished"
+    assert handler.list(fields=["running"])[0] == [{"id": "slow", "running": True}]
+
+
+def test_bounded_jobs_and_uploads(mock_handler, monkeypatch):
+    handler, _, _ = mock_handler
+    monkeypatch.setattr(mock, "MAX_JOBS", 3)
+    assert handler.add("bounded", "config")
+
+    job_ids = [handler.submit([{"action": "set", "id": "bounded", "enabled": i % 2 == 0}])[1] for i in range(5)]
+    # the oldest finished jobs are forgotten
+    assert list(MockOpenVpnClientHandler.jobs) == job_ids[-3:]
+    assert handler.job_status(job_ids[0])["status"] == "unknown"
+
+    upload_ids = [handler.upload_begin(f"upload_{i}") for i in range(mock.MAX_UPLOADS)]
+    assert handler.upload_chunk(upload_ids[0], 0, b"client\n") == 7
+    assert handler.upload_begin("too_many") is None
+
+    # abandoned uploads expire together with their content
+    monkeypatch.setattr(mock, "UPLOAD_TIMEOUT", -1.0)
+    assert handler.upload_chunk(upload_ids[0], 7, b"remote vpn.example.com\n") == 30
+    assert handler.upload_begin("fresh") is not None
+    assert upload_ids[0] not in MockOpenVpnClientHandler.uploads
+    assert len(MockOpenVpnClientHandler.uploads) == mock.MAX_UPLOADS
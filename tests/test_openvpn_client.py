@@ -17,8 +17,13 @@
 # Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
 #
 
+import base64
+import hashlib
+import json
+import os
 import pathlib
 import textwrap
+import time
 
 import pytest
 from foris_controller.exceptions import UciRecordNotFound
@@ -27,7 +32,6 @@ from foris_controller_testtools.utils import (
     FileFaker,
     get_uci_module,
     network_restart_was_called,
-    sh_was_called,
 )
 
 from .conftest import CMDLINE_SCRIPT_ROOT
@@ -95,6 +99,111 @@ EOF
         yield f
 
 
+OPENVPN_INIT_CALLED = "/tmp/openvpn_init_called"
+
+
+@pytest.fixture(scope="function")
+def openvpn_init_cmd(request):
+
+    # /etc/init.d/openvpn <action> <instance>
+    content = f"""\
+#!/bin/sh
+echo "$@" >> {OPENVPN_INIT_CALLED}
+"""
+    openvpn_init_calls()
+    with FileFaker(CMDLINE_SCRIPT_ROOT, "/etc/init.d/openvpn", True, textwrap.dedent(content)) as f:
+        yield f
+    openvpn_init_calls()
+
+
+def openvpn_init_calls():
+    """ Returns (and clears) recorded per-instance openvpn init script calls """
+    try:
+        with open(OPENVPN_INIT_CALLED) as f:
+            calls = f.read().splitlines()
+        os.unlink(OPENVPN_INIT_CALLED)
+    except FileNotFoundError:
+        calls = []
+    return calls
+
+
+NFT_APPLIED = "/tmp/openvpn_client_nft_applied"
+
+
+@pytest.fixture(scope="function")
+def nft_cmd(request):
+
+    # fw4 ruleset with a single device in the zone
+    ruleset = {"nftables": [
+        {
+            "rule": {
+                "family": "inet", "table": "fw4", "chain": chain, "handle": handle,
+                "comment": f"!fw4: Handle tr_vpn_cl IPv4/IPv6 {chain} traffic",
+                "expr": [
+                    {"match": {"op": "==", "left": {"meta": {"key": key}}, "right": "vpnexisting"}},
+                    {"jump": {"target": f"{chain}_tr_vpn_cl"}},
+                ],
+            }
+        }
+        for chain, key, handle in [("input", "iifname", 10), ("output", "oifname", 11)]
+    ]}
+    content = f"""\
+#!/bin/sh
+if [ "$2" = "list" ]; then
+    echo '{json.dumps(ruleset)}'
+else
+    cat "$3" >> {NFT_APPLIED}
+    echo >> {NFT_APPLIED}
+fi
+"""
+    nft_applied()
+    with FileFaker(CMDLINE_SCRIPT_ROOT, "/usr/sbin/nft", True, textwrap.dedent(content)) as f:
+        yield f
+    nft_applied()
+
+
+def nft_applied():
+    """ Returns (and clears) rules replaced by the faked nft, (handle, devices) pairs """
+    try:
+        with open(NFT_APPLIED) as f:
+            transactions = [json.loads(e) for e in f.read().splitlines() if e]
+        os.unlink(NFT_APPLIED)
+    except FileNotFoundError:
+        transactions = []
+    return [
+        [(e["replace"]["rule"]["handle"], e["replace"]["rule"]["expr"][0]["match"]["right"]) for e in t["nftables"]]
+        for t in transactions
+    ]
+
+
+IP_CALLED = "/tmp/openvpn_client_ip_called"
+
+
+@pytest.fixture(scope="function")
+def ip_cmd(request):
+
+    # /sbin/ip <args>
+    content = f"""\
+#!/bin/sh
+echo "$@" >> {IP_CALLED}
+"""
+    ip_calls()
+    with FileFaker(CMDLINE_SCRIPT_ROOT, "/sbin/ip", True, textwrap.dedent(content)) as f:
+        yield f
+    ip_calls()
+
+
+def ip_calls():
+    """ Returns (and clears) recorded ip calls """
+    try:
+        with open(IP_CALLED) as f:
+            calls = f.read().splitlines()
+        os.unlink(IP_CALLED)
+    except FileNotFoundError:
+        calls = []
+    return calls
+
+
 def add(infrastructure, id, config, username=None, password=None):
     msg_data = {"id": id, "config": config}
     if username is not None and password is not None:
@@ -137,6 +246,17 @@ def delete(infrastructure, id):
     )
 
 
+def batch(infrastructure, operations):
+    return infrastructure.process_message(
+        {
+            "module": "openvpn_client",
+            "action": "batch",
+            "kind": "request",
+            "data": {"operations": operations},
+        }
+    )
+
+
 def list(infrastructure):
     return infrastructure.process_message(
         {"module": "openvpn_client", "action": "list", "kind": "request"}
@@ -152,6 +272,53 @@ def test_list(infrastructure, ubus_service_list_cmd):
     assert "clients" in res["data"]
 
 
+def test_list_filters(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+):
+    def query(**data):
+        res = infrastructure.process_message(
+            {"module": "openvpn_client", "action": "list", "kind": "request", "data": data}
+        )
+        assert "errors" not in res
+        return res["data"]
+
+    ids = ["filter1", "filter2", "filter3"]
+    for id in ids:
+        assert add(infrastructure, id, "client\nremote vpn.example.com\n")["data"]["result"]
+    assert set(infrastructure, "filter2", True)["data"]["result"]
+
+    # selected clients and fields only
+    assert query(ids=ids, fields=["id", "enabled"]) == {"clients": [
+        {"id": "filter1", "enabled": False},
+        {"id": "filter2", "enabled": True},
+        {"id": "filter3", "enabled": False},
+    ]}
+    assert query(ids=["filter1"], fields=["id"]) == {"clients": [{"id": "filter1"}]}
+    assert query(ids=["missing"]) == {"clients": []}
+
+    # filters
+    assert [e["id"] for e in query(ids=ids, enabled=True)["clients"]] == ["filter2"]
+    assert [e["id"] for e in query(ids=ids, enabled=False, running=False)["clients"]] == ["filter1", "filter3"]
+
+    # pages are ordered by id
+    page = query(ids=ids, fields=["id"], limit=2)
+    assert page == {"clients": [{"id": "filter1"}, {"id": "filter2"}], "next_cursor": "filter2"}
+    page = query(ids=ids, fields=["id"], limit=2, cursor=page["next_cursor"])
+    assert page == {"clients": [{"id": "filter3"}]}
+
+    res = infrastructure.process_message(
+        {"module": "openvpn_client", "action": "list", "kind": "request", "data": {"limit": 0}}
+    )
+    assert "errors" in res
+
+    for id in ids:
+        assert delete(infrastructure, id)["data"]["result"]
+
+
 def test_complex(
     uci_configs_init,
     init_script_result,
@@ -235,6 +402,15 @@ def test_complex(
         "data": {"id": "first", "enabled": False},
     }
 
+    # nothing changed -> no notification
+    assert set(infrastructure, "first", False, "", "")["data"]["instance_action"] == "none"
+    assert set(infrastructure, "first", True)["data"]["instance_action"] == "start"
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert [e["data"] for e in notifications[-2:]] == [
+        {"id": "first", "enabled": False},
+        {"id": "first", "enabled": True},
+    ]
+
     # set missing
     res = set(infrastructure, "second", False)
     assert "errors" not in res
@@ -303,9 +479,12 @@ def test_complex_with_credentials(
     }
 
     # update credentials
+    filters = [("openvpn_client", "set")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
     res = set(infrastructure, "with_creds", False, "new_user", "123456")
     assert "errors" not in res
-    assert res["data"]["result"]
+    assert res["data"] == {"result": True, "instance_action": "none"}
     assert {
         "id": "with_creds",
         "enabled": False,
@@ -313,10 +492,16 @@ def test_complex_with_credentials(
         "credentials": {"username": "new_user", "password": "123456"}
     } in list(infrastructure)
 
+    # disabled instance is not touched, but the change is notified
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["data"] == {
+        "id": "with_creds", "enabled": False, "credentials": {"username": "new_user", "password": "123456"},
+    }
+
     # just toggle enabled status and leave credentials be
     res = set(infrastructure, "with_creds", True)
     assert "errors" not in res
-    assert res["data"]["result"]
+    assert res["data"] == {"result": True, "instance_action": "start"}
     assert {
         "id": "with_creds",
         "enabled": True,
@@ -327,7 +512,7 @@ def test_complex_with_credentials(
     # reset credentials
     res = set(infrastructure, "with_creds", True, "", "")
     assert "errors" not in res
-    assert res["data"]["result"]
+    assert res["data"] == {"result": True, "instance_action": "restart"}
     assert {
         "id": "with_creds",
         "enabled": True,
@@ -335,6 +520,20 @@ def test_complex_with_credentials(
         "credentials": {"username": "", "password": ""}
     } in list(infrastructure)
 
+    # nothing changed
+    res = set(infrastructure, "with_creds", True, "", "")
+    assert "errors" not in res
+    assert res["data"] == {"result": True, "instance_action": "none"}
+
+    res = set(infrastructure, "with_creds", False)
+    assert "errors" not in res
+    assert res["data"] == {"result": True, "instance_action": "stop"}
+
+    # missing client
+    res = set(infrastructure, "without_creds", False)
+    assert "errors" not in res
+    assert res["data"] == {"result": False}
+
 
 @pytest.mark.only_backends(["openwrt"])
 def test_complex_openwrt(
@@ -343,6 +542,7 @@ def test_complex_openwrt(
     infrastructure,
     network_restart_command,
     ubus_service_list_cmd,
+    openvpn_init_cmd,
 ):
     uci = get_uci_module(infrastructure.name)
 
@@ -352,8 +552,9 @@ def test_complex_openwrt(
     res = add(infrastructure, "openwrt_first", "config content")
     assert res["data"]["result"]
 
-    assert network_restart_was_called([])
-    assert sh_was_called(["/etc/init.d/openvpn", "restart"])
+    # new tunnel interface -> firewall zone changed, but the instance is not enabled yet
+    assert not network_restart_was_called([])
+    assert openvpn_init_calls() == []
 
     with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
         data = backend.read()
@@ -369,6 +570,10 @@ def test_complex_openwrt(
     # username + password should be unset
     assert uci.get_option_named(data, "openvpn", "openwrt_first", "username", "") == ""
     assert uci.get_option_named(data, "openvpn", "openwrt_first", "password", "") == ""
+    assert (
+        uci.get_option_named(data, "openvpn", "openwrt_first", "management")
+        == "/var/run/openvpn.openwrt_first.mgmt unix"
+    )
 
     path = pathlib.Path(FILE_ROOT_PATH) / "etc/openvpn/foris/openwrt_first.conf"
 
@@ -393,8 +598,8 @@ def test_complex_openwrt(
     with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
         data = backend.read()
 
-    assert network_restart_was_called([])
-    assert sh_was_called(["/etc/init.d/openvpn", "restart"])
+    # only the affected instance is started
+    assert openvpn_init_calls() == ["start openwrt_first"]
 
     assert (
         uci.parse_bool(uci.get_option_named(data, "openvpn", "openwrt_first", "enabled")) is True
@@ -407,8 +612,7 @@ def test_complex_openwrt(
     with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
         data = backend.read()
 
-    assert network_restart_was_called([])
-    assert sh_was_called(["/etc/init.d/openvpn", "restart"])
+    assert openvpn_init_calls() == ["stop openwrt_first"]
 
     assert (
         uci.parse_bool(uci.get_option_named(data, "openvpn", "openwrt_first", "enabled")) is False
@@ -418,8 +622,9 @@ def test_complex_openwrt(
     res = delete(infrastructure, "openwrt_first")
     assert res["data"]["result"]
 
-    assert network_restart_was_called([])
-    assert sh_was_called(["/etc/init.d/openvpn", "restart"])
+    # disabled instance is not running, only the interface is removed
+    assert not network_restart_was_called([])
+    assert openvpn_init_calls() == []
 
     with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
         data = backend.read()
@@ -430,6 +635,32 @@ def test_complex_openwrt(
     assert path.exists() is False
 
 
+@pytest.mark.only_backends(["openwrt"])
+def test_zone_devices_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+):
+    uci = get_uci_module(infrastructure.name)
+
+    # devices of the firewall zone change, but other tunnels are not disturbed by network restart
+    assert add(infrastructure, "zone_first", "config content")["data"]["result"]
+    assert not network_restart_was_called([])
+    with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
+        data = backend.read()
+    assert "vpnzone_first" in uci.get_option_named(data, "firewall", "turris_vpn_client", "device")
+
+    assert delete(infrastructure, "zone_first")["data"]["result"]
+    assert not network_restart_was_called([])
+    with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
+        data = backend.read()
+    assert "vpnzone_first" not in uci.get_option_named(data, "firewall", "turris_vpn_client", "device", [])
+    assert openvpn_init_calls() == []
+
+
 @pytest.mark.only_backends(["openwrt"])
 def test_complex_with_credentials_openwrt(
     uci_configs_init,
@@ -437,6 +668,7 @@ def test_complex_with_credentials_openwrt(
     infrastructure,
     network_restart_command,
     ubus_service_list_cmd,
+    openvpn_init_cmd,
 ):
     """Test that openvpn credentials are succesfully stored and read back."""
     uci = get_uci_module(infrastructure.name)
@@ -447,8 +679,8 @@ def test_complex_with_credentials_openwrt(
     res = add(infrastructure, "openwrt_creds", "config content", "myuser", "p@ssw0rd")
     assert res["data"]["result"]
 
-    assert network_restart_was_called([])
-    assert sh_was_called(["/etc/init.d/openvpn", "restart"])
+    assert not network_restart_was_called([])
+    assert openvpn_init_calls() == []
 
     with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
         data = backend.read()
@@ -487,8 +719,8 @@ def test_complex_with_credentials_openwrt(
     with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
         data = backend.read()
 
-    assert network_restart_was_called([])
-    assert sh_was_called(["/etc/init.d/openvpn", "restart"])
+    # disabled instance doesn't need to be restarted
+    assert openvpn_init_calls() == []
 
     assert (
         uci.parse_bool(uci.get_option_named(data, "openvpn", "openwrt_creds", "enabled")) is False
@@ -528,8 +760,7 @@ def test_complex_with_credentials_openwrt(
     with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
         data = backend.read()
 
-    assert network_restart_was_called([])
-    assert sh_was_called(["/etc/init.d/openvpn", "restart"])
+    assert openvpn_init_calls() == ["start openwrt_creds"]
 
     assert (
         uci.parse_bool(uci.get_option_named(data, "openvpn", "openwrt_creds", "enabled")) is True
@@ -544,8 +775,8 @@ def test_complex_with_credentials_openwrt(
     with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
         data = backend.read()
 
-    assert network_restart_was_called([])
-    assert sh_was_called(["/etc/init.d/openvpn", "restart"])
+    # credentials changed -> restart just the single instance
+    assert openvpn_init_calls() == ["restart openwrt_creds"]
 
     assert (
         uci.parse_bool(uci.get_option_named(data, "openvpn", "openwrt_creds", "enabled")) is True
@@ -553,6 +784,11 @@ def test_complex_with_credentials_openwrt(
     assert uci.get_option_named(data, "openvpn", "openwrt_creds", "username", "") == ""
     assert uci.get_option_named(data, "openvpn", "openwrt_creds", "password", "") == ""
 
+    # the same values -> nothing is restarted
+    res = set(infrastructure, "openwrt_creds", True, "", "")
+    assert res["data"] == {"result": True, "instance_action": "none"}
+    assert openvpn_init_calls() == []
+
 
 @pytest.mark.parametrize(
     "plain, sanitized",
@@ -583,3 +819,938 @@ def test_add(
         "running": False,
         "credentials": {"username": "", "password": ""}
     } in list(infrastructure)
+
+
+def test_batch(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+):
+    filters = [("openvpn_client", "add"), ("openvpn_client", "set"), ("openvpn_client", "del")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    res = batch(
+        infrastructure,
+        [
+            {"action": "add", "id": "batch-first", "config": "1"},
+            {"action": "add", "id": "batch_second", "config": "2", "credentials": {"username": "u", "password": "p"}},
+            {"action": "add", "id": "batch_first", "config": "3"},
+            {"action": "set", "id": "batch_second", "enabled": True},
+            # unchanged -> not notified
+            {"action": "set", "id": "batch_second", "enabled": True},
+            {"action": "set", "id": "batch_missing", "enabled": True},
+            {"action": "del", "id": "batch_first"},
+        ],
+    )
+    assert "errors" not in res
+    assert res["data"]["results"] == [
+        {"action": "add", "id": "batch_first", "result": True},
+        {"action": "add", "id": "batch_second", "result": True},
+        {"action": "add", "id": "batch_first", "result": False},
+        {"action": "set", "id": "batch_second", "result": True},
+        {"action": "set", "id": "batch_second", "result": True},
+        {"action": "set", "id": "batch_missing", "result": False},
+        {"action": "del", "id": "batch_first", "result": True},
+    ]
+
+    clients = list(infrastructure)
+    assert "batch_first" not in {e["id"] for e in clients}
+    assert {
+        "id": "batch_second",
+        "enabled": True,
+        "running": False,
+        "credentials": {"username": "u", "password": "p"}
+    } in clients
+
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert [(e["action"], e["data"]["id"]) for e in notifications[-4:]] == [
+        ("add", "batch_first"),
+        ("add", "batch_second"),
+        ("set", "batch_second"),
+        ("del", "batch_first"),
+    ]
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_batch_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+):
+    uci = get_uci_module(infrastructure.name)
+
+    res = batch(
+        infrastructure,
+        [{"action": "add", "id": f"openwrt_{i}", "config": f"config {i}"} for i in range(5)]
+        + [{"action": "set", "id": "openwrt_0", "enabled": True}],
+    )
+    assert all(e["result"] for e in res["data"]["results"])
+
+    # services are reconciled only once for the whole batch
+    assert not network_restart_was_called([])
+    assert openvpn_init_calls() == ["start openwrt_0"]
+
+    with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
+        data = backend.read()
+
+    assert uci.get_option_named(data, "firewall", "turris_vpn_client", "device") == [
+        f"vpnopenwrt_{i}" for i in range(5)
+    ]
+    for i in range(5):
+        path = pathlib.Path(FILE_ROOT_PATH) / f"etc/openvpn/foris/openwrt_{i}.conf"
+        assert path.read_text() == f"config {i}"
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_restart_coalescing_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+):
+    uci = get_uci_module(infrastructure.name)
+
+    res = add(infrastructure, "coalesced", "config content")
+    assert res["data"]["result"]
+
+    with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
+        backend.set_option("openvpn", "foris_client", "restart_window", "3")
+
+    filters = [("openvpn_client", "restarted")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    # enable in background first and then set credentials (e.g. from GUI)
+    res = infrastructure.process_message(
+        {
+            "module": "openvpn_client", "action": "set", "kind": "request",
+            "data": {"id": "coalesced", "enabled": True, "async": True},
+        }
+    )
+    assert res["data"]["result"]
+    assert openvpn_init_calls() == []
+
+    # synchronous request restarts right away together with the pending one
+    assert set(infrastructure, "coalesced", True, "user", "pass")["data"]["result"]
+    assert openvpn_init_calls() == ["start coalesced"]
+
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["data"]["ids"] == ["coalesced"]
+    assert notifications[-1]["data"]["merged"] == 2
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_default_settings_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+):
+    uci = get_uci_module(infrastructure.name)
+
+    # the fixture config disables the restart window and readiness waits
+    with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
+        backend.del_option("openvpn", "foris_client", "restart_window")
+        backend.del_option("openvpn", "foris_client", "ready_timeout")
+
+    filters = [("openvpn_client", "restarted")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    # neither the window (2 s) nor the tunnel which never comes up (10 s) delay the reply
+    start = time.monotonic()
+    assert add(infrastructure, "defaults", "client\nremote vpn.example.com\n")["data"]["result"]
+    assert set(infrastructure, "defaults", True)["data"]["instance_action"] == "start"
+    assert time.monotonic() - start < 2.0
+    assert openvpn_init_calls() == ["start defaults"]
+
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    steps = notifications[-1]["data"]["steps"]
+    assert [e["name"] for e in steps] == ["openvpn_instances", "resolver_reload"]
+    assert [e["result"] for e in steps] == ["ok", "ok"]
+    assert steps[0]["waited"] == 0.0
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_firewall_update_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+    nft_cmd,
+):
+    # devices of the zone are replaced in a single transaction instead of reloading firewall
+    assert add(infrastructure, "fwtest", "client\nremote vpn.example.com\n")["data"]["result"]
+    assert nft_applied() == [[
+        (10, {"set": ["vpnexisting", "vpnfwtest"]}),
+        (11, {"set": ["vpnexisting", "vpnfwtest"]}),
+    ]]
+
+    # zone is not changed
+    assert set(infrastructure, "fwtest", True)["data"]["result"]
+    assert nft_applied() == []
+
+    assert delete(infrastructure, "fwtest")["data"]["result"]
+    assert nft_applied() == [[(10, "vpnexisting"), (11, "vpnexisting")]]
+
+
+def set_routing(infrastructure, id, **routing):
+    return infrastructure.process_message(
+        {"module": "openvpn_client", "action": "set_routing", "kind": "request", "data": {"id": id, **routing}}
+    )["data"]
+
+
+def get_routing(infrastructure, id):
+    return infrastructure.process_message(
+        {"module": "openvpn_client", "action": "get_routing", "kind": "request", "data": {"id": id}}
+    )["data"]
+
+
+def test_routing(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+    nft_cmd,
+    ip_cmd,
+):
+    filters = [("openvpn_client", "set_routing")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    assert set_routing(infrastructure, "routed", prefixes=["10.0.0.0/8"]) == {"result": False}
+    assert get_routing(infrastructure, "routed") == {"result": False}
+
+    assert add(infrastructure, "routed", "client\nremote vpn.example.com\n")["data"]["result"]
+    assert get_routing(infrastructure, "routed") == {"result": True, "routing": {
+        "id": "routed", "prefixes": [], "sources": [], "domains": [], "compiled": {"prefixes": 0, "sources": 0},
+    }}
+
+    assert set_routing(infrastructure, "routed", prefixes=["10.0.0.300/8"]) == {"result": False}
+    assert set_routing(infrastructure, "routed", domains=["-invalid.com"]) == {"result": False}
+
+    prefixes = ["10.0.0.0/8", "10.1.0.0/16", "192.168.10.0/25", "192.168.10.128/25", "2001:db8::/32"]
+    res = set_routing(
+        infrastructure, "routed", prefixes=prefixes, sources=["192.168.1.10"], domains=["example.com"]
+    )
+    assert res == {"result": True}
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["data"] == {"id": "routed"}
+
+    assert get_routing(infrastructure, "routed") == {"result": True, "routing": {
+        "id": "routed", "prefixes": prefixes, "sources": ["192.168.1.10"], "domains": ["example.com"],
+        # covered and adjacent prefixes are merged
+        "compiled": {"prefixes": 3, "sources": 1},
+    }}
+
+    # empty lists turn policy routing off
+    assert set_routing(infrastructure, "routed") == {"result": True}
+    assert get_routing(infrastructure, "routed")["routing"]["compiled"] == {"prefixes": 0, "sources": 0}
+
+    assert delete(infrastructure, "routed")["data"]["result"]
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_routing_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+    nft_cmd,
+    ip_cmd,
+):
+    uci = get_uci_module(infrastructure.name)
+    nft_path = pathlib.Path(FILE_ROOT_PATH) / "usr/share/nftables.d/ruleset-post/50-openvpn-client.nft"
+
+    assert add(infrastructure, "routed", "client\nremote vpn.example.com\n")["data"]["result"]
+    res = set_routing(
+        infrastructure, "routed",
+        prefixes=["10.0.0.0/8", "10.1.0.0/16", "192.168.10.0/25", "192.168.10.128/25"],
+        sources=["192.168.1.10"],
+        domains=["example.com"],
+    )
+    assert res == {"result": True}
+
+    with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
+        data = backend.read()
+    assert uci.get_option_named(data, "openvpn", "routed", "_route_slot") == "0"
+    assert uci.get_option_named(data, "network", "openvpn_client_routed", "mark") == "0x10000/0xff0000"
+    assert uci.get_option_named(data, "network", "openvpn_client_routed", "lookup") == "200"
+    assert uci.get_option_named(data, "network", "openvpn_client_routed_6", "lookup") == "200"
+    assert uci.get_option_named(data, "dhcp", "openvpn_client_routed", "domain") == ["example.com"]
+    assert uci.get_option_named(data, "dhcp", "openvpn_client_routed", "name") == ["dns4_0"]
+
+    # the client is disabled -> nothing is marked
+    assert "set dst4_0" not in nft_path.read_text()
+
+    ip_calls()
+    assert set(infrastructure, "routed", True)["data"]["result"]
+    content = nft_path.read_text()
+    assert "elements = { 10.0.0.0/8, 192.168.10.0/24 }" in content
+    assert "ip saddr @src4_0 ip daddr != @local4 fib daddr type != local meta mark set" in content
+    assert "set dns4_0 {" in content
+    assert "route replace blackhole default table 200 metric 65535" in ip_calls()
+
+    assert delete(infrastructure, "routed")["data"]["result"]
+    assert "dst4_0" not in nft_path.read_text()
+    assert "route flush table 200" in ip_calls()
+    with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
+        data = backend.read()
+    assert uci.get_option_named(data, "network", "openvpn_client_routed", "mark", "") == ""
+    assert uci.get_option_named(data, "dhcp", "openvpn_client_routed", "domain", "") == ""
+
+
+def group_request(infrastructure, action, data=None):
+    message = {"module": "openvpn_client", "action": action, "kind": "request"}
+    if data is not None:
+        message["data"] = data
+    return infrastructure.process_message(message)["data"]
+
+
+def test_groups(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+    ip_cmd,
+):
+    filters = [("openvpn_client", "add_group"), ("openvpn_client", "set_group"), ("openvpn_client", "del_group")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    for id in ("exit1", "exit2", "exit3"):
+        assert add(infrastructure, id, "client\nremote vpn.example.com\n")["data"]["result"]
+
+    # members have to exist
+    group = {"id": "exits", "members": [{"id": "exit1"}, {"id": "missing"}]}
+    assert group_request(infrastructure, "add_group", group) == {"result": False}
+
+    group = {"id": "exits", "members": [{"id": "exit1"}, {"id": "exit2", "weight": 2}], "probe": "192.0.2.1:443"}
+    assert group_request(infrastructure, "add_group", group) == {"result": True}
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["action"] == "add_group"
+    assert notifications[-1]["data"] == {"id": "exits"}
+
+    # already exists / client can't be a member of several groups / names are shared with clients
+    assert group_request(infrastructure, "add_group", group) == {"result": False}
+    assert group_request(infrastructure, "add_group", {**group, "id": "other"}) == {"result": False}
+    assert group_request(infrastructure, "add_group", {**group, "id": "exit3"}) == {"result": False}
+    assert group_request(infrastructure, "set_group", {**group, "id": "missing"}) == {"result": False}
+
+    assert group_request(infrastructure, "list_groups") == {"groups": [{
+        "id": "exits", "mode": "failover", "members": [{"id": "exit1", "weight": 1}, {"id": "exit2", "weight": 2}],
+        "probe": "192.0.2.1:443", "max_latency": 0, "interface": "lan",
+    }]}
+
+    group = {"id": "exits", "mode": "balance", "members": [{"id": "exit2", "weight": 2}, {"id": "exit3"}]}
+    assert group_request(infrastructure, "set_group", group) == {"result": True}
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["action"] == "set_group"
+
+    status = group_request(infrastructure, "get_group_status", {"id": "exits"})["groups"]
+    assert [e["id"] for e in status] == ["exits"]
+    assert status[0]["mode"] == "balance"
+    # none of the members is running
+    assert [(e["id"], e["running"], e["healthy"]) for e in status[0]["members"]] == [
+        ("exit2", False, False), ("exit3", False, False),
+    ]
+    assert status[0]["active"] == []
+
+    # deleted client is removed from the group
+    assert delete(infrastructure, "exit3")["data"]["result"]
+    assert group_request(infrastructure, "list_groups")["groups"][0]["members"] == [{"id": "exit2", "weight": 2}]
+
+    assert group_request(infrastructure, "del_group", {"id": "exits"}) == {"result": True}
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["action"] == "del_group"
+    assert group_request(infrastructure, "del_group", {"id": "exits"}) == {"result": False}
+    assert group_request(infrastructure, "list_groups") == {"groups": []}
+    assert group_request(infrastructure, "get_group_status", {}) == {"groups": []}
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_groups_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+    ip_cmd,
+):
+    uci = get_uci_module(infrastructure.name)
+
+    for id in ("exit1", "exit2"):
+        assert add(infrastructure, id, "client\nremote vpn.example.com\n")["data"]["result"]
+    group = {"id": "exits", "mode": "balance", "members": [{"id": "exit1", "weight": 3}, {"id": "exit2"}]}
+    assert group_request(infrastructure, "add_group", group) == {"result": True}
+
+    with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
+        data = backend.read()
+    assert uci.get_option_named(data, "openvpn", "exits", "mode") == "balance"
+    assert uci.get_option_named(data, "openvpn", "exits", "member") == ["exit1:3", "exit2"]
+    # default routes of the main table are skipped, the rest of the traffic from lan uses the group table
+    assert uci.get_option_named(data, "network", "openvpn_group_exits_main", "lookup") == "main"
+    assert uci.get_option_named(data, "network", "openvpn_group_exits_main", "suppress_prefixlength") == "1"
+    assert uci.get_option_named(data, "network", "openvpn_group_exits_main", "priority") == "6000"
+    assert uci.get_option_named(data, "network", "openvpn_group_exits", "lookup") == "450"
+    assert uci.get_option_named(data, "network", "openvpn_group_exits", "priority") == "6001"
+    assert uci.get_option_named(data, "network", "openvpn_group_exits_6", "in") == "lan"
+    assert network_restart_was_called([])
+
+    # group without healthy members drops its traffic
+    for _ in range(50):
+        calls = ip_calls()
+        if "-4 route replace blackhole default table 450 metric 65535" in calls:
+            break
+        time.sleep(0.1)
+    else:
+        assert False, "routes of the group were not set"
+
+    assert group_request(infrastructure, "del_group", {"id": "exits"}) == {"result": True}
+    with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
+        data = backend.read()
+    assert uci.get_option_named(data, "openvpn", "exits", "mode", "") == ""
+    assert uci.get_option_named(data, "network", "openvpn_group_exits", "lookup", "") == ""
+    assert "-4 route flush table 450" in ip_calls()
+
+
+def job_status(infrastructure, job_id):
+    return infrastructure.process_message(
+        {
+            "module": "openvpn_client",
+            "action": "job_status",
+            "kind": "request",
+            "data": {"job_id": job_id},
+        }
+    )["data"]
+
+
+def test_async(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+):
+    filters = [("openvpn_client", "job_finished")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    res = infrastructure.process_message(
+        {
+            "module": "openvpn_client",
+            "action": "add",
+            "kind": "request",
+            "data": {"id": "async_first", "config": "config content", "async": True},
+        }
+    )
+    assert res["data"]["result"] is True
+    job_id = res["data"]["job_id"]
+
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["data"]["job_id"] == job_id
+    assert notifications[-1]["data"]["status"] == "succeeded"
+    assert job_status(infrastructure, job_id)["status"] == "succeeded"
+
+    # failed operation is reported in the reply, the job has nothing to do
+    res = infrastructure.process_message(
+        {
+            "module": "openvpn_client",
+            "action": "set",
+            "kind": "request",
+            "data": {"id": "async_missing", "enabled": True, "async": True},
+        }
+    )
+    assert res["data"]["result"] is False
+    assert "instance_action" not in res["data"]
+    assert job_status(infrastructure, res["data"]["job_id"])["status"] == "succeeded"
+
+    # action is known before the restart is performed
+    res = infrastructure.process_message(
+        {
+            "module": "openvpn_client",
+            "action": "set",
+            "kind": "request",
+            "data": {"id": "async_first", "enabled": True, "async": True},
+        }
+    )
+    assert res["data"]["result"] is True
+    assert res["data"]["instance_action"] == "start"
+
+    batch_async = infrastructure.process_message(
+        {
+            "module": "openvpn_client",
+            "action": "batch",
+            "kind": "request",
+            "data": {"operations": [{"action": "del", "id": "async_first"}], "async": True},
+        }
+    )
+    assert batch_async["data"]["results"] == [{"action": "del", "id": "async_first", "result": True}]
+    assert "job_id" in batch_async["data"]
+
+    assert job_status(infrastructure, "0" * 32) == {"job_id": "0" * 32, "status": "unknown"}
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_async_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+):
+    assert add(infrastructure, "async_openwrt", "config content")["data"]["result"]
+    openvpn_init_calls()
+
+    filters = [("openvpn_client", "job_finished")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    res = infrastructure.process_message(
+        {
+            "module": "openvpn_client",
+            "action": "set",
+            "kind": "request",
+            "data": {"id": "async_openwrt", "enabled": True, "async": True},
+        }
+    )
+    assert res["data"]["result"] is True
+
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    report = notifications[-1]["data"]["report"]
+    assert notifications[-1]["data"] == {
+        "job_id": res["data"]["job_id"],
+        "status": "succeeded",
+        "report": {"ids": ["async_openwrt"], "merged": 1, "waited": report["waited"], "steps": report["steps"]},
+    }
+    assert [e["name"] for e in report["steps"]] == ["openvpn_instances", "resolver_reload"]
+    # tunnel device never appears in tests
+    assert [e["result"] for e in report["steps"]] == ["timeout", "ok"]
+    # restart was performed in background
+    assert openvpn_init_calls() == ["start async_openwrt"]
+
+
+def upload(infrastructure, action, data):
+    return infrastructure.process_message(
+        {"module": "openvpn_client", "action": action, "kind": "request", "data": data}
+    )["data"]
+
+
+def upload_config(infrastructure, id, content, chunk_size=5, sha256=None):
+    res = upload(infrastructure, "upload_begin", {"id": id})
+    assert res["result"]
+    upload_id = res["upload_id"]
+
+    for offset in range(0, len(content), chunk_size):
+        chunk = base64.b64encode(content[offset:offset + chunk_size]).decode()
+        res = upload(infrastructure, "upload_chunk", {"upload_id": upload_id, "offset": offset, "data": chunk})
+        assert res == {"result": True, "received": min(offset + chunk_size, len(content))}
+
+    data = {"upload_id": upload_id}
+    if sha256 is not None:
+        data["sha256"] = sha256
+    return upload_id, upload(infrastructure, "upload_commit", data)
+
+
+def test_upload(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+):
+    filters = [("openvpn_client", "add")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    content = b"client\nremote vpn.example.com 1194\n<ca>\n" + b"A" * 64 + b"\n</ca>\n"
+    _, res = upload_config(infrastructure, "uploaded-first", content, sha256=hashlib.sha256(content).hexdigest())
+    assert res == {"result": True, "id": "uploaded_first"}
+    assert "uploaded_first" in {e["id"] for e in list(infrastructure)}
+
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["data"] == {"id": "uploaded_first"}
+
+    # existing client
+    _, res = upload_config(infrastructure, "uploaded_first", content)
+    assert res == {"result": False}
+
+    # corrupted content
+    _, res = upload_config(infrastructure, "uploaded_second", content, sha256="0" * 64)
+    assert res == {"result": False}
+    assert "uploaded_second" not in {e["id"] for e in list(infrastructure)}
+
+    # chunk out of order is not stored
+    upload_id = upload(infrastructure, "upload_begin", {"id": "uploaded_third"})["upload_id"]
+    res = upload(infrastructure, "upload_chunk", {"upload_id": upload_id, "offset": 3, "data": "YWJj"})
+    assert res == {"result": False, "received": 0}
+
+    # unknown upload
+    res = upload(infrastructure, "upload_commit", {"upload_id": "0" * 32})
+    assert res == {"result": False}
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_upload_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+):
+    uci = get_uci_module(infrastructure.name)
+
+    content = b"client\n" + b"# padding\n" * 1000
+    _, res = upload_config(infrastructure, "uploaded_openwrt", content, chunk_size=4096)
+    assert res["result"]
+
+    config_dir = pathlib.Path(FILE_ROOT_PATH) / "etc/openvpn/foris"
+    assert (config_dir / "uploaded_openwrt.conf").read_bytes() == content
+    # temporary files are moved or removed
+    assert not [e for e in config_dir.iterdir() if e.name.startswith(".upload_")]
+
+    _, res = upload_config(infrastructure, "uploaded_openwrt", content, chunk_size=4096)
+    assert not res["result"]
+    assert not [e for e in config_dir.iterdir() if e.name.startswith(".upload_")]
+
+    with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
+        data = backend.read()
+    assert (
+        uci.get_option_named(data, "openvpn", "uploaded_openwrt", "config")
+        == "/etc/openvpn/foris/uploaded_openwrt.conf"
+    )
+
+
+def update_config(infrastructure, id, config):
+    return infrastructure.process_message(
+        {
+            "module": "openvpn_client",
+            "action": "update_config",
+            "kind": "request",
+            "data": {"id": id, "config": config},
+        }
+    )["data"]
+
+
+def test_update_config(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+):
+    filters = [("openvpn_client", "update_config")]
+    notifications = infrastructure.get_notifications(filters=filters)
+
+    assert add(infrastructure, "updated", "client\n")["data"]["result"]
+    assert update_config(infrastructure, "updated", "client\n") == {"result": True, "changed": False}
+    assert update_config(infrastructure, "updated", "client\nnobind\n") == {"result": True, "changed": True}
+    assert update_config(infrastructure, "updated_missing", "client\n") == {"result": False}
+
+    notifications = infrastructure.get_notifications(notifications, filters=filters)
+    assert notifications[-1]["data"] == {"id": "updated"}
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_update_config_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+):
+    ca = "-----BEGIN CERTIFICATE-----\nMIIB\n-----END CERTIFICATE-----\n"
+    digest = hashlib.sha256(ca.encode()).hexdigest()
+    config_dir = pathlib.Path(FILE_ROOT_PATH) / "etc/openvpn/foris"
+    block = config_dir / "blocks" / f"{digest}.pem"
+
+    def profile(remote):
+        return f"client\nremote {remote} 1194\n<ca>\n{ca}</ca>\n"
+
+    # both profiles share the same CA block
+    assert add(infrastructure, "shared_first", profile("first.example.com"))["data"]["result"]
+    assert add(infrastructure, "shared_second", profile("second.example.com"))["data"]["result"]
+    assert block.read_text() == ca
+    assert (config_dir / "shared_first.conf").read_text() == \
+        f"client\nremote first.example.com 1194\nca /etc/openvpn/foris/blocks/{digest}.pem\n"
+    assert set(infrastructure, "shared_first", True)["data"]["result"]
+    openvpn_init_calls()
+
+    # same content -> nothing is written or restarted
+    mtime = (config_dir / "shared_first.conf").stat().st_mtime_ns
+    res = update_config(infrastructure, "shared_first", profile("first.example.com"))
+    assert res == {"result": True, "changed": False}
+    assert (config_dir / "shared_first.conf").stat().st_mtime_ns == mtime
+    assert openvpn_init_calls() == []
+
+    # enabled client is restarted with the new config
+    res = update_config(infrastructure, "shared_first", profile("other.example.com"))
+    assert res == {"result": True, "changed": True}
+    assert "remote other.example.com 1194" in (config_dir / "shared_first.conf").read_text()
+    assert openvpn_init_calls() == ["restart shared_first"]
+
+    # block is removed with the last profile which uses it
+    assert delete(infrastructure, "shared_first")["data"]["result"]
+    assert block.exists()
+    assert delete(infrastructure, "shared_second")["data"]["result"]
+    assert not block.exists()
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_config_validation_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+    openvpn_init_cmd,
+):
+    # server config would fail to start as a client
+    assert not add(infrastructure, "invalid", "mode server\nserver 10.8.0.0 255.255.255.0\n")["data"]["result"]
+    assert not add(infrastructure, "invalid", "client\n<ca>\nCA\n")["data"]["result"]
+    assert "invalid" not in {e["id"] for e in list(infrastructure)}
+    assert not (pathlib.Path(FILE_ROOT_PATH) / "etc/openvpn/foris/invalid.conf").exists()
+
+    config = "client\ndev tun\nproto tcp\nremote vpn.example.com 443\n"
+    assert add(infrastructure, "parsed", config)["data"]["result"]
+    assert update_config(infrastructure, "parsed", "client\n</ca>\n") == {"result": False}
+
+    res = infrastructure.process_message(
+        {"module": "openvpn_client", "action": "list", "kind": "request", "data": {"fields": ["id", "config"]}}
+    )
+    client = [e for e in res["data"]["clients"] if e["id"] == "parsed"][0]
+    assert client["config"] == {
+        "remotes": [{"host": "vpn.example.com", "port": 443, "proto": "tcp"}],
+        "warnings": ["'dev tun' conflicts with interface 'vpnparsed' managed by foris"],
+    }
+    # metadata are returned only when requested
+    assert "config" not in [e for e in list(infrastructure) if e["id"] == "parsed"][0]
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_list_cache_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+):
+    uci = get_uci_module(infrastructure.name)
+
+    def cache_stats():
+        return infrastructure.process_message(
+            {"module": "openvpn_client", "action": "get_cache_stats", "kind": "request"}
+        )["data"]
+
+    list(infrastructure)
+    stats = cache_stats()
+
+    # nothing changed -> parsed config is reused
+    list(infrastructure)
+    new_stats = cache_stats()
+    assert new_stats["config_hits"] == stats["config_hits"] + 1
+    assert new_stats["config_misses"] == stats["config_misses"]
+
+    # own change
+    assert add(infrastructure, "cached", "config content")["data"]["result"]
+    stats = new_stats
+    assert {"id": "cached", "enabled": False, "running": False, "credentials": {"username": "", "password": ""}} \
+        in list(infrastructure)
+    new_stats = cache_stats()
+    assert new_stats["config_misses"] == stats["config_misses"] + 1
+
+    # change made outside of the controller
+    with uci.UciBackend(UCI_CONFIG_DIR_PATH) as backend:
+        backend.set_option("openvpn", "cached", "enabled", uci.store_bool(True))
+    stats = new_stats
+    assert {"id": "cached", "enabled": True, "running": False, "credentials": {"username": "", "password": ""}} \
+        in list(infrastructure)
+    new_stats = cache_stats()
+    assert new_stats["config_misses"] == stats["config_misses"] + 1
+
+
+def get_status(infrastructure, id=None):
+    return infrastructure.process_message(
+        {
+            "module": "openvpn_client",
+            "action": "get_status",
+            "kind": "request",
+            "data": {} if id is None else {"id": id},
+        }
+    )["data"]["clients"]
+
+
+def test_get_status(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+):
+    assert add(infrastructure, "status_first", "client\nremote vpn.example.com 1195\n")["data"]["result"]
+    assert add(infrastructure, "status_second", "client\n")["data"]["result"]
+
+    res = get_status(infrastructure)
+    assert {"status_first", "status_second"} <= {e["id"] for e in res}
+
+    res = get_status(infrastructure, "status_second")
+    assert [e["id"] for e in res] == ["status_second"]
+    assert res[0]["available"] is False
+
+
+def test_get_probe_stats(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+):
+    assert add(infrastructure, "probed", "client\nremote vpn.example.com\n")["data"]["result"]
+
+    res = infrastructure.process_message(
+        {"module": "openvpn_client", "action": "get_probe_stats", "kind": "request", "data": {}}
+    )["data"]["clients"]
+    assert "probed" in {e["id"] for e in res}
+
+    res = infrastructure.process_message(
+        {"module": "openvpn_client", "action": "get_probe_stats", "kind": "request", "data": {"id": "probed"}}
+    )["data"]["clients"]
+    # disabled client is not probed
+    assert res == [{"id": "probed", "available": False}]
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_get_status_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    ubus_service_list_cmd,
+):
+    config = "client\nproto tcp\n# remote commented.example.com\nremote vpn.example.com 1195\n"
+    assert add(infrastructure, "openwrt_status", config)["data"]["result"]
+
+    res = get_status(infrastructure, "openwrt_status")
+    assert res == [
+        {
+            "id": "openwrt_status",
+            "available": False,
+            "remote": {"host": "vpn.example.com", "port": 1195, "proto": "tcp"},
+        }
+    ]
+
+    status_content = """\
+OpenVPN STATISTICS
+Updated,2024-01-01 12:00:00
+TUN/TAP read bytes,900
+TUN/TAP write bytes,1800
+TCP/UDP read bytes,{}
+TCP/UDP write bytes,{}
+Auth read bytes,1800
+END
+"""
+    path = pathlib.Path(FILE_ROOT_PATH) / "var/run/openvpn.openwrt_status.status"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(status_content.format(1000, 2000))
+
+    res = get_status(infrastructure, "openwrt_status")[0]
+    assert res["available"] is True
+    assert res["bytes_in"] == 1000
+    assert res["bytes_out"] == 2000
+    assert "rate_in" not in res
+
+    path.write_text(status_content.format(2000, 4000).replace("12:00:00", "12:00:10"))
+    res = get_status(infrastructure, "openwrt_status")[0]
+    assert res["bytes_in"] == 2000
+    assert res["bytes_out"] == 4000
+    assert res["rate_in"] == 100.0
+    assert res["rate_out"] == 200.0
+    assert res["connected_since"] == res["updated"] - 10
+
+    # status which can't be read is reported as not available
+    path.unlink()
+    path.mkdir()
+    res = get_status(infrastructure, "openwrt_status")[0]
+    assert res["available"] is False
+    assert "bytes_in" not in res
+
+    path.rmdir()
+
+
+def get_metrics(infrastructure, format=None):
+    return infrastructure.process_message(
+        {
+            "module": "openvpn_client",
+            "action": "get_metrics",
+            "kind": "request",
+            "data": {} if format is None else {"format": format},
+        }
+    )["data"]
+
+
+def test_get_metrics(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    openvpn_init_cmd,
+):
+    res = get_metrics(infrastructure)
+    assert res["format"] == "json"
+    assert set(res["cache"]) == {"config_hits", "config_misses", "running_hits", "running_misses"}
+
+    res = get_metrics(infrastructure, "prometheus")
+    assert res["format"] == "prometheus"
+    assert isinstance(res["text"], str)
+
+
+@pytest.mark.only_backends(["openwrt"])
+def test_get_metrics_openwrt(
+    uci_configs_init,
+    init_script_result,
+    infrastructure,
+    network_restart_command,
+    openvpn_init_cmd,
+):
+    def counts():
+        return {e["name"]: e["count"] for e in get_metrics(infrastructure)["spans"]}
+
+    before = counts()
+    assert add(infrastructure, "metrics_first", "config content")["data"]["result"]
+    assert set(infrastructure, "metrics_first", True)["data"]["result"]
+    after = counts()
+
+    def increment(name):
+        return after.get(name, 0) - before.get(name, 0)
+
+    assert increment("action_add") == 1
+    assert increment("action_set") == 1
+    assert increment("uci_session") == 2
+    assert increment("uci_read") == 2
+    assert increment("uci_write") == 2
+    assert increment("file_store") == 1
+    assert increment("openvpn_start") == 1
+    # interface added -> devices of the firewall zone are updated, network is not restarted
+    assert increment("network_restart") == 0
+    assert increment("firewall_reload") == 1
+
+    text = get_metrics(infrastructure, "prometheus")["text"]
+    assert '# TYPE foris_openvpn_client_stage_duration_seconds histogram' in text
+    assert 'foris_openvpn_client_stage_duration_seconds_count{stage="action_add"}' in text
+    assert 'foris_openvpn_client_cache_lookups_total{cache="config",result="hit"}' in text
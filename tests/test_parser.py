@@ -0,0 +1,102 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import hashlib
+
+from foris_controller_backends.openvpn_client.parser import (
+    ParserCache,
+    Remote,
+    parse_config,
+    split_line,
+)
+
+
+def test_split_line():
+    assert split_line("remote vpn.example.com 1194 udp") == ["remote", "vpn.example.com", "1194", "udp"]
+    assert split_line('auth-user-pass "/etc/my pass"  # comment') == ["auth-user-pass", "/etc/my pass"]
+    assert split_line("verify-x509-name 'C=CZ, CN=vpn' name") == ["verify-x509-name", "C=CZ, CN=vpn", "name"]
+    assert split_line(r"setenv NAME a\ b") == ["setenv", "NAME", "a b"]
+    assert split_line("; remote disabled.example.com") == []
+    assert split_line('push ""') == ["push", ""]
+
+
+def test_parse_config():
+    parsed = parse_config(
+        "client\n"
+        "dev tun\n"
+        "proto tcp\n"
+        "remote first.example.com\n"
+        "--remote second.example.com 443 udp\n"
+        "<connection>\n"
+        "remote third.example.com 1195\n"
+        "</connection>\n"
+        "status /tmp/status.log\n"
+        "<ca>\n"
+        "CA\n"
+        "</ca>\n"
+    )
+    assert parsed.errors == []
+    assert parsed.remotes == [
+        Remote("first.example.com", 1194, "tcp"),
+        Remote("second.example.com", 443, "udp"),
+        Remote("third.example.com", 1195, "tcp"),
+    ]
+    assert parsed.blocks["ca"] == "CA\n"
+    assert parsed.warnings == ["line 9: 'status' is overridden"]
+    assert parsed.conflicts("vpnfirst") == ["'dev tun' conflicts with interface 'vpnfirst' managed by foris"]
+    assert parsed.metadata("vpnfirst")["remotes"][0] == {"host": "first.example.com", "port": 1194, "proto": "tcp"}
+
+
+def test_parse_config_errors():
+    parsed = parse_config("mode server\nserver 10.8.0.0 255.255.255.0\n</ca>\n<cert>\nCERT\n")
+    assert parsed.errors == [
+        "line 1: 'mode' is not supported in client config",
+        "line 2: 'server' is not supported in client config",
+        "line 3: unexpected '</ca>'",
+        "line 4: <cert> is not terminated",
+    ]
+    assert parsed.warnings == ["'client' directive is missing", "no 'remote' is specified"]
+
+
+def test_parser_cache():
+    cache = ParserCache(size=2)
+    first = cache.parse("client\nremote first.example.com\n")
+    assert cache.parse("client\nremote first.example.com\n") is first
+    cache.parse("client\nremote second.example.com\n")
+    cache.parse("client\nremote third.example.com\n")
+    # the least recently used one is dropped
+    assert cache.parse("client\nremote first.example.com\n") is not first
+
+
+def test_parse_file(tmp_path):
+    content = "client\r\nremote first.example.com 443\r\n<ca>\r\nCA\r\n</ca>\r\n"
+    path = tmp_path / "client.conf"
+    path.write_bytes(content.encode())
+
+    cache = ParserCache()
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    parsed = cache.parse_file(str(path), digest)
+    assert parsed.errors == []
+    assert parsed.remotes == [Remote("first.example.com", 443, "udp")]
+    assert parsed.blocks["ca"] == "CA\n"
+
+    # the same content is not parsed again
+    assert cache.parse(content) is parsed
+    path.unlink()
+    assert cache.parse_file(str(path), digest) is parsed
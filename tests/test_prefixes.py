@@ -0,0 +1,66 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import ipaddress
+import random
+
+import pytest
+
+from foris_controller_backends.openvpn_client.prefixes import PrefixTrie, compile_prefixes
+
+
+def test_compile_prefixes():
+    ipv4, ipv6 = compile_prefixes([
+        "10.0.0.0/8", "10.1.0.0/16", "10.1.2.3",  # covered by 10.0.0.0/8
+        "192.168.0.0/25", "192.168.0.128/25",  # merged into /24
+        "192.168.1.7/24",  # host bits are ignored
+        "2001:db8::/33", "2001:db8:8000::/33", "2001:db8::1",
+    ])
+    assert [str(e) for e in ipv4] == ["10.0.0.0/8", "192.168.0.0/23"]
+    assert [str(e) for e in ipv6] == ["2001:db8::/32"]
+
+    assert compile_prefixes([]) == ([], [])
+    assert [str(e) for e in compile_prefixes(["0.0.0.0/0", "1.2.3.4"])[0]] == ["0.0.0.0/0"]
+
+    with pytest.raises(ValueError):
+        compile_prefixes(["10.0.0.300/8"])
+
+
+def test_trie_matches_collapse_addresses():
+    rnd = random.Random(42)
+    networks = [
+        ipaddress.IPv4Network((rnd.getrandbits(32), length), strict=False)
+        for length in (rnd.randint(8, 32) for _ in range(3000))
+    ]
+    # plenty of adjacent prefixes to merge
+    networks += list(ipaddress.IPv4Network("172.16.0.0/16").subnets(new_prefix=24))
+
+    trie = PrefixTrie(4)
+    for network in networks:
+        trie.add(network)
+    assert trie.prefixes() == list(ipaddress.collapse_addresses(networks))
+
+    for network in networks[:100]:
+        assert network.network_address in trie
+    assert ipaddress.IPv4Address("172.16.200.1") in trie
+
+
+def test_trie_family():
+    with pytest.raises(ValueError):
+        PrefixTrie(4).add(ipaddress.ip_network("2001:db8::/32"))
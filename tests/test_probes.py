@@ -0,0 +1,187 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+
+import asyncio
+import math
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from foris_controller_backends.openvpn_client import probes
+from foris_controller_backends.openvpn_client.probes import (
+    ProbeEngine,
+    ProbeTarget,
+    RttHistory,
+    icmp_socket,
+    measure,
+    parse_probe_spec,
+)
+
+# tunnel devices are replaced by loopback (binding to a device requires root)
+DEV = "lo" if os.geteuid() == 0 else None
+
+
+@pytest.fixture
+def tcp_server():
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        yield server.getsockname()[1]
+
+
+@pytest.fixture
+def udp_server():
+    """ replies with the received datagram """
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    server.settimeout(0.1)
+    stop = threading.Event()
+
+    def serve():
+        while not stop.is_set():
+            try:
+                data, address = server.recvfrom(512)
+            except socket.timeout:
+                continue
+            server.sendto(data, address)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield server.getsockname()[1]
+    stop.set()
+    thread.join()
+    server.close()
+
+
+def test_history():
+    history = RttHistory(4)
+    assert history.stats() == {"samples": 0, "lost": 0, "loss": 0.0}
+
+    for rtt in [0.010, None, 0.030, 0.020]:
+        history.add(rtt)
+    assert history.stats() == {
+        "samples": 4, "lost": 1, "loss": 0.25, "rtt_p50": 20.0, "rtt_p95": 30.0, "rtt_last": 20.0,
+    }
+
+    # the oldest samples are overwritten
+    for rtt in [0.001, 0.002, 0.003]:
+        history.add(rtt)
+    assert history.stats() == {
+        "samples": 4, "lost": 0, "loss": 0.0, "rtt_p50": 2.0, "rtt_p95": 20.0, "rtt_last": 3.0,
+    }
+    history.add(None)
+    assert "rtt_last" not in history.stats()
+
+    history.clear()
+    assert history.stats() == {"samples": 0, "lost": 0, "loss": 0.0}
+
+
+def test_history_percentiles():
+    history = RttHistory(100)
+    for i in range(100):
+        history.add((i + 1) / 1000)
+    stats = history.stats()
+    assert (stats["rtt_p50"], stats["rtt_p95"]) == (50.0, 95.0)
+    assert math.isclose(stats["rtt_last"], 100.0)
+
+
+def test_parse_probe_spec():
+    assert parse_probe_spec("tcp:192.0.2.1:443") == ("tcp", "192.0.2.1", 443)
+    assert parse_probe_spec("udp:[2001:db8::1]:53") == ("udp", "2001:db8::1", 53)
+    assert parse_probe_spec("icmp:192.0.2.1") == ("icmp", "192.0.2.1", 0)
+    for value in ["", "tcp:192.0.2.1", "icmp:example.com", "http:192.0.2.1:80", "udp:192.0.2.1:0"]:
+        assert parse_probe_spec(value) is None
+    assert ProbeTarget("udp", "2001:db8::1", 53).spec == "udp:[2001:db8::1]:53"
+
+
+def test_tcp(tcp_server):
+    assert asyncio.run(measure(ProbeTarget("tcp", "127.0.0.1", tcp_server, dev=DEV))) < 1.0
+
+
+def test_tcp_refused():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    # reset is a reply as well
+    assert asyncio.run(measure(ProbeTarget("tcp", "127.0.0.1", port, dev=DEV))) is not None
+
+
+def test_udp(udp_server):
+    assert asyncio.run(measure(ProbeTarget("udp", "127.0.0.1", udp_server, dev=DEV))) < 1.0
+
+
+def test_resolution_not_measured(tcp_server, monkeypatch):
+    resolve = probes.resolve
+
+    async def slow_resolve(target):
+        await asyncio.sleep(0.3)
+        return await resolve(target)
+
+    monkeypatch.setattr(probes, "resolve", slow_resolve)
+    assert asyncio.run(measure(ProbeTarget("tcp", "127.0.0.1", tcp_server, dev=DEV))) < 0.3
+
+
+def test_lost():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as silent:
+        silent.bind(("127.0.0.1", 0))
+        port = silent.getsockname()[1]
+        target = ProbeTarget("udp", "127.0.0.1", port, dev=DEV, timeout=0.1)
+        assert asyncio.run(measure(target)) is None
+    assert asyncio.run(measure(ProbeTarget("tcp", "127.0.0.1", 1, dev="nonexistent0"))) is None
+
+
+def test_icmp():
+    target = ProbeTarget("icmp", "127.0.0.1", dev=DEV)
+    try:
+        icmp_socket(target)[0].close()
+    except PermissionError:
+        pytest.skip("ICMP sockets are not permitted")
+    assert asyncio.run(measure(target)) < 1.0
+
+
+def test_engine(tcp_server, udp_server):
+    targets = {
+        "first": ProbeTarget("tcp", "127.0.0.1", tcp_server, interval=0.01, dev=DEV),
+        "second": ProbeTarget("udp", "127.0.0.1", udp_server, interval=0.01, dev=DEV),
+    }
+    engine = ProbeEngine(lambda: targets, history_size=5)
+    engine.start()
+
+    def wait(condition):
+        deadline = time.monotonic() + 5
+        while not condition(engine.stats()):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    # probes run concurrently and the history has a fixed size
+    wait(lambda stats: len(stats) == 2 and all(e["samples"] == 5 for e in stats.values()))
+    stats = engine.stats()
+    assert stats["first"]["target"] == f"tcp:127.0.0.1:{tcp_server}"
+    assert stats["second"]["lost"] == 0
+    assert stats["second"]["rtt_p95"] >= stats["second"]["rtt_p50"]
+
+    # removed targets are forgotten, changed ones start over
+    targets = {"second": targets["second"]._replace(interval=0.02)}
+    engine.load = lambda: targets
+    engine.wake()
+    wait(lambda stats: list(stats) == ["second"] and stats["second"]["interval"] == 0.02)
@@ -0,0 +1,68 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+
+from foris_controller_backends.openvpn_client.routing import RouteTarget, mark, render_nft
+
+
+def test_render_nft():
+    content = render_nft({
+        "second": RouteTarget(1, "tun_second", sources=("192.168.1.10", "192.168.1.11", "fd00::1"), domains=True),
+        "first": RouteTarget(0, "tun_first", prefixes=("10.0.0.0/8", "10.2.0.0/16", "2001:db8::/32")),
+    })
+    lines = content.splitlines()
+    # the previous table is always replaced
+    assert lines[:3] == ["table inet openvpn_client", "delete table inet openvpn_client", "table inet openvpn_client {"]
+    assert "\t\telements = { 10.0.0.0/8 }" in lines
+    assert "\t\telements = { 192.168.1.10/31 }" in lines
+    assert "\t\telements = { fd00::1/128 }" in lines
+    assert "\tset dst4_1 {" not in lines
+    assert "\tset dns4_1 {" in lines
+
+    set_mark = f"meta mark set meta mark and 0xff00ffff or 0x{mark(0):08x}"
+    assert lines.count(f'\t\tip daddr @dst4_0 {set_mark} comment "first"') == 2
+    assert lines.count(f'\t\tip6 daddr @dst6_0 {set_mark} comment "first"') == 2
+    # sources are marked only when forwarded
+    prerouting, output = content.split("\tchain output {")
+    assert "ip saddr @src4_1" in prerouting and "ip saddr @src4_1" not in output
+    assert "ip daddr @dns4_1" in prerouting and "ip daddr @dns4_1" in output
+
+
+def test_render_nft_local_bypass():
+    content = render_nft({"hosts": RouteTarget(0, "tun_hosts", sources=("192.168.1.10", "fd00::1"))})
+    lines = content.splitlines()
+    # other local subnets and the router itself are not routed through the tunnel
+    assert "\tset local4 {" in lines and "\tset local6 {" in lines
+    assert "\t\telements = { 10.0.0.0/8, 169.254.0.0/16, 172.16.0.0/12, 192.168.0.0/16 }" in lines
+    assert "\t\telements = { fc00::/7, fe80::/10 }" in lines
+    set_mark = f"meta mark set meta mark and 0xff00ffff or 0x{mark(0):08x}"
+    assert f'\t\tip saddr @src4_0 ip daddr != @local4 fib daddr type != local {set_mark} comment "hosts"' in lines
+    assert f'\t\tip6 saddr @src6_0 ip6 daddr != @local6 fib daddr type != local {set_mark} comment "hosts"' in lines
+
+    # destinations are marked regardless of the bypass
+    content = render_nft({"dst": RouteTarget(0, "tun_dst", prefixes=("10.0.0.0/8", ))})
+    assert "local4" not in content
+
+
+def test_render_nft_empty():
+    content = render_nft({})
+    assert "set " not in content
+    assert "\t\ttype filter hook prerouting priority mangle; policy accept;" in content
+    assert "\t\ttype route hook output priority mangle; policy accept;" in content
+    assert content.endswith("}\n")
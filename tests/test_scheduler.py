@@ -0,0 +1,74 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+
+import threading
+import time
+
+from foris_controller_backends.openvpn_client import scheduler
+from foris_controller_backends.openvpn_client.reconcile import ClientState
+from foris_controller_backends.openvpn_client.scheduler import DEFAULT_WINDOW, RestartScheduler
+
+
+def state(enabled):
+    return ClientState(enabled, "vpnclient", "/etc/openvpn/foris/client.conf", "", "")
+
+
+def test_inline_merges_pending(monkeypatch):
+    plans = []
+    monkeypatch.setattr(scheduler, "apply_plan", lambda plan, ready_timeout, wait: plans.append((plan, wait)) or [])
+
+    sched = RestartScheduler()
+    # background requests wait for the window
+    first = sched.request({"client": state(False)}, {"client": state(True)}, inline=False)
+    second = sched.request({"client": state(True)}, {"client": state(True)._replace(username="user")}, inline=False)
+    assert not first.done() and not second.done()
+    assert plans == []
+
+    # inline request doesn't wait, pending ones are performed together with it
+    start = time.monotonic()
+    inline = sched.request({"other": state(True)}, {})
+    assert time.monotonic() - start < DEFAULT_WINDOW
+    assert inline.done() and first.done() and second.done()
+
+    # tunnels are not waited for on the inline path
+    assert [wait for _, wait in plans] == [False]
+    assert plans[0][0].start == {"client"}
+    assert plans[0][0].stop == {"other"}
+    assert inline.result()["merged"] == 3
+
+
+def test_background_window(monkeypatch):
+    applied = threading.Event()
+    waits = []
+
+    def apply_plan(plan, ready_timeout, wait):
+        waits.append(wait)
+        applied.set()
+        return []
+
+    monkeypatch.setattr(scheduler, "apply_plan", apply_plan)
+
+    sched = RestartScheduler()
+    sched.configure(0.2, 1.0)
+    future = sched.request({}, {"client": state(True)}, inline=False)
+    assert not applied.is_set()
+    assert future.result(timeout=2)["ids"] == ["client"]
+    assert future.result()["waited"] >= 0.2
+    assert waits == [True]
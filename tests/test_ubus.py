@@ -0,0 +1,134 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import threading
+
+import pytest
+
+import foris_controller_backends.openvpn_client as backend
+from foris_controller_backends.openvpn_client.monitor import InstanceMonitor
+
+
+class FakeUbus:
+    """ Stands in for python ubus bindings """
+
+    def __init__(self, services=None):
+        self.services = services
+        self.connected_to = None
+        self.calls = []
+
+    def get_connected(self):
+        return self.connected_to is not None
+
+    def connect(self, socket_path):
+        self.connected_to = socket_path
+
+    def call(self, obj, method, args):
+        self.calls.append((obj, method, args))
+        if self.services is None:
+            raise RuntimeError("Object 'service' not found")
+        return [self.services]
+
+
+@pytest.fixture
+def ubus_socket(tmp_path, monkeypatch):
+    socket_path = tmp_path / "ubus.sock"
+    socket_path.touch()
+    monkeypatch.setattr(backend.OpenVpnUbus, "SOCKET_PATHS", [str(tmp_path / "missing.sock"), str(socket_path)])
+    monkeypatch.setattr(backend.OpenVpnUbus, "owns_connection", False)
+    return str(socket_path)
+
+
+def test_native_service_list(ubus_socket, monkeypatch):
+    fake = FakeUbus({"openvpn": {"instances": {"first": {"running": True}, "second": {"running": False}}}})
+    monkeypatch.setattr(backend, "ubus", fake)
+
+    ovpn_ubus = backend.OpenVpnUbus()
+    assert ovpn_ubus.openvpn_running_instances() == {"first"}
+    # own connection can be used from background threads as well
+    thread = threading.Thread(target=ovpn_ubus.openvpn_running_instances)
+    thread.start()
+    thread.join()
+
+    # single persistent connection is used
+    assert fake.connected_to == ubus_socket
+    assert fake.calls == [("service", "list", {"name": "openvpn"})] * 2
+
+
+def test_shared_connection(ubus_socket, monkeypatch):
+    fake = FakeUbus({"openvpn": {"instances": {"native": {"running": True}}}})
+    fake.connected_to = "/var/run/ubus/ubus.sock"  # connected by foris-controller
+    monkeypatch.setattr(backend, "ubus", fake)
+    cmdline = {"openvpn": {"instances": {"cmd": {"running": True}}}}
+    monkeypatch.setattr(backend.OpenVpnUbus, "_service_list_cmdline", lambda self: cmdline)
+
+    # shared connection is used only from the main thread
+    assert backend.OpenVpnUbus().openvpn_running_instances() == {"native"}
+
+    res = []
+    thread = threading.Thread(target=lambda: res.append(backend.OpenVpnUbus().openvpn_running_instances()))
+    thread.start()
+    thread.join()
+    assert res == [{"cmd"}]
+
+    assert fake.connected_to == "/var/run/ubus/ubus.sock"
+    assert len(fake.calls) == 1
+
+
+def test_native_service_list_empty(ubus_socket, monkeypatch):
+    monkeypatch.setattr(backend, "ubus", FakeUbus({}))
+    assert not backend.OpenVpnUbus().openvpn_running_instances()
+
+
+def test_native_service_list_fallback(ubus_socket, monkeypatch):
+    monkeypatch.setattr(backend, "ubus", FakeUbus(None))
+    monkeypatch.setattr(
+        backend.OpenVpnUbus, "_service_list_cmdline", lambda self: {"openvpn": {"instances": {"x": {"running": True}}}}
+    )
+    assert backend.OpenVpnUbus().openvpn_running_instances() == {"x"}
+
+
+def test_bindings_missing(monkeypatch):
+    monkeypatch.setattr(backend, "ubus", None)
+    monkeypatch.setattr(backend.OpenVpnUbus, "_service_list_cmdline", lambda self: {})
+    assert not backend.OpenVpnUbus().openvpn_running_instances()
+
+
+def test_monitor_events():
+    changes = []
+    monitor = InstanceMonitor(lambda: {"first"})
+    monitor.listener = lambda instance, running: changes.append((instance, running))
+
+    # not subscribed yet
+    assert monitor.running_instances() is None
+
+    monitor._resync()
+    monitor._active = True
+    assert monitor.running_instances() == {"first"}
+    # seeding is not reported
+    assert changes == []
+
+    monitor.handle_event('{"instance.start":{"service":"openvpn","instance":"second"}}')
+    monitor.handle_event('{"instance.start":{"service":"dnsmasq","instance":"cfg01"}}')
+    monitor.handle_event('{"instance.respawn":{"service":"openvpn","instance":"first"}}')
+    monitor.handle_event('{"instance.stop":{"service":"openvpn","instance":"first"}}')
+    monitor.handle_event("garbage")
+
+    assert monitor.running_instances() == {"second"}
+    assert changes == [("second", True), ("first", False)]
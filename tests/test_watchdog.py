@@ -0,0 +1,148 @@
+#
+# foris-controller-openvpn_client-module
+# Copyright (C) 2026 CZ.NIC, z.s.p.o. (http://www.nic.cz/)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software Foundation,
+# Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301  USA
+#
+
+import pytest
+
+from foris_controller_backends.openvpn_client.watchdog import JITTER, Watchdog, WatchdogPolicy, stale_reason
+
+
+class FakeClients:
+    def __init__(self):
+        self.policies = {}
+        self.unhealthy = {}
+        self.restarts = []
+        self.reports = []
+
+    def watchdog(self):
+        watchdog = Watchdog(
+            lambda: self.policies, lambda id, policy: self.unhealthy.get(id), self.restarts.append
+        )
+        watchdog.listener = lambda action, data: self.reports.append((action, data))
+        return watchdog
+
+
+@pytest.fixture
+def clients():
+    return FakeClients()
+
+
+def test_delay():
+    watchdog = Watchdog(dict, lambda id, policy: None, lambda id: None)
+    policy = WatchdogPolicy(backoff_initial=10.0, backoff_max=60.0)
+    for attempts, expected in [(0, 10.0), (1, 20.0), (2, 40.0), (3, 60.0), (10, 60.0)]:
+        for _ in range(20):
+            assert expected * (1 - JITTER) <= watchdog.delay(policy, attempts) <= expected * (1 + JITTER)
+
+
+def test_restart_with_backoff(clients):
+    watchdog = clients.watchdog()
+    watchdog.delay = lambda policy, attempts: policy.backoff_initial * 2 ** attempts
+    clients.policies = {"vpn1": WatchdogPolicy(True, backoff_initial=10.0, retries=3), "vpn2": WatchdogPolicy(True)}
+    clients.unhealthy = {"vpn1": "not running"}
+
+    # grace period after the failure was noticed
+    watchdog.tick(0)
+    watchdog.tick(9)
+    assert clients.restarts == []
+
+    watchdog.tick(10)
+    assert clients.restarts == ["vpn1"]
+    watchdog.tick(29)
+    assert clients.restarts == ["vpn1"]
+    watchdog.tick(30)
+    watchdog.tick(70)
+    assert clients.restarts == ["vpn1"] * 3
+    assert clients.reports == []
+
+    # retries are exhausted
+    watchdog.tick(150)
+    watchdog.tick(1000)
+    assert clients.restarts == ["vpn1"] * 3
+    assert clients.reports == [("failed", {"id": "vpn1", "attempts": 3, "reason": "not running"})]
+
+    clients.unhealthy = {}
+    watchdog.tick(1010)
+    assert clients.reports[-1] == ("reconnected", {"id": "vpn1", "attempts": 3})
+
+
+def test_recovery(clients):
+    watchdog = clients.watchdog()
+    watchdog.delay = lambda policy, attempts: 1.0
+    clients.policies = {"vpn1": WatchdogPolicy(True)}
+
+    # failure which is fixed without restarts is not reported
+    clients.unhealthy = {"vpn1": "not running"}
+    watchdog.tick(0)
+    clients.unhealthy = {}
+    watchdog.tick(5)
+    assert clients.restarts == [] and clients.reports == []
+
+    clients.unhealthy = {"vpn1": "status not updated for 400 seconds"}
+    watchdog.tick(10)
+    watchdog.tick(11)
+    assert clients.restarts == ["vpn1"]
+    clients.unhealthy = {}
+    watchdog.tick(12)
+    assert clients.reports == [("reconnected", {"id": "vpn1", "attempts": 1})]
+
+
+def test_ignored_clients(clients):
+    watchdog = clients.watchdog()
+    # clients which didn't opt in are not restarted
+    clients.policies = {"vpn1": WatchdogPolicy(enabled=False, backoff_initial=0), "vpn3": WatchdogPolicy()}
+    clients.unhealthy = {"vpn1": "not running", "vpn2": "not running", "vpn3": "not running"}
+    watchdog.tick(0)
+    watchdog.tick(100)
+    assert clients.restarts == []
+
+    # disabled client is forgotten
+    clients.policies = {"vpn2": WatchdogPolicy(True, backoff_initial=10.0)}
+    watchdog.tick(200)
+    clients.policies = {}
+    watchdog.tick(300)
+    clients.policies = {"vpn2": WatchdogPolicy(True, backoff_initial=10.0)}
+    watchdog.tick(301)
+    assert clients.restarts == []
+
+
+def test_unlimited_retries(clients):
+    watchdog = clients.watchdog()
+    watchdog.delay = lambda policy, attempts: 1.0
+    clients.policies = {"vpn1": WatchdogPolicy(True, retries=0)}
+    clients.unhealthy = {"vpn1": "not running"}
+    for now in range(20):
+        watchdog.tick(now)
+    assert len(clients.restarts) == 19
+    assert clients.reports == []
+
+
+def test_stale_reason():
+    # management state is preferred
+    connected = {"state": "CONNECTED", "state_since": 100}
+    assert stale_reason(connected, None, 300, 10000) is None
+    reconnecting = {"state": "RECONNECTING", "state_since": 100}
+    assert stale_reason(reconnecting, None, 300, 350) is None
+    assert stale_reason(reconnecting, None, 300, 500) == "reconnecting for 400 seconds"
+    # status file is refreshed even when the tunnel is down, it is not used when management works
+    assert stale_reason(reconnecting, {"available": True, "updated": 490}, 300, 500) is not None
+
+    # status file is used when management is not available
+    assert stale_reason(None, {"available": True, "updated": 100}, 300, 350) is None
+    assert stale_reason(None, {"available": True, "updated": 100}, 300, 500) == "status not updated for 400 seconds"
+    assert stale_reason(None, {"available": False}, 300, 500) is None